@@ -0,0 +1,195 @@
+# api/ann.py
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Spherical k-means (cosine) for the coarse quantizer
+# ------------------------------------------------------------
+def _normalize(x: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(x, axis=-1, keepdims=True)
+    n[n <= 1e-6] = 1.0
+    return (x / n).astype(np.float32)
+
+
+def segment_sum(x: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Row sums of consecutive segments of a 2-D array (np.add.reduceat along
+    axis 0, which is very slow for wide rows). Short segments are summed by
+    rank (one vectorized gather per template rank), long ones slice by slice.
+    """
+    if starts.shape[0] == 0:
+        return np.zeros((0, x.shape[1]), dtype=np.float32)
+    if int(counts.max()) <= 32:
+        out = x[starts].astype(np.float32, copy=True)
+        for r in range(1, int(counts.max())):
+            m = np.nonzero(counts > r)[0]
+            out[m] += x[starts[m] + r]
+        return out
+    return np.stack([x[s:s + c].sum(axis=0) for s, c in zip(starts.tolist(), counts.tolist())])
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    out = np.empty(x.shape[0], dtype=np.int64)
+    for s in range(0, x.shape[0], chunk):
+        out[s:s + chunk] = np.argmax(x[s:s + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(x: np.ndarray, k: int, iters: int = 8, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    k = min(k, x.shape[0])
+    centroids = x[rng.choice(x.shape[0], size=k, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        used, starts, counts = np.unique(assign[order], return_index=True, return_counts=True)
+        sums = segment_sum(x[order], starts, counts)
+
+        new = centroids.copy()
+        new[used] = _normalize(sums)
+        # re-seed empty clusters with random points
+        empty = np.setdiff1d(np.arange(k), used)
+        if empty.size:
+            new[empty] = x[rng.choice(x.shape[0], size=empty.size, replace=False)]
+        centroids = new
+
+    return centroids
+
+
+# ------------------------------------------------------------
+# IVF-Flat index
+# ------------------------------------------------------------
+class IVFFlatIndex:
+    """
+    Inverted-file index with exact (flat) vectors inside each list.
+
+    Points carry an integer label (employee_id); several points may share a
+    label (multi-template identities). search() probes the `nprobe` closest
+    lists and reduces candidate scores per label with max.
+
+    Each inverted list is stored as one (vecs, labels) tuple and replaced
+    whole on insert/delete, so concurrent readers always see a consistent
+    pair without locking.
+    """
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 8):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = max(1, nprobe)  # 0 would probe no list at all
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._where: Dict[int, Set[int]] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def ntotal(self) -> int:
+        return int(sum(lbl.shape[0] for _, lbl in self._lists))
+
+    def train(self, x: np.ndarray, sample: int = 0, iters: int = 8) -> None:
+        x = np.asarray(x, dtype=np.float32)
+        nlist = self.nlist or int(np.clip(4 * np.sqrt(x.shape[0]), 16, 4096))
+        sample = sample or nlist * 32
+        if x.shape[0] > sample:
+            x = x[np.random.default_rng(0).choice(x.shape[0], size=sample, replace=False)]
+
+        self.centroids = spherical_kmeans(x, nlist, iters=iters)
+        self.nlist = self.centroids.shape[0]
+        self.reset()
+
+    def reset(self) -> None:
+        """Empty every list, keeping the trained coarse quantizer."""
+        self._lists = [
+            (np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+            for _ in range(self.nlist)
+        ]
+        self._where = {}
+
+    def copy(self) -> "IVFFlatIndex":
+        """Cheap copy sharing centroids and list arrays (lists are replaced, never written)."""
+        other = IVFFlatIndex(self.dim, nlist=self.nlist, nprobe=self.nprobe)
+        other.centroids = self.centroids
+        other._lists = list(self._lists)
+        other._where = {lab: set(ls) for lab, ls in self._where.items()}
+        return other
+
+    def add(self, x: np.ndarray, labels: Sequence[int]) -> None:
+        if not self.is_trained:
+            raise RuntimeError("IVF index must be trained before add()")
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.dim)
+        labels = np.asarray(labels, dtype=np.int64)
+
+        assign = _assign(x, self.centroids)
+        for l in np.unique(assign).tolist():
+            m = assign == l
+            vecs, lbl = self._lists[l]
+            self._lists[l] = (np.concatenate([vecs, x[m]]), np.concatenate([lbl, labels[m]]))
+            for lab in np.unique(labels[m]).tolist():
+                self._where.setdefault(lab, set()).add(l)
+
+    def remove(self, label: int) -> int:
+        """Delete every point carrying `label`. Returns number removed."""
+        removed = 0
+        for l in self._where.pop(int(label), ()):
+            vecs, lbl = self._lists[l]
+            keep = lbl != label
+            removed += int((~keep).sum())
+            self._lists[l] = (vecs[keep], lbl[keep])
+        return removed
+
+    def search(self, q: np.ndarray, k: int = 1, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k labels and scores for one query (labels unique)."""
+        q = np.asarray(q, dtype=np.float32).reshape(-1)
+        nprobe = min(max(1, nprobe or self.nprobe), self.nlist)
+
+        coarse = self.centroids @ q
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+
+        scores, labels = [], []
+        for l in probe.tolist():
+            vecs, lbl = self._lists[l]
+            if lbl.shape[0]:
+                scores.append(vecs @ q)
+                labels.append(lbl)
+        if not scores:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = np.concatenate(scores)
+        labels = np.concatenate(labels)
+
+        # best score per label: sort desc, keep first occurrence of each label
+        order = np.argsort(-scores, kind="stable")
+        _, first = np.unique(labels[order], return_index=True)
+        best = order[first]
+        best = best[np.argsort(-scores[best])][:k]
+        return labels[best], scores[best]
+
+
+def recall_at_k(
+    index: IVFFlatIndex,
+    exact_topk,
+    queries: np.ndarray,
+    k: int = 10,
+) -> float:
+    """
+    Fraction of the exact top-k labels that the index also returns.
+    `exact_topk(q, k)` must return the exact top-k labels for one query.
+    """
+    if queries.shape[0] == 0:
+        return 1.0
+    hit = total = 0
+    for q in queries:
+        truth = set(np.asarray(exact_topk(q, k)).tolist())
+        if not truth:
+            continue
+        got = set(index.search(q, k)[0].tolist())
+        hit += len(truth & got)
+        total += len(truth)
+    return hit / total if total else 1.0
@@ -0,0 +1,176 @@
+# api/batching.py
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+
+from api.common import env_float, env_int
+from api.models.face_models import get_embeddings
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching for ArcFace.
+
+    Face crops submitted by concurrent requests go into one queue. A single
+    worker thread takes the first waiting crop, keeps collecting for up to
+    `max_wait_ms` or until `max_batch` crops are queued, then runs one
+    batched inference and hands each caller its own row back through a
+    Future. Futures whose caller has gone away (cancelled, e.g. a closed
+    stream) are dropped before inference.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[np.ndarray]], np.ndarray],
+        max_batch: int = 16,
+        max_wait_ms: float = 5.0,
+        max_pending: int = 256,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        # stats
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.size_hist: Dict[int, int] = {}
+        self._run_s = 0.0
+
+    # ------------------------------------------------------------
+    # Submit
+    # ------------------------------------------------------------
+    def submit(self, face_bgr: np.ndarray) -> Future:
+        self._ensure_started()
+        fut: Future = Future()
+        try:
+            self._q.put_nowait((face_bgr, fut))
+        except queue.Full:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Embedding queue full, retry later",
+                headers={"Retry-After": "1"},
+            )
+        return fut
+
+    async def embed(self, face_bgr: np.ndarray) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(face_bgr))
+
+    async def embed_many(self, faces_bgr: Sequence[np.ndarray]) -> List[np.ndarray]:
+        futs = [self.submit(f) for f in faces_bgr]
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futs)))
+
+    # ------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="arcface-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Any]:
+        first = self._q.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # stop after flushing what we have
+                self._q.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # the thread is never restarted: a dead worker would hang every later embed()
+                print(f"❌ ArcFace batch failed: {e}")
+                for _, fut in batch:
+                    try:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    except InvalidStateError:
+                        pass
+
+    def _run_batch(self, batch: List[Any]) -> None:
+        # RUNNING futures can no longer be cancelled, so the results below always land
+        live = [(face, fut) for face, fut in batch if fut.set_running_or_notify_cancel()]
+        self.cancelled += len(batch) - len(live)
+        if not live:
+            return
+
+        faces = [face for face, _ in live]
+        t0 = time.perf_counter()
+        try:
+            embs = self.embed_fn(faces)
+        except Exception as e:
+            for _, fut in live:
+                fut.set_exception(e)
+            return
+        finally:
+            self._run_s += time.perf_counter() - t0
+
+        for (_, fut), emb in zip(live, embs):
+            fut.set_result(emb)
+
+        n = len(live)
+        self.batches += 1
+        self.items += n
+        self.size_hist[n] = self.size_hist.get(n, 0) + 1
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._q.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait_s * 1000, 2),
+            "pending": self._q.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "avg_batch_ms": round(1000 * self._run_s / self.batches, 2) if self.batches else None,
+            "batch_size_hist": dict(sorted(self.size_hist.items())),
+        }
+
+
+ARCFACE_BATCHER = EmbeddingBatcher(
+    get_embeddings,
+    max_batch=env_int("ARC_BATCH_MAX_SIZE", 16),
+    max_wait_ms=env_float("ARC_BATCH_MAX_WAIT_MS", 5.0),
+    max_pending=env_int("ARC_BATCH_MAX_PENDING", 256),
+)
@@ -0,0 +1,126 @@
+# api/cache.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from api.common import env_float, env_int
+
+
+class ReadCache:
+    """
+    Read-through cache for small, hot query results (lists and single
+    rows). Cached values are shared between callers and must not be
+    mutated. Entries expire after `ttl_sec`; at most `max_entries` are kept
+    (least recently used evicted first).
+
+    Writers call `invalidate()`, which drops every entry: a list result
+    depends on any row of its table, so per-key invalidation would miss
+    stale lists. A load that was in flight across an invalidation is
+    returned to its caller but not stored. Concurrent misses on the same
+    key share one load.
+
+    The cache is per process; with several workers, a write made through
+    another worker is visible here after at most `ttl_sec`.
+    """
+
+    def __init__(self, name: str, ttl_sec: float, max_entries: int):
+        self.name = name
+        self.ttl_sec = max(0.0, ttl_sec)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            self.misses += 1
+            return await loader()
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        generation = self._generation
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[key] = fut
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(value)
+            if generation == self._generation:
+                self._store(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is fut:
+                del self._loading[key]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        # later readers must not join a load that started before the write
+        self._loading.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_sec": self.ttl_sec,
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# ------------------------------------------------------------
+# Employee / camera read cache (env)
+#   READ_CACHE_TTL_SEC      entry lifetime (0 disables caching)
+#   READ_CACHE_MAX_ENTRIES  distinct cached queries per table
+# ------------------------------------------------------------
+EMPLOYEE_CACHE = ReadCache(
+    "employees", env_float("READ_CACHE_TTL_SEC", 30.0), env_int("READ_CACHE_MAX_ENTRIES", 256)
+)
+CAMERA_CACHE = ReadCache(
+    "cameras", env_float("READ_CACHE_TTL_SEC", 30.0), env_int("READ_CACHE_MAX_ENTRIES", 256)
+)
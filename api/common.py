@@ -1,36 +1,90 @@
 # api/common.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Callable
+import base64
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
 from fastapi import HTTPException
 
 
-def execute_or_500(fn: Callable[[], Any], msg: str) -> Any:
+async def await_or_500(aw: Awaitable[Any], msg: str) -> Any:
     """
-    supabase-py / postgrest-py는 실패 시 보통 예외를 던진다.
-    (APIResponse.error 같은 속성에 의존하면 안 됨)
+    Await a repository call (api/repository.py); backend / transport
+    failures become HTTP 500 with `msg` as context.
     """
     try:
-        return fn()
+        return await aw
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{msg}: {e}")
 
 
-def get_data(resp: Any) -> List[Dict[str, Any]]:
-    data = getattr(resp, "data", None)
-    if data is None:
-        return []
-    if isinstance(data, list):
-        return data
-    if isinstance(data, dict):
-        return [data]
-    return []
-
-
-def get_one_or_404(resp: Any, not_found_msg: str) -> Dict[str, Any]:
-    rows = get_data(resp)
+def first_or_404(rows: Optional[List[Dict[str, Any]]], not_found_msg: str) -> Dict[str, Any]:
     if not rows:
         raise HTTPException(status_code=404, detail=not_found_msg)
     return rows[0]
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Opaque keyset cursor (X-Next-Cursor / ?cursor=): urlsafe base64 of compact JSON."""
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[str]) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (ValueError, TypeError):
+        position = None
+    if not isinstance(position, dict) or any(k not in position for k in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    try:
+        return int(raw) if raw else default
+    except ValueError:
+        print(f"⚠️ Invalid int for {name}={raw!r}, using {default}")
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        print(f"⚠️ Invalid float for {name}={raw!r}, using {default}")
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name, "").strip().lower()
+    if not raw:
+        return default
+    return raw in ("1", "true", "yes", "on")
+
+
+def env_str(name: str, default: str) -> str:
+    return (os.getenv(name, "") or default).strip()
+
+
+def env_camera_map(name: str, cast: Callable[[str], Any] = str) -> Dict[str, Any]:
+    """
+    Per-camera overrides, e.g. NAME="CAM-01=120,CAM-02=40", values passed
+    through `cast`. Entries `cast` rejects are skipped with a warning.
+    """
+    out: Dict[str, Any] = {}
+    for part in os.getenv(name, "").split(","):
+        if "=" in part:
+            cam, val = part.split("=", 1)
+            if cam.strip() and val.strip():
+                try:
+                    out[cam.strip()] = cast(val.strip())
+                except ValueError:
+                    print(f"⚠️ Invalid {cast.__name__} for {name} camera {cam.strip()!r}={val.strip()!r}, skipping it")
+    return out
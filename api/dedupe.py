@@ -0,0 +1,74 @@
+# api/dedupe.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from api.common import env_camera_map, env_float
+
+
+class DedupeWindow:
+    """
+    Cooldown per (employee, camera, event_type): the first event opens a
+    window and repeats inside it are suppressed. Only the expiry time of
+    each open window is kept; expired keys are swept once the table has
+    doubled since the last sweep.
+    """
+
+    def __init__(self, default_sec: float, by_camera: Optional[Dict[str, float]] = None):
+        self.default_sec = max(0.0, default_sec)
+        self.by_camera = {k: max(0.0, v) for k, v in (by_camera or {}).items()}
+        self._expiry: Dict[Tuple[int, str, str], float] = {}
+        self._lock = threading.Lock()
+        self._sweep_at = 1024
+
+        # stats
+        self.admitted = 0
+        self.suppressed = 0
+
+    def window(self, camera_id: str) -> float:
+        return self.by_camera.get(camera_id, self.default_sec)
+
+    def admit(self, employee_id: int, camera_id: str, event_type: str, now: Optional[float] = None) -> bool:
+        """True if the event should be logged, False if it repeats an open window."""
+        window = self.window(camera_id)
+        if window <= 0:
+            self.admitted += 1
+            return True
+
+        now = time.monotonic() if now is None else now
+        key = (employee_id, camera_id, event_type)
+        with self._lock:
+            if self._expiry.get(key, 0.0) > now:
+                self.suppressed += 1
+                return False
+            self._expiry[key] = now + window
+            self.admitted += 1
+            if len(self._expiry) >= self._sweep_at:
+                self._sweep(now)
+        return True
+
+    def _sweep(self, now: float) -> None:
+        self._expiry = {k: t for k, t in self._expiry.items() if t > now}
+        self._sweep_at = max(1024, 2 * len(self._expiry))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_sec": self.default_sec,
+            "window_sec_by_camera": self.by_camera,
+            "open_windows": len(self._expiry),
+            "admitted": self.admitted,
+            "suppressed": self.suppressed,
+        }
+
+
+# ------------------------------------------------------------
+# attendance_logs cooldown (env)
+#   DEDUP_WINDOW_SEC            default window (0 = log every recognition)
+#   DEDUP_WINDOW_SEC_BY_CAMERA  e.g. "TURNSTILE-1=10,LOBBY=300"
+# ------------------------------------------------------------
+ATTENDANCE_DEDUPE = DedupeWindow(
+    env_float("DEDUP_WINDOW_SEC", 60.0),
+    env_camera_map("DEDUP_WINDOW_SEC_BY_CAMERA", float),
+)
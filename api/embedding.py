@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import List, Optional, Tuple
+
 import numpy as np
 import cv2
 
@@ -7,7 +9,7 @@ import cv2
 # SINGLE SOURCE OF TRUTH (NO FALLBACKS)
 # ------------------------------------------------------------
 try:
-    from api.models.face_models import detect_faces, get_embedding
+    from api.models.face_models import detect_faces, get_embedding, safe_crop
 except Exception as e:
     raise RuntimeError(
         "❌ Face models failed to load.\n"
@@ -99,3 +101,55 @@ def get_embedding_from_image_bytes(image_bytes: bytes) -> np.ndarray:
     emb = emb / norm
 
     return emb
+
+
+# ------------------------------------------------------------
+# Route pipeline steps (run on the inference executor)
+# ------------------------------------------------------------
+def decode_image(image_bytes: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def detect_face_crops(
+    image_bytes: bytes, max_faces: int = 0, min_face_px: Optional[int] = None
+) -> Tuple[List[np.ndarray], List[List[int]], Optional[str]]:
+    """
+    Decode → detect → crop every face, largest first.
+    Returns (crops, boxes, None) or ([], [], reason).
+    """
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return [], [], "Invalid image"
+
+    faces = detect_faces(frame, min_face_px=min_face_px)
+    if not faces:
+        return [], [], "No face detected"
+
+    faces.sort(key=lambda b: (b[2]-b[0])*(b[3]-b[1]), reverse=True)
+    if max_faces > 0:
+        faces = faces[:max_faces]
+
+    crops, boxes = [], []
+    for box in faces:
+        face = safe_crop(frame, box)
+        if face is None or face.size == 0:
+            continue
+        crops.append(face)
+        boxes.append([int(v) for v in box])
+
+    if not crops:
+        return [], [], "No face detected"
+    return crops, boxes, None
+
+
+def detect_largest_face(
+    image_bytes: bytes, min_face_px: Optional[int] = None
+) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """
+    Decode → detect → crop the largest face.
+    Returns (face_crop, None) or (None, reason).
+    """
+    crops, _, err = detect_face_crops(image_bytes, max_faces=1, min_face_px=min_face_px)
+    if not crops:
+        return None, err
+    return crops[0], None
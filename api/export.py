@@ -0,0 +1,72 @@
+# api/export.py
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from api.common import await_or_500, env_int
+
+# ------------------------------------------------------------
+# Streaming export (env)
+#   EXPORT_CHUNK  rows fetched from the database per keyset page
+#
+# Pages are pulled one at a time and serialized straight to the client,
+# so memory stays at one page however many rows are exported. The first
+# page is fetched before the response starts: a failing query is still
+# a clean HTTP 500. A failure later on aborts the transfer (the client
+# sees a truncated body, never a silently short "complete" file).
+# ------------------------------------------------------------
+EXPORT_CHUNK = env_int("EXPORT_CHUNK", 2000)
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# next_page(position_or_None) -> (rows, position after them, None once exhausted)
+PageFn = Callable[[Any], Awaitable[Tuple[List[Dict[str, Any]], Any]]]
+
+
+def _ndjson(rows: List[Dict[str, Any]], columns: Sequence[str]) -> str:
+    return "".join(json.dumps({c: r.get(c) for c in columns}, default=str) + "\n" for r in rows)
+
+
+def _csv(rows: List[Dict[str, Any]], columns: Sequence[str], header: bool) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(columns)
+    w.writerows([["" if r.get(c) is None else r.get(c) for c in columns] for r in rows])
+    return buf.getvalue()
+
+
+async def export_response(next_page: PageFn, fmt: str, columns: Sequence[str], filename: str) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+
+    first = await await_or_500(next_page(None), f"export {filename}")
+
+    async def body() -> AsyncIterator[str]:
+        (page, position), total, header = first, 0, True
+        try:
+            while True:
+                if fmt == "csv":
+                    yield _csv(page, columns, header)
+                    header = False
+                elif page:
+                    yield _ndjson(page, columns)
+                total += len(page)
+                if position is None:
+                    break
+                page, position = await next_page(position)
+        except Exception as e:
+            print(f"❌ Export {filename} aborted after {total} rows: {e}")
+            raise
+
+    ext = "ndjson" if fmt == "ndjson" else "csv"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{ext}"'},
+    )
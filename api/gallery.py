@@ -0,0 +1,544 @@
+# api/gallery.py
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from api.ann import IVFFlatIndex, recall_at_k, segment_sum
+from api.common import env_int, env_str
+
+EMB_DIM = 512
+
+# How template scores are reduced to one score per identity:
+#   max      -> best single template (robust to lighting / pose variety)
+#   centroid -> cosine to the normalized mean template (one row per identity)
+REDUCE_MODES = ("max", "centroid")
+
+# Matcher behind search() (see api/matchers.py):
+#   exact    -> dense mat-vec over the whole gallery
+#   ivf      -> IVF-Flat ANN index (api/ann.py), only once the gallery holds at
+#               least ANN_MIN_TEMPLATES points; exact search below that
+#   pgvector -> nearest-neighbour RPC in Postgres; no gallery in API memory
+#               (a gallery built anyway searches exactly)
+MATCHER_BACKENDS = ("exact", "ivf", "pgvector")
+
+
+class _GalleryState:
+    """
+    Immutable view of the gallery. Swapped atomically on every change,
+    so readers never see a half-built matrix.
+
+    Templates are grouped by identity: rows starts[i] .. starts[i]+counts[i]
+    of `matrix` belong to identity i, which makes per-identity reduction a
+    single np.maximum.reduceat over the template scores.
+    """
+
+    __slots__ = (
+        "matrix", "template_ids", "ids", "names", "codes",
+        "starts", "counts", "centroids", "slot",
+    )
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        template_ids: np.ndarray,
+        ids: np.ndarray,
+        names: np.ndarray,
+        codes: np.ndarray,
+        counts: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+    ):
+        self.matrix = matrix
+        self.template_ids = template_ids
+        self.ids = ids
+        self.names = names
+        self.codes = codes
+        self.counts = counts
+        self.starts = np.zeros_like(counts)
+        if counts.shape[0] > 1:
+            np.cumsum(counts[:-1], out=self.starts[1:])
+        if centroids is not None:
+            self.centroids = centroids
+        elif ids.shape[0]:
+            self.centroids = l2_normalize(segment_sum(matrix, self.starts, counts))
+        else:
+            self.centroids = np.zeros((0, matrix.shape[1]), dtype=np.float32)
+        self.slot = {int(e): i for i, e in enumerate(ids.tolist())}
+
+
+def _empty_state(dim: int) -> _GalleryState:
+    return _GalleryState(
+        np.zeros((0, dim), dtype=np.float32),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=object),
+        np.zeros(0, dtype=object),
+        np.zeros(0, dtype=np.int64),
+    )
+
+
+def l2_normalize(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vecs, dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    norms[norms <= 1e-6] = 1.0
+    return vecs / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    if k == 1:
+        return np.array([int(np.argmax(scores))])
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class FaceGallery:
+    """
+    In-memory recognition gallery.
+
+    Every enrolled template is kept (several per employee), stacked in one
+    contiguous float32 matrix (T x 512) grouped by identity, with parallel
+    id / name / code arrays per identity. A matching pass is one mat-vec
+    plus a vectorized segment reduction to per-identity scores.
+    """
+
+    def __init__(self, dim: int = EMB_DIM, reduce: Optional[str] = None, backend: Optional[str] = None):
+        reduce = (reduce or env_str("GALLERY_REDUCE", "max")).lower()
+        if reduce not in REDUCE_MODES:
+            raise ValueError(f"GALLERY_REDUCE must be one of {REDUCE_MODES}, got {reduce!r}")
+        backend = (backend or env_str("MATCHER_BACKEND", "exact")).lower()
+        if backend not in MATCHER_BACKENDS:
+            raise ValueError(f"MATCHER_BACKEND must be one of {MATCHER_BACKENDS}, got {backend!r}")
+        self.dim = dim
+        self.reduce = reduce
+        self.backend = backend
+        self.ann_min_templates = env_int("ANN_MIN_TEMPLATES", 100_000)
+        self.ann_nlist = env_int("ANN_NLIST", 0)
+        self.ann_nprobe = max(1, env_int("ANN_NPROBE", 8))
+        self._index: Optional[IVFFlatIndex] = None
+        self.version = 0
+        # True once the full set is installed (load / restore / clear); an
+        # enroll delta alone must not make the gallery look loaded
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._state = _empty_state(dim)
+
+    def __len__(self) -> int:
+        """Number of identities."""
+        return int(self._state.ids.shape[0])
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    @property
+    def template_total(self) -> int:
+        return int(self._state.matrix.shape[0])
+
+    def template_count(self, emp_id: int) -> int:
+        st = self._state
+        i = st.slot.get(int(emp_id))
+        return 0 if i is None else int(st.counts[i])
+
+    def load(
+        self,
+        emp_ids: Sequence[int],
+        vecs: Sequence[np.ndarray],
+        names: Sequence[str],
+        codes: Sequence[str],
+        template_ids: Optional[Sequence[int]] = None,
+    ) -> None:
+        """
+        Replace the whole gallery (full reload / reconciliation). One entry
+        per template row; name / code of the last row of each identity wins.
+        `vecs` may be a T x D float32 matrix, which is normalized in place.
+        """
+        if not len(emp_ids):
+            self.clear()
+            return
+
+        if isinstance(vecs, np.ndarray) and vecs.ndim == 2 and vecs.dtype == np.float32:
+            matrix = vecs
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms <= 1e-6] = 1.0
+            matrix /= norms
+        else:
+            matrix = l2_normalize(np.vstack(vecs))
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Invalid embedding dim: {matrix.shape[1]} (expected {self.dim})")
+
+        emp = np.asarray(emp_ids, dtype=np.int64)
+        tids = np.asarray(template_ids if template_ids is not None else [-1] * len(emp), dtype=np.int64)
+
+        # grouped by identity, templates in id order (pages may arrive in any order)
+        order = np.lexsort((tids, emp))
+        emp = emp[order]
+        ids, starts, counts = np.unique(emp, return_index=True, return_counts=True)
+        last = starts + counts - 1
+
+        state = _GalleryState(
+            np.ascontiguousarray(matrix[order], dtype=np.float32),
+            tids[order],
+            ids,
+            np.asarray(names, dtype=object)[order][last],
+            np.asarray(codes, dtype=object)[order][last],
+            counts.astype(np.int64),
+        )
+        with self._lock:
+            self._state = state
+            self._rebuild_index()
+            self.loaded = True
+            self._bump()
+
+    def restore(
+        self,
+        matrix: np.ndarray,
+        template_ids: np.ndarray,
+        ids: np.ndarray,
+        names: np.ndarray,
+        codes: np.ndarray,
+        counts: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Install an already grouped gallery as-is (e.g. a memory-mapped
+        snapshot). The arrays are only read, never written in place.
+        An existing IVF index keeps its coarse quantizer and is updated
+        for the identities that changed; k-means only runs the first time.
+        """
+        if matrix.ndim != 2 or matrix.shape[1] != self.dim:
+            raise ValueError(f"Invalid gallery matrix shape: {matrix.shape} (expected (T, {self.dim}))")
+        state = _GalleryState(matrix, template_ids, ids, names, codes, counts, centroids)
+        with self._lock:
+            index = self._carry_index(self._state, state)
+            self._state = state
+            if index is None:
+                self._rebuild_index()
+            else:
+                self._index = index
+            self.loaded = True
+            self._bump()
+
+    @property
+    def state(self) -> _GalleryState:
+        """Current immutable state (for snapshots)."""
+        return self._state
+
+    @property
+    def watermark(self) -> int:
+        """Highest template id held (0 when empty or ids unknown)."""
+        tids = self._state.template_ids
+        return int(tids.max()) if tids.shape[0] and tids.max() > 0 else 0
+
+    def clear(self) -> None:
+        """Install an empty gallery (the database holds no templates)."""
+        with self._lock:
+            self._state = _empty_state(self.dim)
+            self._index = None
+            self.loaded = True
+            self._bump()
+
+    # ------------------------------------------------------------
+    # Delta operations (enroll / delete / metadata edits)
+    # Each one copies only what changes and swaps in a new state.
+    # ------------------------------------------------------------
+    def add_templates(
+        self,
+        emp_id: int,
+        vecs: Sequence[np.ndarray],
+        name: Optional[str] = None,
+        code: Optional[str] = None,
+        template_ids: Optional[Sequence[int]] = None,
+    ) -> int:
+        """Append templates for one person. Returns the new gallery version."""
+        new = l2_normalize(np.vstack(vecs)).reshape(-1, self.dim)
+        new_tids = np.asarray(template_ids if template_ids is not None else [-1] * len(new), dtype=np.int64)
+
+        with self._lock:
+            st = self._state
+            i = st.slot.get(int(emp_id))
+
+            if i is None:
+                counts = np.append(st.counts, len(new))
+                ids = np.append(st.ids, np.int64(emp_id))
+                names = np.append(st.names, np.array([name or "Unknown"], dtype=object))
+                codes = np.append(st.codes, np.array([code or f"ID-{emp_id}"], dtype=object))
+                matrix = np.concatenate([st.matrix, new])
+                tids = np.concatenate([st.template_ids, new_tids])
+                i = ids.shape[0] - 1
+                centroids = np.concatenate([st.centroids, np.zeros((1, self.dim), dtype=np.float32)])
+            else:
+                end = int(st.starts[i] + st.counts[i])
+                counts = st.counts.copy()
+                counts[i] += len(new)
+                ids = st.ids
+                names, codes = st.names, st.codes
+                if name is not None or code is not None:
+                    names, codes = names.copy(), codes.copy()
+                    names[i] = name if name is not None else names[i]
+                    codes[i] = code if code is not None else codes[i]
+                matrix = np.concatenate([st.matrix[:end], new, st.matrix[end:]])
+                tids = np.concatenate([st.template_ids[:end], new_tids, st.template_ids[end:]])
+                centroids = st.centroids.copy()
+
+            start = int(counts[:i].sum())
+            centroids[i] = l2_normalize(matrix[start:start + counts[i]].sum(axis=0))
+            self._state = _GalleryState(matrix, tids, ids, names, codes, counts, centroids)
+            if self._index is not None:
+                self._index.remove(int(emp_id))
+                self._index.add(*self._index_points(self._state, i))
+            else:
+                self._rebuild_index()
+            return self._bump()
+
+    def remove_identity(self, emp_id: int) -> bool:
+        """Drop every template of one person. Returns False if unknown."""
+        with self._lock:
+            st = self._state
+            i = st.slot.get(int(emp_id))
+            if i is None:
+                return False
+
+            start, end = int(st.starts[i]), int(st.starts[i] + st.counts[i])
+            keep = np.ones(st.ids.shape[0], dtype=bool)
+            keep[i] = False
+            self._state = _GalleryState(
+                np.concatenate([st.matrix[:start], st.matrix[end:]]),
+                np.concatenate([st.template_ids[:start], st.template_ids[end:]]),
+                st.ids[keep],
+                st.names[keep],
+                st.codes[keep],
+                st.counts[keep],
+                st.centroids[keep],
+            )
+            if self._index is not None:
+                self._index.remove(int(emp_id))
+            self._bump()
+            return True
+
+    def remove_templates(self, template_ids: Sequence[int]) -> int:
+        """Drop individual template rows by id; identities left empty go too. Returns rows removed."""
+        drop = np.asarray(list(template_ids), dtype=np.int64)
+        with self._lock:
+            st = self._state
+            gone = np.isin(st.template_ids, drop)
+            removed = int(gone.sum())
+            if not removed:
+                return 0
+
+            owner = np.repeat(np.arange(st.ids.shape[0]), st.counts)
+            counts = st.counts - np.bincount(owner[gone], minlength=st.ids.shape[0])
+            keep = counts > 0
+            self._state = _GalleryState(
+                np.ascontiguousarray(st.matrix[~gone]),
+                st.template_ids[~gone],
+                st.ids[keep],
+                st.names[keep],
+                st.codes[keep],
+                counts[keep],
+            )
+
+            # re-index only the identities that lost templates (what is left of them)
+            points, labels = self._index_points(self._state)
+            if self._index is not None and points.shape[0] >= max(self.ann_min_templates, 1):
+                affected = np.unique(st.ids[owner[gone]])
+                for emp_id in affected.tolist():
+                    self._index.remove(emp_id)
+                m = np.isin(labels, affected)
+                if m.any():
+                    self._index.add(points[m], labels[m])
+            else:
+                self._rebuild_index()
+            self._bump()
+            return removed
+
+    def upsert_meta(self, emp_id: int, name: Optional[str] = None, code: Optional[str] = None) -> bool:
+        """Update name / code of a person already in the gallery."""
+        with self._lock:
+            st = self._state
+            i = st.slot.get(int(emp_id))
+            if i is None:
+                return False
+
+            names, codes = st.names.copy(), st.codes.copy()
+            if name is not None:
+                names[i] = name
+            if code is not None:
+                codes[i] = code
+            self._state = _GalleryState(
+                st.matrix, st.template_ids, st.ids, names, codes, st.counts, st.centroids
+            )
+            self._bump()
+            return True
+
+    # ------------------------------------------------------------
+    # ANN index (MATCHER_BACKEND=ivf)
+    # ------------------------------------------------------------
+    def _index_points(self, st: _GalleryState, i: Optional[int] = None):
+        """Points fed to the index: every template (max) or one centroid per identity."""
+        if i is None:
+            if self.reduce == "centroid":
+                return st.centroids, st.ids
+            return st.matrix, np.repeat(st.ids, st.counts)
+        if self.reduce == "centroid":
+            return st.centroids[i:i + 1], st.ids[i:i + 1]
+        start = int(st.starts[i])
+        return st.matrix[start:start + st.counts[i]], np.repeat(st.ids[i], st.counts[i])
+
+    def _rebuild_index(self) -> None:
+        """(Re)train the IVF index from the current state. Caller holds the lock."""
+        if self.backend != "ivf":
+            return
+        points, labels = self._index_points(self._state)
+        if points.shape[0] < max(self.ann_min_templates, 1):
+            self._index = None
+            return
+
+        index = IVFFlatIndex(self.dim, nlist=self.ann_nlist, nprobe=self.ann_nprobe)
+        index.train(points)
+        index.add(points, labels)
+        self._index = index
+        print(f"✅ IVF index built: {index.ntotal} points in {index.nlist} lists (nprobe={index.nprobe})")
+
+    def _carry_index(self, old: _GalleryState, new: _GalleryState) -> Optional[IVFFlatIndex]:
+        """
+        Copy of the current index moved from `old` to `new` without
+        retraining, or None when it has to be (re)built. Identities whose
+        template ids changed are re-added; unknown ids (-1) re-add everything.
+        """
+        index = self._index
+        if index is None or self.backend != "ivf":
+            return None
+        points, labels = self._index_points(new)
+        if points.shape[0] < max(self.ann_min_templates, 1):
+            return None
+
+        index = index.copy()
+        if (old.template_ids < 0).any() or (new.template_ids < 0).any():
+            changed = None
+        else:
+            gone = ~np.isin(old.template_ids, new.template_ids)
+            added = ~np.isin(new.template_ids, old.template_ids)
+            changed = np.union1d(
+                np.repeat(old.ids, old.counts)[gone], np.repeat(new.ids, new.counts)[added]
+            )
+            if changed.shape[0] > new.ids.shape[0] // 2:
+                changed = None
+
+        if changed is None:
+            index.reset()
+            index.add(points, labels)
+            return index
+        for emp_id in changed.tolist():
+            index.remove(emp_id)
+        m = np.isin(labels, changed)
+        if m.any():
+            index.add(points[m], labels[m])
+        return index
+
+    def ann_recall(self, k: int = 10, n_queries: int = 200, noise: float = 0.05) -> Dict[str, Any]:
+        """
+        Built-in recall@k check: perturbed gallery templates are searched
+        through the ANN index and compared with exact search.
+        """
+        index, st = self._index, self._state
+        if index is None or st.matrix.shape[0] == 0:
+            return {"enabled": False, "backend": self.backend}
+
+        rng = np.random.default_rng(0)
+        pick = rng.choice(st.matrix.shape[0], size=min(n_queries, st.matrix.shape[0]), replace=False)
+        queries = l2_normalize(st.matrix[pick] + rng.normal(0, noise, (pick.shape[0], self.dim)))
+
+        def exact_topk(q, kk):
+            return st.ids[_top_k(self.identity_scores(q, st), kk)]
+
+        return {
+            "enabled": True,
+            "backend": self.backend,
+            "k": k,
+            "queries": int(pick.shape[0]),
+            "nlist": index.nlist,
+            "nprobe": index.nprobe,
+            "recall": round(recall_at_k(index, exact_topk, queries, k), 4),
+        }
+
+    def _bump(self) -> int:
+        self.version += 1
+        return self.version
+
+    def identity_scores(self, emb: np.ndarray, state: Optional[_GalleryState] = None) -> np.ndarray:
+        """One score per identity (aligned with state.ids)."""
+        st = state or self._state
+        q = np.asarray(emb, dtype=np.float32).reshape(-1)
+        if self.reduce == "centroid":
+            return st.centroids @ q
+        return np.maximum.reduceat(st.matrix @ q, st.starts)
+
+    def search_many(self, embs: np.ndarray, k: int = 1) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k identities for M query embeddings at once: one (M x T) matrix
+        product and one segment reduction along the template axis.
+        """
+        embs = np.asarray(embs, dtype=np.float32).reshape(-1, self.dim)
+        st = self._state
+        if st.ids.shape[0] == 0 or k <= 0:
+            return [[] for _ in range(embs.shape[0])]
+        if self._index is not None:
+            return [self.search(q, k) for q in embs]
+
+        if self.reduce == "centroid":
+            scores = embs @ st.centroids.T
+        else:
+            scores = np.maximum.reduceat(embs @ st.matrix.T, st.starts, axis=1)
+
+        return [
+            [
+                {
+                    "employee_id": int(st.ids[i]),
+                    "name": st.names[i],
+                    "code": st.codes[i],
+                    "score": float(row[i]),
+                    "templates": int(st.counts[i]),
+                }
+                for i in _top_k(row, k)
+            ]
+            for row in scores
+        ]
+
+    def search(self, emb: np.ndarray, k: int = 1) -> List[Dict[str, Any]]:
+        """
+        Top-k identities for one L2-normalized query embedding.
+        Returns [{employee_id, name, code, score, templates}] sorted by score (desc).
+        """
+        st, index = self._state, self._index
+        if st.ids.shape[0] == 0 or k <= 0:
+            return []
+
+        if index is not None:
+            labels, scores = index.search(emb, k)
+            out = []
+            for lab, sc in zip(labels.tolist(), scores.tolist()):
+                i = st.slot.get(lab)
+                if i is None:
+                    continue
+                out.append({
+                    "employee_id": lab,
+                    "name": st.names[i],
+                    "code": st.codes[i],
+                    "score": float(sc),
+                    "templates": int(st.counts[i]),
+                })
+            return out
+
+        scores = self.identity_scores(emb, st)
+        return [
+            {
+                "employee_id": int(st.ids[i]),
+                "name": st.names[i],
+                "code": st.codes[i],
+                "score": float(scores[i]),
+                "templates": int(st.counts[i]),
+            }
+            for i in _top_k(scores, k)
+        ]
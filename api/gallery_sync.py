@@ -0,0 +1,347 @@
+# api/gallery_sync.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from api.common import env_int
+from api.gallery import FaceGallery
+from api.snapshot import load_snapshot, save_snapshot
+
+# ------------------------------------------------------------
+# Gallery <-> Supabase / snapshot sync (env)
+#   GALLERY_SNAPSHOT_DIR  binary snapshot location (default ./snapshot);
+#                         set but empty, or "off" / "none", disables snapshots
+#   EMB_FETCH_PAGE        rows per keyset page when fetching face_embeddings
+#                         (keep <= the PostgREST max-rows setting)
+#   EMB_FETCH_WORKERS     id ranges fetched concurrently on a full load
+#   EMB_META_CHUNK        ids per employees `in_` lookup (bounded URL length)
+# ------------------------------------------------------------
+def _snapshot_dir() -> str:
+    # not env_str: that maps an empty value to the default, so "" could never disable
+    raw = os.getenv("GALLERY_SNAPSHOT_DIR")
+    if raw is None:
+        return str(Path(__file__).resolve().parents[1] / "snapshot")
+    raw = raw.strip()
+    return "" if raw.lower() in ("", "off", "none") else raw
+
+
+GALLERY_SNAPSHOT_DIR = _snapshot_dir()
+EMB_FETCH_PAGE = env_int("EMB_FETCH_PAGE", 1000)
+EMB_FETCH_WORKERS = env_int("EMB_FETCH_WORKERS", 4)
+EMB_META_CHUNK = env_int("EMB_META_CHUNK", 200)
+
+EMB_SELECT = "id, embedding, persons!inner(employee_id, name)"
+
+
+def parse_vector(text: Optional[str]) -> Optional[np.ndarray]:
+    """pgvector text '[0.1,0.2,...]' -> float32 array (None if empty)."""
+    vec_str = (text or "").strip("[]")
+    if not vec_str:
+        return None
+    return np.fromstring(vec_str, sep=",", dtype=np.float32)
+
+
+def vec_to_pg(v: np.ndarray) -> str:
+    """float array -> pgvector text literal."""
+    return "[" + ",".join(f"{x:.8f}" for x in np.asarray(v).tolist()) + "]"
+
+
+def fetch_codes(sb, emp_ids: Iterable) -> Dict[str, Any]:
+    # fetched separately to avoid join errors if foreign keys are missing;
+    # chunked so the `in_` filter never turns into one huge URL
+    emp_ids = list(emp_ids)
+    emp_meta: Dict[str, Any] = {}
+    try:
+        for i in range(0, len(emp_ids), EMB_META_CHUNK):
+            emp_resp = sb.table("employees") \
+                .select("employee_id, employee_code") \
+                .in_("employee_id", emp_ids[i:i + EMB_META_CHUNK]) \
+                .execute().data or []
+            for e in emp_resp:
+                emp_meta[str(e["employee_id"])] = e.get("employee_code")
+    except Exception as e:
+        print(f"⚠️ Could not fetch employee codes: {e}")
+    return emp_meta
+
+
+def template_rows(rows: List[Dict[str, Any]], emp_meta: Dict[str, Any]):
+    """face_embeddings rows (joined with persons) -> (emp_ids, vecs, names, codes, template_ids)."""
+    emp_ids, vecs, names, codes, tids = [], [], [], [], []
+    for r in rows:
+        p = r.get("persons")
+        if not p:
+            continue
+        vec = parse_vector(r.get("embedding"))
+        if vec is None:
+            continue
+
+        raw_id = p["employee_id"]
+        emp_id = int(raw_id)
+        emp_ids.append(emp_id)
+        vecs.append(vec)
+        names.append(p.get("name") or "Unknown")
+        codes.append(emp_meta.get(str(raw_id)) or f"ID-{emp_id}")
+        tids.append(r.get("id") if r.get("id") is not None else -1)
+    return emp_ids, vecs, names, codes, tids
+
+
+# ------------------------------------------------------------
+# Full load: id-range partitions, keyset-paged, fetched concurrently
+# ------------------------------------------------------------
+class _TemplateBuffer:
+    """
+    Preallocated T x D matrix plus per-row ids, filled page by page.
+    Pages arrive from several fetch threads; each one is parsed into a
+    page-sized block outside the lock and copied in under it.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.dim = dim
+        self.matrix = np.empty((max(1, capacity), dim), dtype=np.float32)
+        self.emp_ids = np.empty(max(1, capacity), dtype=np.int64)
+        self.tids = np.empty(max(1, capacity), dtype=np.int64)
+        self.names: Dict[int, str] = {}
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, rows: List[Dict[str, Any]]) -> None:
+        block = np.empty((len(rows), self.dim), dtype=np.float32)
+        emp = np.empty(len(rows), dtype=np.int64)
+        tids = np.empty(len(rows), dtype=np.int64)
+        names: Dict[int, str] = {}
+        k = 0
+        for r in rows:
+            p = r.get("persons")
+            vec = parse_vector(r.get("embedding")) if p else None
+            if vec is None or vec.shape[0] != self.dim:
+                continue
+            block[k] = vec
+            emp[k] = int(p["employee_id"])
+            tids[k] = r.get("id") if r.get("id") is not None else -1
+            names[int(emp[k])] = p.get("name") or "Unknown"
+            k += 1
+
+        with self._lock:
+            end = self.n + k
+            if end > self.matrix.shape[0]:
+                # rows inserted after the count: grow once, geometrically
+                cap = max(end, int(self.matrix.shape[0] * 1.5))
+                self.matrix = np.resize(self.matrix, (cap, self.dim))
+                self.emp_ids = np.resize(self.emp_ids, cap)
+                self.tids = np.resize(self.tids, cap)
+            self.matrix[self.n:end] = block[:k]
+            self.emp_ids[self.n:end] = emp[:k]
+            self.tids[self.n:end] = tids[:k]
+            self.names.update(names)
+            self.n = end
+
+
+def _id_bounds(sb) -> Optional[Tuple[int, int, int]]:
+    """-> (min id, max id, row count) of face_embeddings, None if empty."""
+    first = sb.table("face_embeddings").select("id", count="exact").order("id").limit(1).execute()
+    if not first.data:
+        return None
+    last = sb.table("face_embeddings").select("id").order("id", desc=True).limit(1).execute()
+    count = getattr(first, "count", None) or 0
+    return int(first.data[0]["id"]), int(last.data[0]["id"]), int(count)
+
+
+def _fetch_range(sb, lo: int, hi: int, buf: _TemplateBuffer) -> int:
+    """Keyset-page ids lo..hi (inclusive) into buf. Returns pages fetched."""
+    last, pages = lo - 1, 0
+    while True:
+        page = sb.table("face_embeddings").select(EMB_SELECT) \
+            .gt("id", last).lte("id", hi).order("id").limit(EMB_FETCH_PAGE).execute().data or []
+        pages += 1
+        if page:
+            buf.add_page(page)
+        if len(page) < EMB_FETCH_PAGE:
+            return pages
+        last = int(page[-1]["id"])
+
+
+def fetch_gallery(sb, dim: int, workers: int = EMB_FETCH_WORKERS):
+    """
+    Every face_embeddings row -> (emp_ids, matrix, names, codes, template_ids),
+    one entry per template, matrix preallocated from the row count.
+    """
+    t0 = time.perf_counter()
+    bounds = _id_bounds(sb)
+    if bounds is None:
+        return None
+    lo, hi, count = bounds
+    buf = _TemplateBuffer(count or EMB_FETCH_PAGE, dim)
+
+    # a few more ranges than workers so one dense range doesn't serialize the load
+    parts = max(1, min(workers * 4, (count or 1) // EMB_FETCH_PAGE + 1))
+    edges = np.linspace(lo, hi + 1, parts + 1).astype(np.int64)
+    ranges = [(int(a), int(b) - 1) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gallery-fetch") as pool:
+        pages = sum(pool.map(lambda r: _fetch_range(sb, r[0], r[1], buf), ranges))
+
+    n = buf.n
+    emp_ids = buf.emp_ids[:n]
+    emp_meta = fetch_codes(sb, np.unique(emp_ids).tolist())
+    names = [buf.names[int(e)] for e in emp_ids]
+    codes = [emp_meta.get(str(int(e))) or f"ID-{int(e)}" for e in emp_ids]
+    print(
+        f"ℹ️ Fetched {n} embeddings in {pages} pages over {len(ranges)} ranges "
+        f"({round(1000 * (time.perf_counter() - t0), 1)} ms, {workers} workers)"
+    )
+    return emp_ids, buf.matrix[:n], names, codes, buf.tids[:n]
+
+
+# ------------------------------------------------------------
+# Incremental fetches
+# ------------------------------------------------------------
+def fetch_rows_after(sb, watermark: int) -> List[Dict[str, Any]]:
+    """Every face_embeddings row with id > watermark, keyset-paged by id."""
+    rows: List[Dict[str, Any]] = []
+    last = int(watermark)
+    while True:
+        page = sb.table("face_embeddings").select(EMB_SELECT) \
+            .gt("id", last).order("id").limit(EMB_FETCH_PAGE).execute().data or []
+        rows.extend(page)
+        if len(page) < EMB_FETCH_PAGE:
+            return rows
+        last = int(page[-1]["id"])
+
+
+def fetch_rows_by_id(sb, ids: Iterable[int], chunk: int = 200) -> List[Dict[str, Any]]:
+    ids = [int(i) for i in ids]
+    rows: List[Dict[str, Any]] = []
+    for i in range(0, len(ids), chunk):
+        rows.extend(
+            sb.table("face_embeddings").select(EMB_SELECT).in_("id", ids[i:i + chunk]).execute().data or []
+        )
+    return rows
+
+
+def fetch_template_ids(sb) -> np.ndarray:
+    """All face_embeddings ids (no vectors), keyset-paged."""
+    out: List[int] = []
+    last = 0
+    while True:
+        page = sb.table("face_embeddings").select("id") \
+            .gt("id", last).order("id").limit(EMB_FETCH_PAGE).execute().data or []
+        out.extend(int(r["id"]) for r in page)
+        if len(page) < EMB_FETCH_PAGE:
+            return np.asarray(out, dtype=np.int64)
+        last = out[-1]
+
+
+def apply_rows(gallery: FaceGallery, sb, rows: List[Dict[str, Any]]) -> int:
+    """Add fetched template rows to the gallery, one delta per employee. Returns rows added."""
+    if not rows:
+        return 0
+    emp_meta = fetch_codes(sb, {r["persons"]["employee_id"] for r in rows if r.get("persons")})
+    emp_ids, vecs, names, codes, tids = template_rows(rows, emp_meta)
+
+    by_emp: Dict[int, List[int]] = {}
+    for j, e in enumerate(emp_ids):
+        by_emp.setdefault(e, []).append(j)
+    for e, idx in by_emp.items():
+        gallery.add_templates(
+            e, [vecs[j] for j in idx],
+            name=names[idx[-1]], code=codes[idx[-1]],
+            template_ids=[tids[j] for j in idx],
+        )
+    return len(emp_ids)
+
+
+def refresh_meta(gallery: FaceGallery, sb) -> int:
+    """Re-read names / codes of the identities in the gallery (snapshot may be stale)."""
+    st = gallery.state
+    if not st.ids.shape[0]:
+        return 0
+
+    names, codes = st.names.copy(), st.codes.copy()
+    ids = st.ids.tolist()
+    changed = 0
+    for i in range(0, len(ids), EMB_META_CHUNK):
+        for e in sb.table("employees").select("employee_id, name, employee_code") \
+                .in_("employee_id", ids[i:i + EMB_META_CHUNK]).execute().data or []:
+            slot = st.slot.get(int(e["employee_id"]))
+            if slot is None:
+                continue
+            name = e.get("name") or names[slot]
+            code = e.get("employee_code") or codes[slot]
+            if name != names[slot] or code != codes[slot]:
+                names[slot], codes[slot] = name, code
+                changed += 1
+
+    if changed:
+        gallery.restore(st.matrix, st.template_ids, st.ids, names, codes, st.counts, st.centroids)
+    return changed
+
+
+# ------------------------------------------------------------
+# Snapshot
+# ------------------------------------------------------------
+def save_gallery_snapshot(gallery: FaceGallery) -> Optional[Dict[str, Any]]:
+    if not GALLERY_SNAPSHOT_DIR:
+        return None
+    try:
+        t0 = time.perf_counter()
+        manifest = save_snapshot(Path(GALLERY_SNAPSHOT_DIR), gallery.state, gallery.watermark, gallery.version)
+        ms = round(1000 * (time.perf_counter() - t0), 1)
+        print(f"💾 Gallery snapshot saved: {manifest['templates']} templates, watermark {manifest['watermark']} ({ms} ms)")
+        return manifest
+    except Exception as e:
+        print(f"⚠️ Could not save gallery snapshot: {e}")
+        return None
+
+
+def restore_snapshot(gallery: FaceGallery, snap: Dict[str, Any]) -> None:
+    gallery.restore(
+        snap["matrix"], snap["template_ids"], snap["ids"],
+        snap["names"], snap["codes"], snap["counts"], snap["centroids"],
+    )
+
+
+def catch_up(gallery: FaceGallery, sb, watermark: int) -> Dict[str, int]:
+    """
+    Bring a restored gallery up to date with the database:
+      - rows with id > watermark are fetched and appended
+      - the id list (no vectors) finds deleted rows and any id below the
+        watermark that committed late
+      - names / codes are re-read
+    """
+    added = apply_rows(gallery, sb, fetch_rows_after(sb, watermark))
+
+    db_ids = fetch_template_ids(sb)
+    have = gallery.state.template_ids
+    removed = gallery.remove_templates(np.setdiff1d(have, db_ids))
+    late = np.setdiff1d(db_ids, have)
+    added += apply_rows(gallery, sb, fetch_rows_by_id(sb, late.tolist()))
+
+    renamed = refresh_meta(gallery, sb)
+    return {"watermark": int(watermark), "added": added, "removed": removed, "renamed": renamed}
+
+
+def warm_start(gallery: FaceGallery, sb) -> Optional[Dict[str, Any]]:
+    """
+    Map the local snapshot and catch up with the database.
+    Returns sync stats, or None when there is no usable snapshot.
+    """
+    if not GALLERY_SNAPSHOT_DIR:
+        return None
+    t0 = time.perf_counter()
+    snap = load_snapshot(Path(GALLERY_SNAPSHOT_DIR), gallery.dim)
+    if snap is None:
+        return None
+
+    restore_snapshot(gallery, snap)
+    mapped_ms = round(1000 * (time.perf_counter() - t0), 1)
+
+    stats = {"source": "snapshot", "mapped_ms": mapped_ms, **catch_up(gallery, sb, snap["watermark"])}
+    stats["ms"] = round(1000 * (time.perf_counter() - t0), 1)
+    print(f"✅ Gallery from snapshot: {gallery.template_total} templates / {len(gallery)} employees {stats}")
+    return stats
@@ -0,0 +1,90 @@
+# api/inference.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+
+from api.common import env_int
+
+
+class InferenceExecutor:
+    """
+    Dedicated, bounded thread pool for ONNX / OpenCV work.
+
+    Endpoints `await run(fn, ...)` so model inference never blocks the
+    asyncio event loop. At most `workers` jobs run and `queue_size` more
+    wait; anything beyond that is rejected immediately with 503 instead of
+    piling up behind a burst of camera frames.
+
+    The in-flight counter is only touched from the event loop thread, so it
+    needs no lock.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._inflight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._busy_s = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self._inflight >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Inference queue full, retry later",
+                headers={"Retry-After": "1"},
+            )
+
+        self._inflight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, functools.partial(self._timed, fn, *args, **kwargs))
+        except HTTPException:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._inflight -= 1
+
+    def _timed(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._busy_s += time.perf_counter() - t0
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "inflight": self._inflight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "avg_ms": round(1000 * self._busy_s / self.completed, 2) if self.completed else None,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+INFERENCE = InferenceExecutor(
+    workers=env_int("INFER_WORKERS", min(2, os.cpu_count() or 1)),
+    queue_size=env_int("INFER_QUEUE_SIZE", 16),
+)
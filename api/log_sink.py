@@ -0,0 +1,404 @@
+# api/log_sink.py
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from api.common import env_float, env_int, env_str
+
+
+class LogSink:
+    """
+    Write-behind sink for attendance rows.
+
+    `put()` only enqueues, so the request path never waits on the
+    database or the disk. A worker thread drains the queue in bulk
+    inserts of up to `max_batch` rows, or whatever arrived within
+    `flush_ms`. When the queue is full, rows go to an overflow buffer of
+    the same size that the worker moves to the spool; only once both are
+    full (the worker is stuck for `2 * max_queue` rows) are rows dropped,
+    and counted.
+
+    Failures are classified by `is_permanent()`. A retryable failure
+    (transport error, 5xx, timeout) appends the batch to a local JSONL
+    spool and the sink backs off for `retry_sec`; once an insert succeeds
+    again the spool is replayed (oldest first) before it is removed.
+
+    A permanent failure (the database rejected the data, e.g. a foreign
+    key violation) will fail the same way on every retry, so the batch is
+    split in halves down to single rows: the good rows are inserted and
+    each rejected row goes to the dead-letter file with its error. One bad
+    row therefore never holds up the spool behind it.
+
+    Every worker process shares the spool: appends, replay and the rewrite
+    of what is left happen under an flock on `<spool>.lock`.
+
+    Rows must carry their own `event_time`: replayed rows reach the
+    database long after the scan.
+    """
+
+    def __init__(
+        self,
+        insert_fn: Callable[[List[Dict[str, Any]]], Any],
+        spool_path: Path,
+        dead_letter_path: Optional[Path | str] = None,
+        max_batch: int = 100,
+        flush_ms: float = 500.0,
+        max_queue: int = 10000,
+        retry_sec: float = 5.0,
+    ):
+        self.insert_fn = insert_fn
+        self.spool_path = Path(spool_path)
+        self.dead_letter_path = (
+            Path(dead_letter_path) if dead_letter_path else self.spool_path.with_suffix(".dead.jsonl")
+        )
+        self._lock_path = self.spool_path.with_suffix(".lock")
+        self.max_batch = max(1, max_batch)
+        self.flush_s = max(0.0, flush_ms) / 1000.0
+        self.retry_s = max(0.1, retry_sec)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_queue))
+        self.max_overflow = max(1, max_queue)
+        self._overflow: List[Dict[str, Any]] = []
+        self._overflow_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._dead_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._retry_at = 0.0
+
+        # stats
+        self.enqueued = 0
+        self.overflowed = 0
+        self.dropped = 0
+        self.inserted = 0
+        self.batches = 0
+        self.failures = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.db_ok = True
+        self.last_error: Optional[str] = None
+        self.last_flush_ms: Optional[float] = None
+        self.max_flush_ms = 0.0
+        self._flush_s = 0.0
+        self.spool_rows = self._count_spool()
+
+    # ------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------
+    def put(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self._ensure_started()
+        for i, row in enumerate(rows):
+            try:
+                self._q.put_nowait(row)
+            except queue.Full:
+                self._overflow_rows(rows[i:])
+                break
+            self.enqueued += 1
+
+    def _overflow_rows(self, rows: List[Dict[str, Any]]) -> None:
+        # called on the event loop: a list extend, never file I/O or the spool lock
+        with self._overflow_lock:
+            room = max(0, self.max_overflow - len(self._overflow))
+            self._overflow.extend(rows[:room])
+        kept = min(room, len(rows))
+        self.overflowed += kept
+        if kept < len(rows):
+            if not self.dropped:
+                print("❌ Attendance log sink saturated, dropping rows (queue and overflow full)")
+            self.dropped += len(rows) - kept
+
+    # ------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def _collect(self, wait: float) -> Optional[List[Dict[str, Any]]]:
+        """-> rows (maybe empty on timeout) or None once stopped."""
+        try:
+            first = self._q.get(timeout=wait)
+        except queue.Empty:
+            return []
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._q.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _spool_overflow(self) -> None:
+        with self._overflow_lock:
+            rows, self._overflow = self._overflow, []
+        if rows:
+            self._spool(rows)
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect(wait=self.retry_s)
+            self._spool_overflow()
+            if batch is None:
+                self._drain()
+                return
+            if batch:
+                self._write(batch)
+            if self.spool_rows and time.monotonic() >= self._retry_at:
+                self._replay()
+
+    def _drain(self) -> None:
+        rest = []
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rest.append(item)
+        for i in range(0, len(rest), self.max_batch):
+            self._write(rest[i:i + self.max_batch])
+        self._spool_overflow()
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> Optional[Exception]:
+        """-> None on success, else the error (retryable ones also start the back-off)."""
+        t0 = time.perf_counter()
+        try:
+            self.insert_fn(rows)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            if not is_permanent(e):
+                if self.db_ok:
+                    print(f"❌ Attendance log insert failed, spooling to {self.spool_path}: {e}")
+                self.db_ok = False
+                self._retry_at = time.monotonic() + self.retry_s
+            return e
+
+        ms = 1000 * (time.perf_counter() - t0)
+        self.last_flush_ms = round(ms, 2)
+        self.max_flush_ms = max(self.max_flush_ms, ms)
+        self._flush_s += ms / 1000
+        self.batches += 1
+        self.inserted += len(rows)
+        if not self.db_ok:
+            print("✅ Attendance log inserts recovered")
+        self.db_ok = True
+        return None
+
+    def _deliver(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert `rows`, bisecting around permanently rejected ones (which are
+        dead-lettered). -> the rows still to retry, in order ([] when done).
+        """
+        err = self._insert(rows)
+        if err is None:
+            return []
+        if not is_permanent(err):
+            return rows
+        if len(rows) == 1:
+            self._dead_letter(rows[0], err)
+            return []
+        mid = len(rows) // 2
+        rest = self._deliver(rows[:mid])
+        if rest:
+            return rest + rows[mid:]
+        return self._deliver(rows[mid:])
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if not self.db_ok and time.monotonic() < self._retry_at:
+            self._spool(rows)
+            return
+        if self.spool_rows:
+            # older rows go first, keeping insert order
+            self._replay()
+            if self.spool_rows:
+                self._spool(rows)
+                return
+        rest = self._deliver(rows)
+        if rest:
+            self._spool(rest)
+
+    # ------------------------------------------------------------
+    # Spool (append-only JSONL, shared by all workers)
+    # ------------------------------------------------------------
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # thread lock inside the process, flock across worker processes
+        with self._spool_lock:
+            self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _count_spool(self) -> int:
+        try:
+            with self.spool_path.open("rb") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def _spool(self, rows: List[Dict[str, Any]]) -> None:
+        with self._locked():
+            with self.spool_path.open("a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.spool_rows += len(rows)
+            self.spooled += len(rows)
+
+    def _dead_letter(self, row: Dict[str, Any], err: Exception) -> None:
+        entry = {
+            "row": row,
+            "error": str(err),
+            "rejected_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._dead_lock:
+            self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+            # one O_APPEND write per line: safe across workers without the flock
+            with self.dead_letter_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        self.rejected += 1
+        print(f"⚠️ Attendance log rejected, moved to {self.dead_letter_path}: {err}")
+
+    def _replay(self) -> None:
+        """
+        Insert spooled rows in order (this worker's and any other's); stop,
+        and keep the rest, at the first retryable failure.
+        """
+        with self._locked():
+            try:
+                lines = self.spool_path.read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                self.spool_rows = 0
+                return
+            rows = []
+            for line in lines:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # torn tail from a crash mid-append
+                    print(f"⚠️ Skipping unreadable spool line: {line[:80]!r}")
+
+            done, rest = 0, []
+            while done < len(rows):
+                chunk = rows[done:done + self.max_batch]
+                left = self._deliver(chunk)
+                if left:
+                    rest = left + rows[done + len(chunk):]
+                    done += len(chunk) - len(left)
+                    break
+                done += len(chunk)
+            self.replayed += done
+
+            if rest:
+                tmp = self.spool_path.with_suffix(".tmp")
+                tmp.write_text("".join(json.dumps(r, default=str) + "\n" for r in rest), encoding="utf-8")
+                os.replace(tmp, self.spool_path)
+            else:
+                self.spool_path.unlink(missing_ok=True)
+                if done:
+                    print(f"✅ Replayed {done} spooled attendance logs")
+            self.spool_rows = len(rest)
+
+    # ------------------------------------------------------------
+    # Lifecycle / metrics
+    # ------------------------------------------------------------
+    def stop(self) -> None:
+        """Flush what is queued (spooling it if the DB is down) and stop the worker."""
+        if self._thread is not None:
+            self._q.put(None)
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._q.qsize(),
+            "enqueued": self.enqueued,
+            "overflow": len(self._overflow),
+            "overflowed": self.overflowed,
+            "dropped": self.dropped,
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "avg_batch_size": round(self.inserted / self.batches, 2) if self.batches else None,
+            "avg_flush_ms": round(1000 * self._flush_s / self.batches, 2) if self.batches else None,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "failures": self.failures,
+            "db_ok": self.db_ok,
+            "last_error": self.last_error,
+            "spool_rows": self.spool_rows,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "dead_letter": str(self.dead_letter_path),
+        }
+
+
+# PostgREST answers constraint / data / schema errors with a 4xx and the
+# Postgres SQLSTATE; supabase-py raises them as APIError carrying only the
+# SQLSTATE, so both are checked. Classes: 22 data exception, 23 integrity
+# constraint violation, 42 syntax error / undefined column.
+_PERMANENT_SQLSTATE = ("22", "23", "42")
+
+
+def is_permanent(exc: Exception) -> bool:
+    """True if retrying the same rows cannot succeed (a 4xx from the database)."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return 400 <= status < 500 and status not in (408, 429)
+    code = getattr(exc, "code", None)
+    return isinstance(code, str) and code[:2] in _PERMANENT_SQLSTATE
+
+
+# ------------------------------------------------------------
+# attendance_logs sink (env)
+#   LOG_SINK_BATCH        max rows per bulk insert
+#   LOG_SINK_FLUSH_MS     max time a row waits for its batch to fill
+#   LOG_SINK_MAX_QUEUE    in-memory rows before spilling to the spool
+#   LOG_SINK_RETRY_SEC    back-off after a retryable insert failure
+#   LOG_SINK_SPOOL        spool file (JSONL, append-only, shared by all workers)
+#   LOG_SINK_DEAD_LETTER  rows the database rejected (default <spool>.dead.jsonl)
+# ------------------------------------------------------------
+def _insert_attendance(rows: List[Dict[str, Any]]) -> None:
+    from api.supabase_client import get_supabase
+    get_supabase().table("attendance_logs").insert(rows).execute()
+
+
+ATTENDANCE_SINK = LogSink(
+    _insert_attendance,
+    spool_path=Path(env_str("LOG_SINK_SPOOL", str(Path(__file__).resolve().parents[1] / "spool" / "attendance_logs.jsonl"))),
+    dead_letter_path=env_str("LOG_SINK_DEAD_LETTER", "") or None,
+    max_batch=env_int("LOG_SINK_BATCH", 100),
+    flush_ms=env_float("LOG_SINK_FLUSH_MS", 500.0),
+    max_queue=env_int("LOG_SINK_MAX_QUEUE", 10000),
+    retry_sec=env_float("LOG_SINK_RETRY_SEC", 5.0),
+)
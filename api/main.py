@@ -7,17 +7,28 @@ from typing import Dict, Any
 
 from dotenv import load_dotenv
 from pathlib import Path
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from api.batching import ARCFACE_BATCHER
+from api.cache import CAMERA_CACHE, EMPLOYEE_CACHE
+from api.common import env_int
+from api.dedupe import ATTENDANCE_DEDUPE
+from api.inference import INFERENCE
+from api.log_sink import ATTENDANCE_SINK
 from api.model_assets import ensure_models
+from api.repository import REPO
 from api.routes import employees, faces, logs, cameras, recognize, schedules  # ✅ add schedules
-from api.routes.recognize import refresh_embeddings
+from api.recognition_gallery import MATCHER, SHARED_GALLERY, save_snapshot_if_changed, warm_start_gallery
+from api.routes.recognize import TRACKER
 
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
 
 app = FastAPI(title="Attendance Backend")
 
+# flipped once models are warmed up (readiness probe)
+STATE: Dict[str, Any] = {"ready": False, "warmup": None, "gallery": None}
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # tighten for prod
@@ -41,7 +52,30 @@ def root() -> Dict[str, Any]:
 
 @app.get("/health")
 def health() -> Dict[str, Any]:
-    return {"ok": True, "ts": datetime.now(timezone.utc).isoformat()}
+    return {"ok": True, "ready": STATE["ready"], "ts": datetime.now(timezone.utc).isoformat()}
+
+
+@app.get("/ready")
+def ready(response: Response) -> Dict[str, Any]:
+    if not STATE["ready"]:
+        response.status_code = 503
+    return {"ready": STATE["ready"], "warmup": STATE["warmup"], "gallery": STATE["gallery"]}
+
+
+@app.get("/metrics")
+def metrics() -> Dict[str, Any]:
+    return {
+        "inference": INFERENCE.stats(),
+        "arcface_batching": ARCFACE_BATCHER.stats(),
+        "tracking": TRACKER.stats(),
+        "attendance_sink": ATTENDANCE_SINK.stats(),
+        "attendance_dedupe": ATTENDANCE_DEDUPE.stats(),
+        "shared_gallery": SHARED_GALLERY.stats(),
+        "matcher": MATCHER.stats(),
+        "database": REPO.stats(),
+        "read_cache": {"employees": EMPLOYEE_CACHE.stats(), "cameras": CAMERA_CACHE.stats()},
+    }
+
 
 @app.on_event("startup")
 def _startup():
@@ -50,6 +84,23 @@ def _startup():
     print("MODELS_DIR:", os.getenv("MODELS_DIR"))
     ensure_models()
     try:
-        refresh_embeddings()
+        STATE["gallery"] = warm_start_gallery()
     except Exception as e:
         print(f"❌ Failed to load embeddings on startup: {e}")
+
+    # warm both sessions before serving (predictable first-request latency)
+    try:
+        from api.models.face_models import warmup
+        STATE["warmup"] = warmup(runs=env_int("WARMUP_RUNS", 2), max_batch=ARCFACE_BATCHER.max_batch)
+    except Exception as e:
+        print(f"⚠️ Model warm-up failed: {e}")
+    STATE["ready"] = True
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    ARCFACE_BATCHER.stop()
+    INFERENCE.shutdown()
+    ATTENDANCE_SINK.stop()
+    save_snapshot_if_changed()
+    await REPO.aclose()
@@ -0,0 +1,131 @@
+# api/matchers.py
+from __future__ import annotations
+
+import abc
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from api.common import env_int, env_str
+from api.gallery import MATCHER_BACKENDS, FaceGallery
+from api.gallery_sync import vec_to_pg
+
+# rpc(function_name, params) -> list of row dicts
+RpcFn = Callable[[str, Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class Matcher(abc.ABC):
+    """
+    Query embeddings -> top-k identities, as
+    [{employee_id, name, code, score, templates}] sorted by score (desc).
+
+    `in_memory` matchers are cheap enough to call on the event loop;
+    the others do I/O and are called from a thread.
+    """
+
+    name = "base"
+    in_memory = True
+
+    def __init__(self):
+        self.queries = 0
+        self._busy_s = 0.0
+
+    @abc.abstractmethod
+    def _search_many(self, embs: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        """Backend search for an (M x D) float32 batch."""
+
+    def search_many(self, embs: np.ndarray, k: int = 1) -> List[List[Dict[str, Any]]]:
+        embs = np.asarray(embs, dtype=np.float32)
+        embs = embs.reshape(-1, embs.shape[-1])
+        t0 = time.perf_counter()
+        try:
+            return self._search_many(embs, k)
+        finally:
+            self._busy_s += time.perf_counter() - t0
+            self.queries += embs.shape[0]
+
+    def search(self, emb: np.ndarray, k: int = 1) -> List[Dict[str, Any]]:
+        return self.search_many(np.asarray(emb, dtype=np.float32)[None, :], k)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "in_memory": self.in_memory,
+            "queries": self.queries,
+            "avg_query_ms": round(1000 * self._busy_s / self.queries, 3) if self.queries else None,
+        }
+
+
+class GalleryMatcher(Matcher):
+    """In-process gallery: exact mat-vec, or the IVF index (FaceGallery backend=ivf)."""
+
+    def __init__(self, gallery: FaceGallery):
+        super().__init__()
+        self.gallery = gallery
+        self.name = gallery.backend
+
+    def _search_many(self, embs: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        return self.gallery.search_many(embs, k)
+
+
+class PgvectorMatcher(Matcher):
+    """
+    Nearest-neighbour search inside Postgres (sql/match_face_embeddings.sql).
+    The API process holds no gallery; each query is one RPC that ranks
+    templates with the pgvector index and reduces them to identities (max).
+    """
+
+    name = "pgvector"
+    in_memory = False
+
+    def __init__(self, rpc: RpcFn, function: str = "match_face_embeddings", candidates: int = 50):
+        super().__init__()
+        self.rpc = rpc
+        self.function = function
+        self.candidates = max(1, candidates)
+
+    def _search_many(self, embs: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        out = []
+        for q in embs:
+            rows = self.rpc(self.function, {
+                "query_embedding": vec_to_pg(q),
+                "match_count": int(k),
+                "candidate_count": max(self.candidates, int(k)),
+            }) or []
+            out.append([
+                {
+                    "employee_id": int(r["employee_id"]),
+                    "name": r.get("name") or "Unknown",
+                    "code": r.get("employee_code") or f"ID-{r['employee_id']}",
+                    "score": float(r["similarity"]),
+                    "templates": int(r.get("templates") or 0),
+                }
+                for r in rows
+            ])
+        return out
+
+
+def supabase_rpc(function: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from api.supabase_client import get_supabase
+    return get_supabase().rpc(function, params).execute().data or []
+
+
+# ------------------------------------------------------------
+# Backend selection (env)
+#   MATCHER_BACKEND      exact | ivf | pgvector
+#   PGVECTOR_MATCH_FN    RPC name (default match_face_embeddings)
+#   PGVECTOR_CANDIDATES  templates ranked in SQL before the per-identity max
+# ------------------------------------------------------------
+def make_matcher(gallery: FaceGallery, backend: Optional[str] = None, rpc: Optional[RpcFn] = None) -> Matcher:
+    backend = (backend or gallery.backend).lower()
+    if backend not in MATCHER_BACKENDS:
+        raise ValueError(f"MATCHER_BACKEND must be one of {MATCHER_BACKENDS}, got {backend!r}")
+    if backend == "pgvector":
+        return PgvectorMatcher(
+            rpc or supabase_rpc,
+            function=env_str("PGVECTOR_MATCH_FN", "match_face_embeddings"),
+            candidates=env_int("PGVECTOR_CANDIDATES", 50),
+        )
+    return GalleryMatcher(gallery)
+
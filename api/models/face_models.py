@@ -1,21 +1,60 @@
 from __future__ import annotations
 
+import time
+from typing import Optional
+
 import cv2
 import numpy as np
-import onnxruntime as ort
 from pathlib import Path
 
+from api.common import env_bool, env_float, env_int, env_str
+from api.models.runtime import CONFIG as ENGINE_CONFIG, apply_opencv_threads, create_session
+from api.models.postprocess import (
+    RETINA_MIN_SIZES, RETINA_STEPS, decode_boxes, prior_boxes, to_pixel_boxes,
+)
+from api.models.preprocess import batch_blob, hwc_to_nchw, image_blob, letterbox_into, resize_into, scratch
+
 # ------------------------------------------------------------
 # Paths
 # ------------------------------------------------------------
 BASE_DIR = Path(__file__).parent
 MODEL_DIR = BASE_DIR / "ai"
 
-ARC_PATH = MODEL_DIR / "arcface.onnx"
-RETINA_PATH = MODEL_DIR / "retinaface.onnx"
+ARC_FP32_PATH = MODEL_DIR / "arcface.onnx"
+RETINA_FP32_PATH = MODEL_DIR / "retinaface.onnx"
 DNN_PROTO = MODEL_DIR / "deploy.prototxt"
 DNN_MODEL = MODEL_DIR / "res10_300x300_ssd_iter_140000.caffemodel"
 
+# ------------------------------------------------------------
+# Model precision: fp32 (default) or int8, the quantized variants written
+# next to the FP32 files by scripts/quantize_models.py
+#   FACE_MODEL_PRECISION  both models
+#   ARC_PRECISION / RETINA_PRECISION  per-model override
+# ------------------------------------------------------------
+MODEL_PRECISIONS = ("fp32", "int8")
+
+
+def int8_path(fp32_path: Path) -> Path:
+    """Where scripts/quantize_models.py writes the INT8 variant (may not exist)."""
+    return fp32_path.with_name(f"{fp32_path.stem}.int8.onnx")
+
+
+def model_variant(fp32_path: Path, precision: str) -> Path:
+    precision = (precision or "fp32").strip().lower()
+    if precision not in MODEL_PRECISIONS:
+        raise ValueError(f"Model precision must be one of {MODEL_PRECISIONS}, got {precision!r}")
+    if precision == "int8":
+        q = int8_path(fp32_path)
+        if q.exists():
+            return q
+        print(f"⚠️ [face_models] {q.name} missing, falling back to FP32 {fp32_path.name}")
+    return fp32_path
+
+
+_DEFAULT_PRECISION = env_str("FACE_MODEL_PRECISION", "fp32")
+ARC_PATH = model_variant(ARC_FP32_PATH, env_str("ARC_PRECISION", _DEFAULT_PRECISION))
+RETINA_PATH = model_variant(RETINA_FP32_PATH, env_str("RETINA_PRECISION", _DEFAULT_PRECISION))
+
 print("🔍 [face_models] Import started")
 print("📁 ArcFace:", ARC_PATH)
 print("📁 RetinaFace:", RETINA_PATH)
@@ -34,11 +73,13 @@ if not DNN_PROTO.exists() or not DNN_MODEL.exists():
 # ------------------------------------------------------------
 # ONNX Runtime
 # ------------------------------------------------------------
-providers = ["CPUExecutionProvider"]
-arc_sess = ort.InferenceSession(str(ARC_PATH), providers=providers)
+apply_opencv_threads()
+print("⚙️  [face_models] Engine config:", ENGINE_CONFIG)
+
+arc_sess = create_session(ARC_PATH)
 
 try:
-    retina_sess = ort.InferenceSession(str(RETINA_PATH), providers=providers)
+    retina_sess = create_session(RETINA_PATH)
     retina_available = True
 except Exception:
     retina_sess = None
@@ -74,87 +115,226 @@ def safe_crop(img, box):
 # ------------------------------------------------------------
 # FACE DETECTION
 # ------------------------------------------------------------
-def detect_faces(frame_bgr: np.ndarray, conf_thresh: float = 0.3):
+NMS_IOU = env_float("DET_NMS_IOU", 0.4)
+# RetinaFace box output: "deltas" (raw heads, decoded with priors),
+# "absolute" (already decoded, input-pixel coords) or "auto" (deltas when
+# the anchor count matches the prior grid for the input size)
+RETINA_BOX_FORMAT = env_str("RETINA_BOX_FORMAT", "auto").lower()
+
+# ------------------------------------------------------------
+# Detector input policy
+#   DET_LETTERBOX         keep aspect ratio (pad) instead of stretching
+#   DET_TARGET_SHORT_SIDE largest short side fed to RetinaFace
+#   DET_MIN_FACE_PX       smallest face (source px) we need to find; the
+#                         input is shrunk until that face hits the smallest
+#                         anchor, and smaller detections are dropped
+# ------------------------------------------------------------
+DET_LETTERBOX = env_bool("DET_LETTERBOX", True)
+DET_TARGET_SHORT_SIDE = env_int("DET_TARGET_SHORT_SIDE", 480)
+DET_MIN_FACE_PX = env_int("DET_MIN_FACE_PX", 0)
+RETINA_MIN_ANCHOR = RETINA_MIN_SIZES[0][0]
+RETINA_STRIDE = RETINA_STEPS[-1]
+DNN_SIZE = 300
+
+
+def retina_fixed_size(sess) -> Optional[tuple]:
+    """(H, W) if the RetinaFace export has a static input size, else None."""
+    if sess is None:
+        return None
+    shape = sess.get_inputs()[0].shape
+    if len(shape) == 4 and isinstance(shape[2], int) and isinstance(shape[3], int):
+        return shape[2], shape[3]
+    return None
+
+
+RETINA_FIXED_SIZE = retina_fixed_size(retina_sess)
+
+
+def _round_up(v: float, m: int) -> int:
+    return max(m, int(np.ceil(v / m)) * m)
+
+
+def retina_input_geometry(orig_h: int, orig_w: int, min_face_px: int = 0, fixed_size=RETINA_FIXED_SIZE):
+    """
+    -> (content_w, content_h, input_w, input_h): the frame is resized to
+    content size and padded (letterbox) or stretched to the input size.
+    """
+    if fixed_size is not None:
+        in_h, in_w = fixed_size
+        if not DET_LETTERBOX:
+            return in_w, in_h, in_w, in_h
+        s = min(in_w / orig_w, in_h / orig_h)
+        return max(1, round(orig_w * s)), max(1, round(orig_h * s)), in_w, in_h
+
+    s = DET_TARGET_SHORT_SIDE / min(orig_h, orig_w)
+    if min_face_px > 0:
+        s = min(s, RETINA_MIN_ANCHOR / min_face_px)
+
+    cw, ch = max(RETINA_STRIDE, round(orig_w * s)), max(RETINA_STRIDE, round(orig_h * s))
+    in_w, in_h = _round_up(cw, RETINA_STRIDE), _round_up(ch, RETINA_STRIDE)
+    if not DET_LETTERBOX:
+        return in_w, in_h, in_w, in_h
+    return cw, ch, in_w, in_h
+
+
+def _drop_small(faces: np.ndarray, min_face_px: int) -> np.ndarray:
+    if min_face_px <= 0 or not len(faces):
+        return faces
+    side = np.minimum(faces[:, 2] - faces[:, 0], faces[:, 3] - faces[:, 1])
+    return faces[side >= min_face_px]
+
+
+def _split_retina_outputs(outputs):
+    """Pick (loc, conf) out of the session outputs by their last dimension."""
+    loc = next(o for o in outputs if o.shape[-1] == 4)
+    conf = next(o for o in outputs if o.shape[-1] == 2)
+    return loc[0], conf[0]
+
+
+def _retina_boxes(loc: np.ndarray, in_h: int, in_w: int) -> np.ndarray:
+    """Boxes normalized to the network input (0..1)."""
+    priors = prior_boxes(in_h, in_w)
+    if RETINA_BOX_FORMAT == "deltas" or (RETINA_BOX_FORMAT == "auto" and loc.shape[0] == priors.shape[0]):
+        return decode_boxes(loc, priors)
+    return loc / np.array([in_w, in_h, in_w, in_h], dtype=np.float32)
+
+
+def retina_input(frame_bgr: np.ndarray, min_face_px: int = 0, fixed_size=RETINA_FIXED_SIZE):
+    """
+    Frame -> (1x3xHxW float32 tensor, (content_w, content_h, input_w, input_h)).
+    The tensor lives in a per-thread buffer reused by the next call.
+    """
+    orig_h, orig_w = frame_bgr.shape[:2]
+    cw, ch, in_w, in_h = retina_input_geometry(orig_h, orig_w, min_face_px, fixed_size)
+    img = image_blob(frame_bgr, (cw, ch), (in_w, in_h), scale=1.0 / 255.0, name="retina")
+    return img, (cw, ch, in_w, in_h)
+
+
+def detect_faces_retina(
+    frame_bgr: np.ndarray,
+    sess=None,
+    conf_thresh: float = 0.3,
+    min_face_px: int = 0,
+) -> np.ndarray:
+    """RetinaFace only: (K, 4) int boxes, best first. Raises on model errors."""
+    sess = sess or retina_sess
+    orig_h, orig_w = frame_bgr.shape[:2]
+    fixed = RETINA_FIXED_SIZE if sess is retina_sess else retina_fixed_size(sess)
+
+    img, (cw, ch, in_w, in_h) = retina_input(frame_bgr, min_face_px, fixed)
+
+    input_name = sess.get_inputs()[0].name
+    outputs = sess.run(None, {input_name: img})
+
+    loc, conf = _split_retina_outputs(outputs)
+    boxes = _retina_boxes(loc, in_h, in_w)
+    # normalized input coords -> source pixels
+    scale = (in_w * orig_w / cw, in_h * orig_h / ch)
+    faces = to_pixel_boxes(boxes, conf[:, 1], scale, conf_thresh, NMS_IOU, bounds=(orig_w, orig_h))
+    return _drop_small(faces, min_face_px)
+
+
+def detect_faces(frame_bgr: np.ndarray, conf_thresh: float = 0.3, min_face_px: Optional[int] = None):
     orig_h, orig_w = frame_bgr.shape[:2]
+    min_face_px = DET_MIN_FACE_PX if min_face_px is None else int(min_face_px)
 
     # -------- RetinaFace (best effort) --------
     if retina_available:
         try:
-            rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-            img = cv2.resize(rgb, (640, 640))
-            img = img.astype(np.float32) / 255.0
-            img = np.transpose(img, (2, 0, 1))
-            img = np.expand_dims(img, axis=0)
-
-            input_name = retina_sess.get_inputs()[0].name
-            outputs = retina_sess.run(None, {input_name: img})
-
-            if len(outputs) >= 2 and outputs[1].shape[-1] == 4:
-                scores, boxes = outputs[:2]
-                faces = []
-
-                for i in range(scores.shape[1]):
-                    if scores[0, i, 1] < conf_thresh:
-                        continue
-
-                    b = boxes[0, i]
-                    x1 = int(b[0] * orig_w / 640)
-                    y1 = int(b[1] * orig_h / 640)
-                    x2 = int(b[2] * orig_w / 640)
-                    y2 = int(b[3] * orig_h / 640)
-
-                    if x2 > x1 and y2 > y1:
-                        faces.append([x1, y1, x2, y2])
-
-                if faces:
-                    return faces
+            faces = detect_faces_retina(frame_bgr, retina_sess, conf_thresh, min_face_px)
+            if len(faces):
+                return faces.tolist()
         except Exception:
             pass
 
-    # -------- OpenCV DNN fallback --------
-    resized = cv2.resize(frame_bgr, (640, 480))
+    # -------- OpenCV DNN fallback (SSD, fixed 300x300) --------
+    if DET_LETTERBOX:
+        side = max(orig_h, orig_w)
+        img = letterbox_into(frame_bgr, (orig_w, orig_h), (side, side), name="dnn:canvas")
+        scale = (side, side)
+    else:
+        img = frame_bgr
+        scale = (orig_w, orig_h)
+
     blob = cv2.dnn.blobFromImage(
-        resized, 1.0, (300, 300),
+        img, 1.0, (DNN_SIZE, DNN_SIZE),
         (104.0, 177.0, 123.0),
         False, False
     )
 
     dnn_net.setInput(blob)
-    detections = dnn_net.forward()
-
-    faces = []
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence < conf_thresh:
-            continue
+    det = dnn_net.forward()[0, 0]
 
-        box = detections[0, 0, i, 3:7]
-        x1 = int(box[0] * orig_w)
-        y1 = int(box[1] * orig_h)
-        x2 = int(box[2] * orig_w)
-        y2 = int(box[3] * orig_h)
-
-        if x2 > x1 and y2 > y1:
-            faces.append([x1, y1, x2, y2])
-
-    return faces
+    # SSD rows: [image_id, label, confidence, x1, y1, x2, y2] (normalized)
+    faces = to_pixel_boxes(det[:, 3:7], det[:, 2], scale, conf_thresh, NMS_IOU, bounds=(orig_w, orig_h))
+    return _drop_small(faces, min_face_px).tolist()
 
 # ------------------------------------------------------------
 # ArcFace Embedding
 # ------------------------------------------------------------
-def get_embedding(face_bgr: np.ndarray) -> np.ndarray:
-    rgb = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB)
-    face = cv2.resize(rgb, (112, 112))
-    face = face.astype(np.float32)
-    face = (face - 127.5) / 128.0
-    face = np.transpose(face, (2, 0, 1))
-    face = np.expand_dims(face, axis=0)
+def arcface_fixed_batch(sess) -> int:
+    """Exported models either take a dynamic batch ("N" / None) or a fixed one (0 = dynamic)."""
+    dim = sess.get_inputs()[0].shape[0]
+    return dim if isinstance(dim, int) else 0
+
+
+ARC_MAX_BATCH = arcface_fixed_batch(arc_sess)
+
+
+ARC_SIZE = (112, 112)
+ARC_MEAN, ARC_SCALE = 127.5, 1.0 / 128.0
 
-    input_name = arc_sess.get_inputs()[0].name
-    emb = arc_sess.run(None, {input_name: face})[0][0]
-    emb = emb / np.linalg.norm(emb)
 
-    return emb
+def arcface_input(face_bgr: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Face crop -> 3x112x112 float32, written into `out` when given."""
+    if out is None:
+        out = np.empty((3, ARC_SIZE[1], ARC_SIZE[0]), dtype=np.float32)
+    tile = resize_into(face_bgr, scratch("arcface:tile", (ARC_SIZE[1], ARC_SIZE[0], 3), np.uint8))
+    return hwc_to_nchw(tile, out, ARC_SCALE, ARC_MEAN)
 
 
+def get_embeddings(faces_bgr: list, sess=None) -> np.ndarray:
+    """
+    Batched ArcFace: N face crops -> (N, 512) L2-normalized embeddings
+    in one N x 3 x 112 x 112 run (chunked if the model has a fixed batch).
+    """
+    sess = sess or arc_sess
+    batch = batch_blob(faces_bgr, ARC_SIZE, ARC_SCALE, ARC_MEAN, name="arcface")
 
+    fixed = ARC_MAX_BATCH if sess is arc_sess else arcface_fixed_batch(sess)
+    step = fixed or len(batch)
+    input_name = sess.get_inputs()[0].name
+    outs = [
+        sess.run(None, {input_name: batch[i:i + step]})[0]
+        for i in range(0, len(batch), step)
+    ]
+    embs = np.concatenate(outs).astype(np.float32, copy=False)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    return embs
+
+
+def get_embedding(face_bgr: np.ndarray) -> np.ndarray:
+    return get_embeddings([face_bgr])[0]
+
+
+# ------------------------------------------------------------
+# Warm-up (first real request must not pay session init costs)
+# ------------------------------------------------------------
+def warmup(runs: int = 2, frame_size=(720, 1280), max_batch: int = 1) -> dict:
+    """
+    Run the full detection + embedding path on synthetic input so ORT
+    allocates its arenas / kernels before the app reports ready.
+    """
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (*frame_size, 3), dtype=np.uint8)
+    face = rng.integers(0, 255, (112, 112, 3), dtype=np.uint8)
+
+    t0 = time.perf_counter()
+    for _ in range(max(1, runs)):
+        detect_faces(frame)
+        get_embeddings([face])
+        if max_batch > 1:
+            get_embeddings([face] * max_batch)
+    ms = round(1000 * (time.perf_counter() - t0), 1)
+    print(f"🔥 [face_models] Warm-up done: {runs} run(s) in {ms} ms")
+    return {"runs": runs, "ms": ms}
@@ -0,0 +1,124 @@
+# api/models/postprocess.py
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# ------------------------------------------------------------
+# RetinaFace anchor config (Pytorch_Retinaface / insightface export)
+# ------------------------------------------------------------
+RETINA_MIN_SIZES = ((16, 32), (64, 128), (256, 512))
+RETINA_STEPS = (8, 16, 32)
+RETINA_VARIANCES = (0.1, 0.2)
+
+
+@lru_cache(maxsize=16)
+def prior_boxes(height: int, width: int) -> np.ndarray:
+    """
+    (P, 4) priors as normalized (cx, cy, w, h), in the same order the
+    network emits its anchors. Cached per input size.
+    """
+    out = []
+    for step, min_sizes in zip(RETINA_STEPS, RETINA_MIN_SIZES):
+        fh, fw = int(np.ceil(height / step)), int(np.ceil(width / step))
+        cy, cx = np.meshgrid(
+            (np.arange(fh, dtype=np.float32) + 0.5) * step / height,
+            (np.arange(fw, dtype=np.float32) + 0.5) * step / width,
+            indexing="ij",
+        )
+        sizes = np.asarray(min_sizes, dtype=np.float32)
+        # anchor order: for each cell, every min_size
+        cells = np.stack([cx.ravel(), cy.ravel()], axis=1)
+        cells = np.repeat(cells, len(sizes), axis=0)
+        wh = np.tile(np.stack([sizes / width, sizes / height], axis=1), (fh * fw, 1))
+        out.append(np.concatenate([cells, wh], axis=1))
+
+    priors = np.concatenate(out).astype(np.float32)
+    priors.setflags(write=False)
+    return priors
+
+
+def decode_boxes(loc: np.ndarray, priors: np.ndarray, variances: Sequence[float] = RETINA_VARIANCES) -> np.ndarray:
+    """Regression deltas (N, 4) + priors (N, 4) -> normalized (x1, y1, x2, y2)."""
+    cxcy = priors[:, :2] + loc[:, :2] * variances[0] * priors[:, 2:]
+    wh = priors[:, 2:] * np.exp(loc[:, 2:] * variances[1])
+    return np.concatenate([cxcy - wh / 2, cxcy + wh / 2], axis=1)
+
+
+# ------------------------------------------------------------
+# Non-maximum suppression
+# ------------------------------------------------------------
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float = 0.4, top_k: int = 0) -> np.ndarray:
+    """
+    Greedy NMS. Each step suppresses every remaining box overlapping the
+    current best in one vectorized IoU computation. Returns kept indices
+    sorted by score (desc).
+    """
+    if boxes.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if top_k and len(keep) >= top_k:
+            break
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_thresh]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) boxes -> (N, M)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(np.clip(a[:, 2:] - a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(b[:, 2:] - b[:, :2], 0, None), axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def to_pixel_boxes(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    scale: Tuple[float, float],
+    conf_thresh: float,
+    iou_thresh: float,
+    bounds: Optional[Tuple[int, int]] = None,
+    pre_nms_top_k: int = 500,
+) -> np.ndarray:
+    """
+    Threshold + NMS + scale to integer pixel boxes. `boxes` are in any
+    coordinate frame; `scale` = (sx, sy) maps them to source pixels and
+    `bounds` = (w, h) clips them to the source image.
+    Returns (K, 4) int array, highest score first.
+    """
+    keep = np.nonzero(scores >= conf_thresh)[0]
+    if keep.size == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    if keep.size > pre_nms_top_k:
+        keep = keep[np.argpartition(-scores[keep], pre_nms_top_k - 1)[:pre_nms_top_k]]
+
+    boxes = boxes[keep] * np.array([scale[0], scale[1], scale[0], scale[1]], dtype=np.float32)
+    scores = scores[keep]
+    if bounds is not None:
+        np.clip(boxes, 0, [bounds[0], bounds[1], bounds[0], bounds[1]], out=boxes)
+
+    px = boxes.astype(np.int64)
+    valid = (px[:, 2] > px[:, 0]) & (px[:, 3] > px[:, 1])
+    px, boxes, scores = px[valid], boxes[valid], scores[valid]
+
+    return px[nms(boxes, scores, iou_thresh)]
@@ -0,0 +1,120 @@
+# api/models/preprocess.py
+from __future__ import annotations
+
+import threading
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# ------------------------------------------------------------
+# Reusable per-thread buffers
+#   Inference runs on a fixed set of threads (executor workers, the
+#   ArcFace batcher), so each thread keeps one growable buffer per name
+#   and reuses it for every frame. A tensor returned from here is only
+#   valid until the same thread preprocesses the next input.
+# ------------------------------------------------------------
+_local = threading.local()
+
+
+def scratch(name: str, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+    """Contiguous array of `shape` backed by this thread's `name` buffer."""
+    bufs = _local.__dict__.setdefault("bufs", {})
+    dtype = np.dtype(dtype)
+    need = int(np.prod(shape))
+    buf = bufs.get((name, dtype))
+    if buf is None or buf.size < need:
+        buf = np.empty(need, dtype=dtype)
+        bufs[(name, dtype)] = buf
+    return buf[:need].reshape(shape)
+
+
+def buffer_bytes() -> int:
+    """Bytes held by this thread's buffers."""
+    return sum(b.nbytes for b in _local.__dict__.get("bufs", {}).values())
+
+
+# ------------------------------------------------------------
+# Fused steps
+# ------------------------------------------------------------
+def resize_into(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """cv2.resize writing straight into `dst` (any HxWx3 uint8 view)."""
+    h, w = dst.shape[:2]
+    if src.shape[:2] == (h, w):
+        np.copyto(dst, src)
+        return dst
+    out = cv2.resize(src, (w, h), dst=dst)
+    if not np.shares_memory(out, dst):
+        # OpenCV reallocated (non-contiguous view it cannot write into)
+        np.copyto(dst, out)
+    return dst
+
+
+def hwc_to_nchw(
+    src_bgr: np.ndarray,
+    out: np.ndarray,
+    scale: float,
+    mean: float = 0.0,
+    swap_rb: bool = True,
+) -> np.ndarray:
+    """
+    HxWx3 uint8 -> 3xHxW float32 `out` as (x - mean) * scale, with the
+    BGR->RGB swap and the transpose folded into the same pass.
+    """
+    chw = (src_bgr[..., ::-1] if swap_rb else src_bgr).transpose(2, 0, 1)
+    if mean:
+        np.subtract(chw, np.float32(mean), out=out)
+        np.multiply(out, np.float32(scale), out=out)
+    else:
+        np.multiply(chw, np.float32(scale), out=out)
+    return out
+
+
+def letterbox_into(
+    img_bgr: np.ndarray,
+    content: Tuple[int, int],
+    size: Tuple[int, int],
+    name: str = "letterbox",
+) -> np.ndarray:
+    """Resize to content (w, h) and zero-pad right/bottom to size (w, h) in a reused canvas."""
+    (cw, ch), (w, h) = content, size
+    canvas = scratch(name, (h, w, 3), np.uint8)
+    resize_into(img_bgr, canvas[:ch, :cw])
+    canvas[ch:, :] = 0
+    canvas[:ch, cw:] = 0
+    return canvas
+
+
+# ------------------------------------------------------------
+# Model inputs
+# ------------------------------------------------------------
+def image_blob(
+    img_bgr: np.ndarray,
+    content: Tuple[int, int],
+    size: Tuple[int, int],
+    scale: float,
+    mean: float = 0.0,
+    name: str = "image",
+) -> np.ndarray:
+    """One frame -> 1x3xHxW float32 (letterboxed), in this thread's buffer."""
+    w, h = size
+    canvas = letterbox_into(img_bgr, content, size, name=f"{name}:canvas")
+    out = scratch(f"{name}:blob", (1, 3, h, w))
+    hwc_to_nchw(canvas, out[0], scale, mean)
+    return out
+
+
+def batch_blob(
+    crops_bgr: Sequence[np.ndarray],
+    size: Tuple[int, int],
+    scale: float,
+    mean: float = 0.0,
+    name: str = "batch",
+) -> np.ndarray:
+    """N crops -> Nx3xHxW float32, each resized to size (w, h), in this thread's buffer."""
+    w, h = size
+    out = scratch(f"{name}:blob", (len(crops_bgr), 3, h, w))
+    tile = scratch(f"{name}:tile", (h, w, 3), np.uint8)
+    for i, crop in enumerate(crops_bgr):
+        hwc_to_nchw(resize_into(crop, tile), out[i], scale, mean)
+    return out
@@ -0,0 +1,91 @@
+# api/models/runtime.py
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import cv2
+import onnxruntime as ort
+
+from api.common import env_int, env_str
+
+# ------------------------------------------------------------
+# Inference engine config (env)
+#   ORT_INTRA_OP_THREADS   threads inside one op      (0 = ORT default)
+#   ORT_INTER_OP_THREADS   threads across ops          (0 = ORT default)
+#   ORT_EXECUTION_MODE     sequential | parallel
+#   ORT_GRAPH_OPT_LEVEL    disable | basic | extended | all
+#   ORT_OPTIMIZED_MODEL_DIR  cache of optimized graphs (skips re-optimizing
+#                            on the next start)
+#   CV_NUM_THREADS         OpenCV worker threads      (-1 = OpenCV default)
+# ------------------------------------------------------------
+_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_EXEC_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def engine_config() -> Dict[str, Any]:
+    return {
+        "intra_op_threads": env_int("ORT_INTRA_OP_THREADS", 0),
+        "inter_op_threads": env_int("ORT_INTER_OP_THREADS", 0),
+        "execution_mode": env_str("ORT_EXECUTION_MODE", "sequential").lower(),
+        "graph_opt_level": env_str("ORT_GRAPH_OPT_LEVEL", "all").lower(),
+        "optimized_model_dir": env_str("ORT_OPTIMIZED_MODEL_DIR", ""),
+        "cv_num_threads": env_int("CV_NUM_THREADS", -1),
+        "providers": ["CPUExecutionProvider"],
+    }
+
+
+CONFIG = engine_config()
+
+
+def apply_opencv_threads() -> None:
+    if CONFIG["cv_num_threads"] >= 0:
+        cv2.setNumThreads(CONFIG["cv_num_threads"])
+
+
+def session_options(optimize: bool = True) -> ort.SessionOptions:
+    so = ort.SessionOptions()
+    if CONFIG["intra_op_threads"] > 0:
+        so.intra_op_num_threads = CONFIG["intra_op_threads"]
+    if CONFIG["inter_op_threads"] > 0:
+        so.inter_op_num_threads = CONFIG["inter_op_threads"]
+    so.execution_mode = _EXEC_MODES.get(CONFIG["execution_mode"], ort.ExecutionMode.ORT_SEQUENTIAL)
+    so.graph_optimization_level = (
+        _OPT_LEVELS.get(CONFIG["graph_opt_level"], ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        if optimize else ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    )
+    return so
+
+
+def create_session(model_path: Path, providers: List[str] = None) -> ort.InferenceSession:
+    """
+    InferenceSession with the engine config applied. With
+    ORT_OPTIMIZED_MODEL_DIR set, the optimized graph is saved on first load
+    and reused (without re-optimizing) while it is newer than the source.
+    """
+    providers = providers or CONFIG["providers"]
+    model_path = Path(model_path)
+
+    cache_dir = CONFIG["optimized_model_dir"]
+    if not cache_dir or CONFIG["graph_opt_level"] == "disable":
+        return ort.InferenceSession(str(model_path), sess_options=session_options(), providers=providers)
+
+    cached = Path(cache_dir) / f"{model_path.stem}.{CONFIG['graph_opt_level']}.opt.onnx"
+    if cached.exists() and cached.stat().st_mtime >= model_path.stat().st_mtime:
+        try:
+            return ort.InferenceSession(str(cached), sess_options=session_options(optimize=False), providers=providers)
+        except Exception as e:
+            print(f"⚠️ Optimized model cache unusable ({cached.name}): {e}")
+
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    so = session_options()
+    so.optimized_model_filepath = str(cached)
+    return ort.InferenceSession(str(model_path), sess_options=so, providers=providers)
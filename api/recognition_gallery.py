@@ -0,0 +1,127 @@
+# api/recognition_gallery.py
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from api.gallery import FaceGallery
+from api.gallery_sync import catch_up, fetch_gallery, save_gallery_snapshot, warm_start
+from api.matchers import make_matcher
+from api.shared_gallery import make_shared
+
+# ------------------------------------------------------------
+# Process-wide recognition gallery and matcher.
+#
+# Kept apart from api/routes/recognize.py (which loads the detector /
+# embedder models) so that routes which only read the gallery, such as
+# employees (has_face) and faces (enroll deltas), import no model code.
+# The database client is imported where it is used for the same reason.
+# ------------------------------------------------------------
+# 🔑 CACHE: every template per employee in one contiguous matrix + per-identity metadata
+GALLERY = FaceGallery()
+# GALLERY_SHARED=1: one memory-mapped copy for every worker process; wrap
+# mutations in `with SHARED_GALLERY.write():`, call sync() before reading
+SHARED_GALLERY = make_shared(GALLERY)
+# MATCHER_BACKEND: exact / ivf search GALLERY, pgvector searches in Postgres
+MATCHER = make_matcher(GALLERY)
+
+
+def refresh_embeddings():
+    from api.supabase_client import get_supabase
+    sb = get_supabase()
+
+    # 1. Fetch face embeddings joined with persons (+ employee codes),
+    #    keyset-paged and parsed page by page into one matrix
+    fetched = fetch_gallery(sb, GALLERY.dim)
+    if fetched is None or not len(fetched[0]):
+        with SHARED_GALLERY.write():
+            GALLERY.clear()
+        print("ℹ️ No embeddings found in database.")
+        return
+
+    # 2. Rebuild Cache (keep EVERY template row per employee)
+    emp_ids, matrix, names, codes, tids = fetched
+    with SHARED_GALLERY.write():
+        GALLERY.load(emp_ids, matrix, names, codes, template_ids=tids)
+
+    print(f"✅ Loaded {GALLERY.template_total} embeddings for {len(GALLERY)} employees ({GALLERY.reduce} reduce)")
+    save_snapshot_if_changed()
+
+
+_SNAPSHOT_VERSION = {"saved": -1}
+
+
+def save_snapshot_if_changed() -> None:
+    # save_snapshot() flocks the snapshot directory, so workers never interleave
+    # snapshot files; the write lock only pins the newest shared generation
+    with SHARED_GALLERY.write():
+        if GALLERY.version != _SNAPSHOT_VERSION["saved"] and save_gallery_snapshot(GALLERY) is not None:
+            _SNAPSHOT_VERSION["saved"] = GALLERY.version
+
+
+def warm_start_gallery() -> Dict[str, Any]:
+    """
+    Startup: the gallery another worker already published (shared mode),
+    else the binary snapshot, each plus a delta; full reload otherwise.
+    Nothing is loaded when matching runs in the database.
+    """
+    if not MATCHER.in_memory:
+        print(f"ℹ️ Matcher backend {MATCHER.name}: gallery not loaded into API memory")
+        return {"source": MATCHER.name}
+    from api.supabase_client import get_supabase
+    with SHARED_GALLERY.write():
+        if SHARED_GALLERY.generation >= 0:
+            t0 = time.perf_counter()
+            stats = {"source": "shared", **catch_up(GALLERY, get_supabase(), GALLERY.watermark)}
+            stats["ms"] = round(1000 * (time.perf_counter() - t0), 1)
+            print(f"✅ Gallery from shared generation {SHARED_GALLERY.generation}: {stats}")
+            return stats
+        return _warm_start_local()
+
+
+def _warm_start_local() -> Dict[str, Any]:
+    from api.supabase_client import get_supabase
+    try:
+        with SHARED_GALLERY.write():
+            stats = warm_start(GALLERY, get_supabase())
+    except Exception as e:
+        print(f"⚠️ Snapshot warm start failed, doing a full reload: {e}")
+        stats = None
+    if stats is None:
+        t0 = time.perf_counter()
+        refresh_embeddings()
+        return {"source": "database", "ms": round(1000 * (time.perf_counter() - t0), 1)}
+    if stats["added"] or stats["removed"] or stats["renamed"]:
+        save_snapshot_if_changed()
+    else:
+        _SNAPSHOT_VERSION["saved"] = GALLERY.version
+    return stats
+
+
+async def search_many(embs: np.ndarray, k: int = 1):
+    """Matcher call from async code: inline when in memory, on a thread when it does I/O."""
+    if MATCHER.in_memory:
+        return MATCHER.search_many(embs, k)
+    return await run_in_threadpool(MATCHER.search_many, embs, k)
+
+
+async def write_gallery(change: Callable[[], Any]) -> Any:
+    """
+    Run a gallery mutation under SHARED_GALLERY.write() on a thread: in
+    shared mode that is an flock wait, a generation sync and a full
+    snapshot publish, none of which may block the event loop.
+    """
+    def _apply() -> Any:
+        with SHARED_GALLERY.write():
+            return change()
+    return await run_in_threadpool(_apply)
+
+
+def ensure_gallery() -> None:
+    """Lazy full load for in-memory matchers (no-op for database-side matching)."""
+    SHARED_GALLERY.sync()
+    if MATCHER.in_memory and not GALLERY.loaded:
+        refresh_embeddings()
@@ -0,0 +1,592 @@
+# api/repository.py
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from api.common import env_bool, env_float, env_int, env_str
+
+# (column, operator, value); operators follow PostgREST:
+#   eq neq gt gte lt lte ilike in is
+# plus row comparison for keyset pages, e.g.
+#   ("event_time,log_id", "row_lt", (t, id))  ->  (event_time, log_id) < (t, id)
+Filter = Tuple[str, str, Any]
+# (column, descending)
+Order = Tuple[str, bool]
+
+# table -> primary key column
+TABLES: Dict[str, str] = {
+    "employees": "employee_id",
+    "persons": "id",
+    "face_embeddings": "id",
+    "attendance_logs": "log_id",
+    "cameras": "camera_id",
+    "schedules": "schedule_id",
+}
+
+
+class RepositoryError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}" if status else message)
+        self.status = status
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _literal(v: Any) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return str(v)
+
+
+def _as_datetime(v: Any) -> datetime:
+    """timestamptz text (or datetime) -> aware datetime; naive values are UTC."""
+    dt = v if isinstance(v, datetime) else datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _quoted(v: Any) -> str:
+    return '"' + _literal(v).replace('"', '\\"') + '"'
+
+
+def _row_filter(columns: str, op: str, values: Sequence[Any]) -> Tuple[str, str]:
+    """
+    (c1, c2) < (v1, v2) as a PostgREST logic tree:
+        or=(c1.lt.v1,and(c1.eq.v1,c2.lt.v2))
+    """
+    cols = [c.strip() for c in columns.split(",")]
+    cmp = op[len("row_"):]
+    terms = []
+    for i, col in enumerate(cols):
+        eqs = [f"{c}.eq.{_quoted(v)}" for c, v in zip(cols[:i], values[:i])]
+        last = f"{col}.{cmp}.{_quoted(values[i])}"
+        terms.append(f"and({','.join(eqs + [last])})" if eqs else last)
+    return "or", "(" + ",".join(terms) + ")"
+
+
+def _list_literal(values: Sequence[Any]) -> str:
+    out = []
+    for v in values:
+        s = _literal(v)
+        if any(c in s for c in ',()"'):
+            s = '"' + s.replace('"', '\\"') + '"'
+        out.append(s)
+    return "(" + ",".join(out) + ")"
+
+
+class _Timed:
+    """Request counters shared by the backends (for /metrics)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._busy_s = 0.0
+
+    def _begin(self) -> float:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    def _end(self, t0: float, ok: bool) -> None:
+        self.in_flight -= 1
+        self.requests += 1
+        self.errors += 0 if ok else 1
+        self._busy_s += time.perf_counter() - t0
+
+    def _stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_ms": round(1000 * self._busy_s / self.requests, 2) if self.requests else None,
+        }
+
+
+class PostgrestBackend(_Timed):
+    """
+    PostgREST (Supabase /rest/v1) over one pooled keep-alive
+    httpx.AsyncClient. Requests are awaited on the event loop, so the
+    number of concurrent round trips is bounded by the pool, not by the
+    threadpool. The client is created on first use inside the running
+    loop and closed by `aclose()` at shutdown.
+    """
+
+    name = "postgrest"
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_sec: float = 30.0,
+        timeout_sec: float = 10.0,
+        connect_timeout_sec: float = 5.0,
+        http2: bool = True,
+    ):
+        super().__init__()
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_sec = keepalive_sec
+        self.timeout_sec = timeout_sec
+        self.connect_timeout_sec = connect_timeout_sec
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is not None:
+            return self._client
+
+        url = os.getenv("SUPABASE_URL", "").strip().rstrip("/")
+        key = os.getenv("SUPABASE_KEY", "").strip()
+        if not url or not key:
+            raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment (.env)")
+
+        if self.http2:
+            try:
+                import h2  # noqa: F401 - httpx[http2]
+            except ImportError:
+                print("⚠️ DB_HTTP2 requested but the h2 package is missing; using HTTP/1.1 keep-alive")
+                self.http2 = False
+
+        self._client = httpx.AsyncClient(
+            base_url=f"{url}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_sec,
+            ),
+            timeout=httpx.Timeout(self.timeout_sec, connect=self.connect_timeout_sec),
+        )
+        print(
+            f"✅ PostgREST pool: {self.max_connections} connections "
+            f"({self.max_keepalive} keep-alive, http2={self.http2})"
+        )
+        return self._client
+
+    @staticmethod
+    def _params(filters: Sequence[Filter]) -> List[Tuple[str, str]]:
+        params = []
+        for col, op, value in filters:
+            if op == "in":
+                params.append((col, f"in.{_list_literal(value)}"))
+            elif op.startswith("row_"):
+                params.append(_row_filter(col, op, value))
+            else:
+                params.append((col, f"{op}.{_literal(value)}"))
+        return params
+
+    async def _send(
+        self,
+        method: str,
+        table: str,
+        params: List[Tuple[str, str]],
+        body: Any = None,
+        prefer: Optional[str] = None,
+    ) -> httpx.Response:
+        client = self._get_client()
+        headers = {"Prefer": prefer} if prefer else None
+        t0 = self._begin()
+        ok = False
+        try:
+            resp = await client.request(method, f"/{table}", params=params, json=body, headers=headers)
+            if resp.status_code >= 400:
+                try:
+                    err = resp.json()
+                    message = err.get("message") or err.get("details") or resp.text
+                except ValueError:
+                    message = resp.text or resp.reason_phrase
+                raise RepositoryError(resp.status_code, message)
+            ok = True
+            return resp
+        finally:
+            self._end(t0, ok)
+
+    async def _request(
+        self,
+        method: str,
+        table: str,
+        params: List[Tuple[str, str]],
+        body: Any = None,
+        prefer: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        resp = await self._send(method, table, params, body, prefer)
+        if not resp.content:
+            return []
+        data = resp.json()
+        return data if isinstance(data, list) else [data]
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Sequence[Filter] = (),
+        order: Sequence[Order] = (),
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        params = [("select", columns)] + self._params(filters)
+        if order:
+            params.append(("order", ",".join(f"{c}.{'desc' if d else 'asc'}" for c, d in order)))
+        if limit is not None:
+            params.append(("limit", str(int(limit))))
+        return await self._request("GET", table, params)
+
+    async def count(self, table: str, filters: Sequence[Filter] = ()) -> int:
+        """Matching rows, counted in the database (HEAD + Prefer: count=exact; no rows sent)."""
+        resp = await self._send("HEAD", table, [("select", "*")] + self._params(filters), prefer="count=exact")
+        total = resp.headers.get("content-range", "").rpartition("/")[2]
+        if not total.isdigit():
+            raise RepositoryError(0, f"no row count in Content-Range of {table}")
+        return int(total)
+
+    async def insert(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        return await self._request("POST", table, [], rows, prefer="return=representation")
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        if not filters:
+            raise RepositoryError(0, f"refusing unfiltered update of {table}")
+        return await self._request("PATCH", table, self._params(filters), values, prefer="return=representation")
+
+    async def delete(self, table: str, filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        if not filters:
+            raise RepositoryError(0, f"refusing unfiltered delete of {table}")
+        return await self._request("DELETE", table, self._params(filters), prefer="return=representation")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            **self._stats(),
+        }
+
+
+class MemoryBackend(_Timed):
+    """
+    In-process stand-in with the PostgREST backend's interface, for
+    offline runs and benchmarks (scripts/bench_repository.py). Comparison
+    follows PostgREST's text coercion; `latency_ms` simulates the network
+    round trip with an await, so concurrency behaves like the real thing.
+    Embedded resources (`rel(cols)` selects) are not supported.
+    """
+
+    name = "memory"
+
+    def __init__(self, latency_ms: float = 0.0, seed: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        super().__init__()
+        self.latency_ms = max(0.0, latency_ms)
+        self._rows: Dict[str, List[Dict[str, Any]]] = {t: [] for t in TABLES}
+        self._next_id: Dict[str, int] = {t: 1 for t in TABLES}
+        self._by_pk: Dict[str, Dict[str, Dict[str, Any]]] = {t: {} for t in TABLES}
+        for table, rows in (seed or {}).items():
+            self._insert(table, rows)
+
+    @staticmethod
+    def _key(v: Any) -> str:
+        return _literal(v)
+
+    def _predicate(self, f: Filter):
+        col, op, value = f
+        key = self._key
+        if op == "is":
+            want = key(value)
+            return lambda r: key(r.get(col)) == want
+        if op in ("eq", "neq"):
+            want, eq = key(value), op == "eq"
+            return lambda r: r.get(col) is not None and (key(r[col]) == want) == eq
+        if op == "in":
+            wants = {key(x) for x in value}
+            return lambda r: r.get(col) is not None and key(r[col]) in wants
+        if op == "ilike":
+            rx = re.compile(
+                re.escape(str(value)).replace(r"\*", ".*").replace("%", ".*"), flags=re.IGNORECASE | re.DOTALL
+            )
+            return lambda r: r.get(col) is not None and rx.fullmatch(str(r[col])) is not None
+        cmp = {
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        }.get(op[len("row_"):] if op.startswith("row_") else op)
+        if cmp is None:
+            raise RepositoryError(400, f"unsupported operator {op!r}")
+        if op.startswith("row_"):
+            cols = [c.strip() for c in col.split(",")]
+            same = [self._predicate((c, "eq", v)) for c, v in zip(cols, value)]
+            beyond = [self._predicate((c, op[len("row_"):], v)) for c, v in zip(cols, value)]
+
+            def row_pred(r):
+                # first differing column decides, like SQL row comparison
+                for eq, past in zip(same, beyond):
+                    if not eq(r):
+                        return past(r)
+                return False
+            return row_pred
+
+        def pred(r):
+            v, w = r.get(col), value
+            if v is None:
+                return False
+            if isinstance(w, datetime):
+                v = _as_datetime(v)
+            elif isinstance(v, (int, float)) and not isinstance(w, (int, float)):
+                w = type(v)(w)
+            elif isinstance(w, (int, float)) and not isinstance(v, (int, float)):
+                v = type(w)(v)
+            return cmp(v, w)
+        return pred
+
+    def _where(self, table: str, filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        if table not in self._rows:
+            raise RepositoryError(404, f"unknown table {table!r}")
+        pk = TABLES[table]
+        rest = list(filters)
+        rows = self._rows[table]
+        # primary-key lookups go through the index, not a scan
+        for i, (col, op, value) in enumerate(rest):
+            if col == pk and op == "eq":
+                hit = self._by_pk[table].get(self._key(value))
+                rows = [hit] if hit is not None else []
+                del rest[i]
+                break
+        preds = [self._predicate(f) for f in rest]
+        return [r for r in rows if all(p(r) for p in preds)] if preds else list(rows)
+
+    def _insert(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        if table not in self._rows:
+            raise RepositoryError(404, f"unknown table {table!r}")
+        pk = TABLES[table]
+        out = []
+        for row in rows if isinstance(rows, list) else [rows]:
+            row = dict(row)
+            if row.get(pk) is None:
+                row[pk] = self._next_id[table]
+            if self._key(row[pk]) in self._by_pk[table]:
+                raise RepositoryError(409, f"duplicate key {pk}={row[pk]} in {table}")
+            if isinstance(row[pk], int):
+                self._next_id[table] = max(self._next_id[table], row[pk] + 1)
+            self._by_pk[table][self._key(row[pk])] = row
+            row.setdefault("created_at", _now_iso())
+            if table == "attendance_logs":
+                row.setdefault("event_time", row["created_at"])
+            self._rows[table].append(row)
+            out.append(row)
+        return [dict(r) for r in out]
+
+    async def _roundtrip(self) -> float:
+        t0 = self._begin()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000.0)
+        return t0
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Sequence[Filter] = (),
+        order: Sequence[Order] = (),
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        t0 = await self._roundtrip()
+        ok = False
+        try:
+            rows = self._where(table, filters)
+            if len(order) == 1 and limit is not None and limit < len(rows):
+                # top-N without sorting the whole table; nulls last like PostgREST
+                col, desc = order[0]
+                present = [r for r in rows if r.get(col) is not None]
+                top = (heapq.nlargest if desc else heapq.nsmallest)(limit, present, key=lambda r: r[col])
+                rows = top + [r for r in rows if r.get(col) is None][: limit - len(top)]
+            else:
+                for col, desc in reversed(list(order)):
+                    present = [r for r in rows if r.get(col) is not None]
+                    present.sort(key=lambda r: r[col], reverse=desc)
+                    rows = present + [r for r in rows if r.get(col) is None]
+                if limit is not None:
+                    rows = rows[:limit]
+            if columns.strip() != "*":
+                cols = [c.strip() for c in columns.split(",") if c.strip()]
+                rows = [{c: r.get(c) for c in cols} for r in rows]
+            ok = True
+            return [dict(r) for r in rows]
+        finally:
+            self._end(t0, ok)
+
+    async def count(self, table: str, filters: Sequence[Filter] = ()) -> int:
+        t0 = await self._roundtrip()
+        ok = False
+        try:
+            n = len(self._where(table, filters))
+            ok = True
+            return n
+        finally:
+            self._end(t0, ok)
+
+    async def insert(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        t0 = await self._roundtrip()
+        ok = False
+        try:
+            out = self._insert(table, rows)
+            ok = True
+            return out
+        finally:
+            self._end(t0, ok)
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        t0 = await self._roundtrip()
+        ok = False
+        try:
+            rows = self._where(table, filters)
+            for r in rows:
+                r.update(values)
+            ok = True
+            return [dict(r) for r in rows]
+        finally:
+            self._end(t0, ok)
+
+    async def delete(self, table: str, filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        t0 = await self._roundtrip()
+        ok = False
+        try:
+            gone = self._where(table, filters)
+            ids = {id(r) for r in gone}
+            self._rows[table] = [r for r in self._rows[table] if id(r) not in ids]
+            for r in gone:
+                self._by_pk[table].pop(self._key(r[TABLES[table]]), None)
+            ok = True
+            return gone
+        finally:
+            self._end(t0, ok)
+
+    async def aclose(self) -> None:
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "latency_ms": self.latency_ms,
+            "rows": {t: len(r) for t, r in self._rows.items()},
+            **self._stats(),
+        }
+
+
+class Table:
+    """Async CRUD on one table, keyed by its primary key."""
+
+    def __init__(self, backend, name: str):
+        self.backend = backend
+        self.name = name
+        self.pk = TABLES[name]
+
+    async def list(
+        self,
+        filters: Sequence[Filter] = (),
+        columns: str = "*",
+        order: Sequence[Order] = (),
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self.backend.select(self.name, columns, filters, order, limit)
+
+    async def count(self, filters: Sequence[Filter] = ()) -> int:
+        return await self.backend.count(self.name, filters)
+
+    async def get(self, key: Any, columns: str = "*") -> Optional[Dict[str, Any]]:
+        rows = await self.backend.select(self.name, columns, [(self.pk, "eq", key)], limit=1)
+        return rows[0] if rows else None
+
+    async def create(self, payload: Any) -> List[Dict[str, Any]]:
+        return await self.backend.insert(self.name, payload)
+
+    async def update(self, key: Any, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self.backend.update(self.name, payload, [(self.pk, "eq", key)])
+
+    async def delete(self, key: Any) -> List[Dict[str, Any]]:
+        return await self.backend.delete(self.name, [(self.pk, "eq", key)])
+
+    async def delete_where(self, filters: Sequence[Filter]) -> List[Dict[str, Any]]:
+        return await self.backend.delete(self.name, filters)
+
+
+class Repository:
+    """One Table per CRUD table, over a shared backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.employees = Table(backend, "employees")
+        self.persons = Table(backend, "persons")
+        self.face_embeddings = Table(backend, "face_embeddings")
+        self.attendance_logs = Table(backend, "attendance_logs")
+        self.cameras = Table(backend, "cameras")
+        self.schedules = Table(backend, "schedules")
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+
+def _load_seed(path: str) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    if not path:
+        return None
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ DB_MEMORY_SEED unreadable ({path}): {e}")
+        return None
+
+
+# ------------------------------------------------------------
+# Data layer (env)
+#   DB_BACKEND              postgrest | memory (offline stand-in)
+#   DB_POOL_MAX             max open connections to PostgREST
+#   DB_POOL_KEEPALIVE       idle keep-alive connections kept in the pool
+#   DB_KEEPALIVE_SEC        idle connection expiry
+#   DB_TIMEOUT_SEC          read / write / pool timeout per request
+#   DB_CONNECT_TIMEOUT_SEC  TCP + TLS connect timeout
+#   DB_HTTP2                multiplex over HTTP/2 (needs httpx[http2])
+#   DB_MEMORY_SEED          JSON {table: [rows]} loaded into the memory backend
+#   DB_MEMORY_LATENCY_MS    simulated round trip of the memory backend
+# ------------------------------------------------------------
+def make_repository(backend: Optional[str] = None) -> Repository:
+    backend = (backend or env_str("DB_BACKEND", "postgrest")).lower()
+    if backend == "memory":
+        return Repository(MemoryBackend(
+            latency_ms=env_float("DB_MEMORY_LATENCY_MS", 0.0),
+            seed=_load_seed(env_str("DB_MEMORY_SEED", "")),
+        ))
+    if backend != "postgrest":
+        raise ValueError(f"DB_BACKEND must be postgrest or memory, got {backend!r}")
+    return Repository(PostgrestBackend(
+        max_connections=env_int("DB_POOL_MAX", 100),
+        max_keepalive=env_int("DB_POOL_KEEPALIVE", 20),
+        keepalive_sec=env_float("DB_KEEPALIVE_SEC", 30.0),
+        timeout_sec=env_float("DB_TIMEOUT_SEC", 10.0),
+        connect_timeout_sec=env_float("DB_CONNECT_TIMEOUT_SEC", 5.0),
+        http2=env_bool("DB_HTTP2", True),
+    ))
+
+
+REPO = make_repository()
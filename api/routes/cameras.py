@@ -5,28 +5,25 @@ from typing import Any, List, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
-from api.common import execute_or_500, get_data, get_one_or_404
-from api.supabase_client import get_supabase
+from api.cache import CAMERA_CACHE
+from api.common import await_or_500, first_or_404
+from api.repository import REPO
 from api.schemas import CameraCreateRequest, CameraUpdateRequest, CameraResponse
 
 router = APIRouter(prefix="/cameras", tags=["cameras"])
 
 
 @router.get("", response_model=List[CameraResponse])
-def list_cameras(
+async def list_cameras(
     is_active: Optional[bool] = Query(default=None),
     limit: int = Query(default=200, ge=1, le=2000),
 ) -> Any:
-    sb = get_supabase()
+    return await CAMERA_CACHE.get_or_load(("list", is_active, limit), lambda: _load_cameras(is_active, limit))
 
-    def _run():
-        q = sb.table("cameras").select("*").limit(limit)
-        if is_active is not None:
-            q = q.eq("in_active", is_active)
-        return q.execute()
 
-    resp = execute_or_500(_run, "list cameras")
-    data = get_data(resp)
+async def _load_cameras(is_active: Optional[bool], limit: int) -> List[dict]:
+    filters = [("in_active", "eq", is_active)] if is_active is not None else []
+    data = await await_or_500(REPO.cameras.list(filters, limit=limit), "list cameras")
     # Map in_active -> is_active for frontend
     for row in data:
         if "in_active" in row:
@@ -34,37 +31,41 @@ def list_cameras(
     return data
 
 
+async def load_camera(camera_id: str) -> Optional[dict]:
+    """One camera (is_active mapped), through the read cache; None if unknown."""
+    async def _load():
+        res = await await_or_500(REPO.cameras.get(camera_id), "get camera")
+        if res is not None and "in_active" in res:
+            res["is_active"] = res.pop("in_active")
+        return res
+    return await CAMERA_CACHE.get_or_load(("one", camera_id), _load)
+
+
 @router.post("", response_model=CameraResponse)
-def create_camera(body: CameraCreateRequest) -> Any:
-    sb = get_supabase()
+async def create_camera(body: CameraCreateRequest) -> Any:
     payload = body.model_dump(exclude_none=True)
     # Map is_active -> in_active for DB
     if "is_active" in payload:
         payload["in_active"] = payload.pop("is_active")
 
-    resp = execute_or_500(lambda: sb.table("cameras").insert(payload).execute(), "create camera")
-    res = get_one_or_404(resp, "Insert failed (no row returned)")
+    rows = await await_or_500(REPO.cameras.create(payload), "create camera")
+    CAMERA_CACHE.invalidate()
+    res = first_or_404(rows, "Insert failed (no row returned)")
     if "in_active" in res:
         res["is_active"] = res.pop("in_active")
     return res
 
 
 @router.get("/{camera_id}", response_model=CameraResponse)
-def get_camera(camera_id: str) -> Any:
-    sb = get_supabase()
-    resp = execute_or_500(
-        lambda: sb.table("cameras").select("*").eq("camera_id", camera_id).maybe_single().execute(),
-        "get camera",
-    )
-    res = get_one_or_404(resp, "Camera not found")
-    if "in_active" in res:
-        res["is_active"] = res.pop("in_active")
+async def get_camera(camera_id: str) -> Any:
+    res = await load_camera(camera_id)
+    if res is None:
+        raise HTTPException(status_code=404, detail="Camera not found")
     return res
 
 
 @router.patch("/{camera_id}", response_model=CameraResponse)
-def update_camera(camera_id: str, body: CameraUpdateRequest) -> Any:
-    sb = get_supabase()
+async def update_camera(camera_id: str, body: CameraUpdateRequest) -> Any:
     payload = body.model_dump(exclude_none=True)
     if "is_active" in payload:
         payload["in_active"] = payload.pop("is_active")
@@ -72,23 +73,18 @@ def update_camera(camera_id: str, body: CameraUpdateRequest) -> Any:
     if not payload:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    resp = execute_or_500(
-        lambda: sb.table("cameras").update(payload).eq("camera_id", camera_id).execute(),
-        "update camera",
-    )
-    res = get_one_or_404(resp, "Camera not found")
+    rows = await await_or_500(REPO.cameras.update(camera_id, payload), "update camera")
+    CAMERA_CACHE.invalidate()
+    res = first_or_404(rows, "Camera not found")
     if "in_active" in res:
         res["is_active"] = res.pop("in_active")
     return res
 
 
 @router.delete("/{camera_id}")
-def delete_camera(camera_id: str) -> Any:
-    sb = get_supabase()
-    resp = execute_or_500(
-        lambda: sb.table("cameras").delete().eq("camera_id", camera_id).execute(),
-        "delete camera",
-    )
-    if not get_data(resp):
+async def delete_camera(camera_id: str) -> Any:
+    rows = await await_or_500(REPO.cameras.delete(camera_id), "delete camera")
+    CAMERA_CACHE.invalidate()
+    if not rows:
         raise HTTPException(status_code=404, detail="Camera not found or already deleted")
     return {"ok": True}
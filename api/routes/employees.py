@@ -1,101 +1,186 @@
 from __future__ import annotations
-from typing import List, Optional, Any
-from fastapi import APIRouter, Query, HTTPException
-from api.supabase_client import get_supabase
-from api.common import execute_or_500, get_data, get_one_or_404
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Query, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
+from api.cache import EMPLOYEE_CACHE
+from api.common import await_or_500, decode_cursor, encode_cursor, first_or_404
+from api.export import EXPORT_CHUNK, export_response
+from api.recognition_gallery import GALLERY, MATCHER, ensure_gallery, write_gallery
+from api.repository import REPO
 from api.schemas import EmployeeCreateRequest, EmployeeUpdateRequest, EmployeeResponse
 
 router = APIRouter(prefix="/employees", tags=["employees"])
 
 
+EMPLOYEE_COLUMNS = ("employee_id", "employee_code", "name", "is_active", "role", "has_face", "face_templates")
+
+
 @router.get("", response_model=List[EmployeeResponse])
-def list_employees(
+async def list_employees(
+    response: Response,
     query: Optional[str] = Query(None),
     limit: int = Query(200, ge=1, le=2000),
+    has_face: Optional[bool] = Query(None, description="only employees with (true) / without (false) enrolled faces"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
 ):
-    sb = get_supabase()
+    after = int(decode_cursor(cursor, ("id",))["id"]) if cursor else 0
+    out, more = await _filtered_page(query, limit, has_face, after, cached=True)
+    # pages are ordered by employee_id; the next one starts past the last row
+    if more and out:
+        response.headers["X-Next-Cursor"] = encode_cursor({"id": int(out[-1]["employee_id"])})
+    return out
 
-    def _run():
-        q = sb.table("employees").select("*").limit(limit)
-        if query:
-            q = q.ilike("name", f"%{query}%")
-        return q.execute()
 
-    resp = execute_or_500(_run, "list employees")
-
-    employees = get_data(resp)
-    if not employees:
-        return []
+@router.get("/export")
+async def export_employees(
+    format: str = Query("ndjson", description="ndjson | csv"),
+    query: Optional[str] = Query(None),
+    has_face: Optional[bool] = Query(None),
+):
+    async def next_page(after):
+        rows, more = await _filtered_page(query, EXPORT_CHUNK, has_face, after or 0, cached=False)
+        return rows, (int(rows[-1]["employee_id"]) if more and rows else None)
+
+    return await export_response(next_page, format, EMPLOYEE_COLUMNS, "employees")
+
+
+async def _filtered_page(
+    query: Optional[str], limit: int, has_face: Optional[bool], after: int, cached: bool
+) -> Tuple[List[dict], bool]:
+    """
+    Up to `limit` employees past `after` (keyset on employee_id) with face
+    fields attached -> (rows, more may follow). With a has_face filter,
+    database pages are walked until `limit` rows match.
+    """
+    out: List[dict] = []
+    while len(out) < limit:
+        page = await (_employee_page if cached else _fetch_employees)(query, limit, after)
+        if has_face is None:
+            return await _with_faces(page), len(page) == limit
+        out.extend(e for e in await _with_faces(page) if e["has_face"] == has_face)
+        if len(page) < limit:
+            return out, False
+        after = int(page[-1]["employee_id"])
+    return out[:limit], True
+
+
+async def _fetch_employees(query: Optional[str], limit: int, after: int) -> List[dict]:
+    filters = [("name", "ilike", f"*{query}*")] if query else []
+    if after:
+        filters.append(("employee_id", "gt", after))
+    return await await_or_500(
+        REPO.employees.list(filters, order=[("employee_id", False)], limit=limit), "list employees"
+    )
 
-    emp_ids = [e["employee_id"] for e in employees]
 
-    # 🔑 CORRECT FACE CHECK (fetch persons separately to avoid join errors)
-    try:
-        # Fetch persons who HAVE face embeddings
-        # We check persons table for presence of any face_embeddings
-        face_resp = sb.table("persons") \
-            .select("employee_id, face_embeddings(id)") \
-            .in_("employee_id", emp_ids) \
-            .execute().data
-        
-        emp_with_faces = {
-            int(p["employee_id"]) for p in face_resp if p.get("face_embeddings")
-        }
-    except Exception as e:
-        print(f"⚠️ Face check failed: {e}")
-        emp_with_faces = set()
+async def _employee_page(query: Optional[str], limit: int, after: int) -> List[dict]:
+    return await EMPLOYEE_CACHE.get_or_load(
+        ("list", query, limit, after), lambda: _fetch_employees(query, limit, after)
+    )
 
-    for e in employees:
-        e["has_face"] = int(e["employee_id"]) in emp_with_faces
 
-    return employees
+async def _with_faces(employees: List[dict]) -> List[dict]:
+    """Copies of the (cached) rows with has_face / face_templates attached."""
+    counts = await _face_counts([int(e["employee_id"]) for e in employees])
+    return [
+        {**e, "has_face": counts.get(int(e["employee_id"]), 0) > 0, "face_templates": counts.get(int(e["employee_id"]), 0)}
+        for e in employees
+    ]
+
+
+_GALLERY_RETRY_SEC = 30.0
+_GALLERY_RETRY = {"at": 0.0}
+
+
+async def _face_counts(emp_ids: List[int]) -> Dict[int, int]:
+    """
+    Enrolled templates per employee. Answered by the recognition gallery
+    (identity -> template count, kept current by enroll / delete / sync);
+    database-side matching (no gallery in memory) queries the tables, and
+    so does a gallery that cannot be loaded (retried after a pause).
+    """
+    if not emp_ids:
+        return {}
+    if MATCHER.in_memory and time.monotonic() >= _GALLERY_RETRY["at"]:
+        try:
+            await run_in_threadpool(ensure_gallery)
+        except Exception as e:
+            _GALLERY_RETRY["at"] = time.monotonic() + _GALLERY_RETRY_SEC
+            print(f"⚠️ Gallery unavailable, counting faces in the database: {e}")
+        else:
+            return {e: GALLERY.template_count(e) for e in emp_ids}
+
+    async def _load():
+        try:
+            persons = await REPO.persons.list(
+                [("employee_id", "in", [str(e) for e in emp_ids])], columns="id, employee_id"
+            )
+            person_emp = {p["id"]: int(p["employee_id"]) for p in persons}
+            faces = await REPO.face_embeddings.list(
+                [("person_id", "in", list(person_emp))], columns="person_id"
+            ) if person_emp else []
+        except Exception as e:
+            print(f"⚠️ Face check failed: {e}")
+            return {}
+        counts: Dict[int, int] = {}
+        for f in faces:
+            emp = person_emp.get(f["person_id"])
+            if emp is not None:
+                counts[emp] = counts.get(emp, 0) + 1
+        return counts
+    return await EMPLOYEE_CACHE.get_or_load(("faces", tuple(emp_ids)), _load)
 
 
 @router.post("", response_model=EmployeeResponse)
-def create_employee(body: EmployeeCreateRequest):
-    sb = get_supabase()
+async def create_employee(body: EmployeeCreateRequest):
     payload = body.model_dump(exclude_none=True)
-    
-    resp = execute_or_500(lambda: sb.table("employees").insert(payload).execute(), "create employee")
-    return get_one_or_404(resp, "Failed to create employee")
+
+    rows = await await_or_500(REPO.employees.create(payload), "create employee")
+    EMPLOYEE_CACHE.invalidate()
+    return first_or_404(rows, "Failed to create employee")
 
 
 @router.get("/{employee_id}", response_model=EmployeeResponse)
-def get_employee(employee_id: int):
-    sb = get_supabase()
-    resp = execute_or_500(
-        lambda: sb.table("employees").select("*").eq("employee_id", employee_id).maybe_single().execute(),
-        "get employee",
+async def get_employee(employee_id: int):
+    row = await EMPLOYEE_CACHE.get_or_load(
+        ("one", employee_id), lambda: await_or_500(REPO.employees.get(employee_id), "get employee")
     )
-    return get_one_or_404(resp, "Employee not found")
+    if row is None:
+        raise HTTPException(404, "Employee not found")
+    return (await _with_faces([row]))[0]
 
 
 @router.patch("/{employee_id}", response_model=EmployeeResponse)
-def update_employee(employee_id: int, body: EmployeeUpdateRequest):
-    sb = get_supabase()
+async def update_employee(employee_id: int, body: EmployeeUpdateRequest):
     payload = body.model_dump(exclude_none=True)
     if not payload:
         raise HTTPException(400, "No fields to update")
 
-    resp = execute_or_500(
-        lambda: sb.table("employees").update(payload).eq("employee_id", employee_id).execute(),
-        "update employee",
-    )
-    return get_one_or_404(resp, "Employee not found")
+    rows = await await_or_500(REPO.employees.update(employee_id, payload), "update employee")
+    EMPLOYEE_CACHE.invalidate()
+    row = first_or_404(rows, "Employee not found")
+
+    # keep recognition metadata in sync without a full gallery reload
+    if "name" in payload or "employee_code" in payload:
+        await write_gallery(
+            lambda: GALLERY.upsert_meta(employee_id, name=payload.get("name"), code=payload.get("employee_code"))
+        )
+
+    return row
 
 
 @router.delete("/{employee_id}")
-def delete_employee(employee_id: int):
-    sb = get_supabase()
-    
+async def delete_employee(employee_id: int):
     # Optional: Cleanup persons table if cascading is not set in DB
     # Based on previous logic, we might want to be careful here.
     # But usually, a hard delete of employee should cascade to persons -> faces if set in SQL.
     
-    resp = execute_or_500(
-        lambda: sb.table("employees").delete().eq("employee_id", employee_id).execute(),
-        "delete employee",
-    )
-    if not get_data(resp):
+    rows = await await_or_500(REPO.employees.delete(employee_id), "delete employee")
+    EMPLOYEE_CACHE.invalidate()
+    if not rows:
         raise HTTPException(404, "Employee not found or already deleted")
+
+    await write_gallery(lambda: GALLERY.remove_identity(employee_id))
+
     return {"ok": True}
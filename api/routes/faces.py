@@ -1,115 +1,102 @@
 from __future__ import annotations
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import numpy as np
-import cv2
+from starlette.concurrency import run_in_threadpool
 
-from api.supabase_client import get_supabase
-from api.models.face_models import detect_faces, get_embedding, safe_crop
+from api.batching import ARCFACE_BATCHER
+from api.cache import EMPLOYEE_CACHE
+from api.common import await_or_500
+from api.embedding import detect_largest_face
+from api.inference import INFERENCE
+from api.gallery_sync import vec_to_pg
+from api.recognition_gallery import GALLERY, MATCHER, ensure_gallery, search_many, write_gallery
+from api.repository import REPO
 
 router = APIRouter(prefix="/faces", tags=["faces"])
 
 
-def vec_to_pg(v: np.ndarray) -> str:
-    return "[" + ",".join(f"{x:.8f}" for x in v.tolist()) + "]"
-
-
 @router.post("/enroll/{employee_id}")
 async def enroll_face(employee_id: int, file: UploadFile = File(...)):
     img_bytes = await file.read()
-    frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-
-    if frame is None:
-        raise HTTPException(400, "Invalid image")
 
-    faces = detect_faces(frame)
-    if not faces:
-        raise HTTPException(400, "No face detected")
+    face, err = await INFERENCE.run(detect_largest_face, img_bytes)
+    if face is None:
+        raise HTTPException(400, err)
 
-    faces.sort(key=lambda b: (b[2]-b[0])*(b[3]-b[1]), reverse=True)
-    face = safe_crop(frame, faces[0])
+    emb = await ARCFACE_BATCHER.embed(face)
 
-    emb = get_embedding(face)
-    emb = emb / np.linalg.norm(emb)
-
-    sb = get_supabase()
+    # Employee metadata (for persons row + in-memory gallery)
+    e = await await_or_500(REPO.employees.get(employee_id, columns="name, employee_code"), "enroll (employee)")
+    emp_name = e["name"] if e else "Unknown"
+    emp_code = (e.get("employee_code") if e else None) or f"ID-{employee_id}"
 
     # 🔑 ENSURE PERSON EXISTS (employee_id is text in DB)
     emp_id_str = str(employee_id)
-    p = sb.table("persons").select("id").eq("employee_id", emp_id_str).execute().data
+    p = await await_or_500(
+        REPO.persons.list([("employee_id", "eq", emp_id_str)], columns="id", limit=1), "enroll (person)"
+    )
     if p:
         person_id = p[0]["id"]
     else:
-        # Fetch name from employees table
-        e = sb.table("employees").select("name").eq("employee_id", employee_id).execute().data
-        emp_name = e[0]["name"] if e else "Unknown"
-        
-        person = sb.table("persons").insert({
+        person = await await_or_500(REPO.persons.create({
             "employee_id": emp_id_str,
             "name": emp_name
-        }).execute().data
+        }), "enroll (create person)")
         person_id = person[0]["id"]
 
-    sb.table("face_embeddings").insert({
+    inserted = await await_or_500(REPO.face_embeddings.create({
         "person_id": person_id,
         "embedding": vec_to_pg(emb),
-    }).execute()
-
-    # refresh cache
-    try:
-        from api.routes.recognize import refresh_embeddings
-        refresh_embeddings()
-    except Exception:
-        pass
-
-    return {"ok": True, "person_id": person_id}
+    }), "enroll (embedding)")
+    EMPLOYEE_CACHE.invalidate()  # has_face changed
+
+    # apply delta to the in-memory gallery (no full reload)
+    template_id = inserted[0].get("id") if inserted else None
+    if not MATCHER.in_memory:
+        # matching runs in the database: the new row is already searchable
+        return {"ok": True, "person_id": person_id, "gallery_version": GALLERY.version}
+    def _add():
+        # not loaded yet: the full load will pick the new row up from the database
+        if GALLERY.loaded:
+            GALLERY.add_templates(
+                employee_id, [emb],
+                name=emp_name, code=emp_code,
+                template_ids=[template_id if template_id is not None else -1],
+            )
+    await write_gallery(_add)
+
+    return {"ok": True, "person_id": person_id, "gallery_version": GALLERY.version}
 
 @router.post("/check-duplicate")
 async def check_duplicate(image: UploadFile = File(...)):
-    # Import KNOWN cache
-    from api.routes.recognize import KNOWN, refresh_embeddings
-    if not KNOWN:
-        refresh_embeddings()
+    await run_in_threadpool(ensure_gallery)
 
     img_bytes = await image.read()
-    frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
-    if frame is None:
+    face, _ = await INFERENCE.run(detect_largest_face, img_bytes)
+    if face is None:
         return {"duplicate": False}
 
-    faces = detect_faces(frame)
-    if not faces:
-        return {"duplicate": False}
+    emb = await ARCFACE_BATCHER.embed(face)
 
-    faces.sort(key=lambda b: (b[2]-b[0])*(b[3]-b[1]), reverse=True)
-    face = safe_crop(frame, faces[0])
-    emb = get_embedding(face)
-    emb = emb / np.linalg.norm(emb)
-
-    for eid, data in KNOWN.items():
-        ref = data["vec"]
-        s = float(np.dot(emb, ref))
-        if s > 0.65: # High threshold for duplicates
-            return {
-                "duplicate": True, 
-                "employee_id": eid,
-                "name": data.get("name"),
-                "employee_code": data.get("code")
-            }
+    matches = (await search_many(emb[None, :], k=1))[0]
+    if matches and matches[0]["score"] > 0.65: # High threshold for duplicates
+        best = matches[0]
+        return {
+            "duplicate": True,
+            "employee_id": best["employee_id"],
+            "name": best["name"],
+            "employee_code": best["code"]
+        }
 
     return {"duplicate": False}
 
 
 @router.delete("/{employee_id}")
 async def delete_face(employee_id: int):
-    sb = get_supabase()
-    
     # We delete from 'persons' (employee_id is text)
-    sb.table("persons").delete().eq("employee_id", str(employee_id)).execute()
+    await await_or_500(REPO.persons.delete_where([("employee_id", "eq", str(employee_id))]), "delete face")
+    EMPLOYEE_CACHE.invalidate()
     
-    # refresh cache
-    try:
-        from api.routes.recognize import refresh_embeddings
-        refresh_embeddings()
-    except Exception:
-        pass
-        
-    return {"ok": True}
+    # drop the person from the in-memory gallery (no full reload)
+    await write_gallery(lambda: GALLERY.remove_identity(employee_id))
+
+    return {"ok": True, "gallery_version": GALLERY.version}
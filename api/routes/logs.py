@@ -1,12 +1,16 @@
 # api/routes/logs.py
 from __future__ import annotations
 
-from typing import Any, List, Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 
-from api.common import execute_or_500, get_data, get_one_or_404
-from api.supabase_client import get_supabase
+from api.common import await_or_500, decode_cursor, encode_cursor, first_or_404
+from api.export import EXPORT_CHUNK, export_response
+from api.gallery_sync import EMB_META_CHUNK
+from api.repository import REPO, Filter
 from api.schemas import (
     AttendanceLogCreateRequest,
     AttendanceLogUpdateRequest,
@@ -16,83 +20,179 @@ from api.schemas import (
 router = APIRouter(prefix="/logs", tags=["logs"])
 
 
+LOG_COLUMNS = (
+    "log_id", "event_time", "event_type", "camera_id", "recognized",
+    "similarity", "employee_id", "name", "employee_code", "created_at",
+)
+
+
+def _utc(t: Optional[datetime]) -> Optional[datetime]:
+    if t is None or t.tzinfo is not None:
+        return t
+    return t.replace(tzinfo=timezone.utc)
+
+
+def _log_filters(
+    employee_id: Optional[int],
+    camera_id: Optional[str],
+    event_type: Optional[str],
+    recognized: Optional[bool],
+    time_from: Optional[datetime] = None,
+    time_to: Optional[datetime] = None,
+) -> List[Filter]:
+    """
+    Pushed down to the database; the range is half-open [from, to) on
+    event_time so consecutive days never overlap. Naive times are UTC.
+    See sql/attendance_logs_indexes.sql for the indexes behind these.
+    """
+    filters: List[Filter] = []
+    time_from, time_to = _utc(time_from), _utc(time_to)
+    if time_from is not None and time_to is not None and time_to <= time_from:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if time_from is not None:
+        filters.append(("event_time", "gte", time_from))
+    if time_to is not None:
+        filters.append(("event_time", "lt", time_to))
+    if employee_id is not None:
+        filters.append(("employee_id", "eq", employee_id))
+    if camera_id is not None:
+        filters.append(("camera_id", "eq", camera_id))
+    if event_type is not None:
+        filters.append(("event_type", "eq", event_type))
+    if recognized is not None:
+        filters.append(("recognized", "eq", recognized))
+    return filters
+
+
+async def _log_page(
+    filters: List[Filter], order_desc: bool, limit: int, after: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """One keyset page ordered by (event_time, log_id), strictly past `after`."""
+    page_filters = list(filters)
+    if after is not None:
+        page_filters.append(
+            ("event_time,log_id", "row_lt" if order_desc else "row_gt", (after["event_time"], after["log_id"]))
+        )
+    rows = await REPO.attendance_logs.list(
+        page_filters, order=[("event_time", order_desc), ("log_id", order_desc)], limit=limit
+    )
+    await _attach_names(rows)
+    return rows
+
+
+async def _attach_names(rows: List[Dict[str, Any]]) -> None:
+    # name / code for the UI (separate lookup instead of an embedded join)
+    emp_ids = sorted({row["employee_id"] for row in rows if row.get("employee_id") is not None})
+    if not emp_ids:
+        return
+    # an export page holds up to EXPORT_CHUNK ids: chunk the `in` list (bounded URL length)
+    pages = await asyncio.gather(*(
+        REPO.employees.list(
+            [("employee_id", "in", emp_ids[i:i + EMB_META_CHUNK])], columns="employee_id, name, employee_code"
+        )
+        for i in range(0, len(emp_ids), EMB_META_CHUNK)
+    ))
+    by_id = {e["employee_id"]: e for emps in pages for e in emps}
+    for row in rows:
+        emp = by_id.get(row.get("employee_id"))
+        if emp:
+            row["name"] = emp.get("name")
+            row["employee_code"] = emp.get("employee_code")
+
+
 @router.get("", response_model=List[AttendanceLogResponse])
-def list_logs(
+async def list_logs(
+    response: Response,
     limit: int = Query(default=200, ge=1, le=2000),
     employee_id: Optional[int] = Query(default=None),
     camera_id: Optional[str] = Query(default=None),
     event_type: Optional[str] = Query(default=None),
     recognized: Optional[bool] = Query(default=None),
+    time_from: Optional[datetime] = Query(default=None, alias="from", description="event_time >= from"),
+    time_to: Optional[datetime] = Query(default=None, alias="to", description="event_time < to"),
     order_desc: bool = Query(default=True),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
 ) -> Any:
-    sb = get_supabase()
-
-    def _run():
-        q = sb.table("attendance_logs").select("*, employees(name, employee_code)").limit(limit)
-        if employee_id is not None:
-            q = q.eq("employee_id", employee_id)
-        if camera_id is not None:
-            q = q.eq("camera_id", camera_id)
-        if event_type is not None:
-            q = q.eq("event_type", event_type)
-        if recognized is not None:
-            q = q.eq("recognized", recognized)
-        q = q.order("event_time", desc=order_desc)
-        return q.execute()
-
-    resp = execute_or_500(_run, "list logs")
-    data = get_data(resp)
-    
-    # Flatten the join for the UI
-    for row in data:
-        emp = row.get("employees")
-        if emp:
-            row["name"] = emp.get("name")
-            row["employee_code"] = emp.get("employee_code")
-            
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, ("t", "id", "d"))
+        if bool(after["d"]) != order_desc:
+            raise HTTPException(status_code=400, detail="Cursor was issued for the other order_desc")
+        after = {"event_time": after["t"], "log_id": after["id"]}
+
+    filters = _log_filters(employee_id, camera_id, event_type, recognized, time_from, time_to)
+    data = await await_or_500(_log_page(filters, order_desc, limit, after), "list logs")
+
+    # a full page may have more behind it; the last row is the next page's start
+    if len(data) == limit:
+        last = data[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor({"t": last["event_time"], "id": last["log_id"], "d": order_desc})
     return data
 
 
+@router.get("/count")
+async def count_logs(
+    employee_id: Optional[int] = Query(default=None),
+    camera_id: Optional[str] = Query(default=None),
+    event_type: Optional[str] = Query(default=None),
+    recognized: Optional[bool] = Query(default=None),
+    time_from: Optional[datetime] = Query(default=None, alias="from"),
+    time_to: Optional[datetime] = Query(default=None, alias="to"),
+) -> Dict[str, int]:
+    """Count-only mode: same filters as GET /logs, counted in the database, no rows transferred."""
+    filters = _log_filters(employee_id, camera_id, event_type, recognized, time_from, time_to)
+    return {"count": await await_or_500(REPO.attendance_logs.count(filters), "count logs")}
+
+
+@router.get("/export")
+async def export_logs(
+    format: str = Query(default="ndjson", description="ndjson | csv"),
+    employee_id: Optional[int] = Query(default=None),
+    camera_id: Optional[str] = Query(default=None),
+    event_type: Optional[str] = Query(default=None),
+    recognized: Optional[bool] = Query(default=None),
+    time_from: Optional[datetime] = Query(default=None, alias="from"),
+    time_to: Optional[datetime] = Query(default=None, alias="to"),
+    order_desc: bool = Query(default=True),
+):
+    filters = _log_filters(employee_id, camera_id, event_type, recognized, time_from, time_to)
+
+    async def next_page(after):
+        rows = await _log_page(filters, order_desc, EXPORT_CHUNK, after)
+        return rows, (rows[-1] if len(rows) == EXPORT_CHUNK else None)
+
+    return await export_response(next_page, format, LOG_COLUMNS, "attendance_logs")
+
+
 @router.get("/{log_id}", response_model=AttendanceLogResponse)
-def get_log(log_id: int) -> Any:
-    sb = get_supabase()
-    resp = execute_or_500(
-        lambda: sb.table("attendance_logs").select("*").eq("log_id", log_id).maybe_single().execute(),
-        "get log",
-    )
-    return get_one_or_404(resp, "Log not found")
+async def get_log(log_id: int) -> Any:
+    row = await await_or_500(REPO.attendance_logs.get(log_id), "get log")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Log not found")
+    return row
 
 
 @router.post("", response_model=AttendanceLogResponse)
-def create_log(body: AttendanceLogCreateRequest) -> Any:
-    sb = get_supabase()
+async def create_log(body: AttendanceLogCreateRequest) -> Any:
     payload = body.model_dump(exclude_none=True)
 
-    resp = execute_or_500(lambda: sb.table("attendance_logs").insert(payload).execute(), "create log")
-    return get_one_or_404(resp, "Insert failed (no row returned)")
+    rows = await await_or_500(REPO.attendance_logs.create(payload), "create log")
+    return first_or_404(rows, "Insert failed (no row returned)")
 
 
 @router.patch("/{log_id}", response_model=AttendanceLogResponse)
-def update_log(log_id: int, body: AttendanceLogUpdateRequest) -> Any:
-    sb = get_supabase()
+async def update_log(log_id: int, body: AttendanceLogUpdateRequest) -> Any:
     payload = body.model_dump(exclude_none=True)
     if not payload:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    resp = execute_or_500(
-        lambda: sb.table("attendance_logs").update(payload).eq("log_id", log_id).execute(),
-        "update log",
-    )
-    return get_one_or_404(resp, "Log not found")
+    rows = await await_or_500(REPO.attendance_logs.update(log_id, payload), "update log")
+    return first_or_404(rows, "Log not found")
 
 
 @router.delete("/{log_id}")
-def delete_log(log_id: int) -> Any:
-    sb = get_supabase()
-    resp = execute_or_500(
-        lambda: sb.table("attendance_logs").delete().eq("log_id", log_id).execute(),
-        "delete log",
-    )
-    if not get_data(resp):
+async def delete_log(log_id: int) -> Any:
+    rows = await await_or_500(REPO.attendance_logs.delete(log_id), "delete log")
+    if not rows:
         raise HTTPException(status_code=404, detail="Log not found or already deleted")
     return {"ok": True}
@@ -1,71 +1,150 @@
 from __future__ import annotations
-import cv2
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
 import numpy as np
-from fastapi import APIRouter, UploadFile, File, Form
-from typing import Dict
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 
-from api.supabase_client import get_supabase
-from api.models.face_models import detect_faces, get_embedding, safe_crop
+from api.batching import ARCFACE_BATCHER
+from api.common import env_bool, env_camera_map, env_float, env_int
+from api.dedupe import ATTENDANCE_DEDUPE
+from api.embedding import detect_face_crops
+from api.inference import INFERENCE
+from api.log_sink import ATTENDANCE_SINK
+from api.recognition_gallery import GALLERY, MATCHER, ensure_gallery, refresh_embeddings, search_many
+from api.tracking import TRACKING_ENABLED, FaceTracker
 
 router = APIRouter(prefix="/recognize", tags=["recognition"])
 
-# 🔑 CACHE: { emp_id: { "vec": ..., "name": ..., "code": ... } }
-KNOWN: Dict[int, Dict] = {}
+RECOGNITION_THRESHOLD = env_float("RECOGNITION_THRESHOLD", 0.38)
+MAX_FACES = env_int("RECOGNIZE_MAX_FACES", 16)
+# e.g. DET_MIN_FACE_PX_BY_CAMERA="TURNSTILE-1=120,LOBBY=32"
+MIN_FACE_BY_CAMERA = env_camera_map("DET_MIN_FACE_PX_BY_CAMERA", int)
 
+# per-camera face tracks: identity is reused across frames instead of re-embedding
+TRACKER = FaceTracker(RECOGNITION_THRESHOLD)
 
-def refresh_embeddings():
-    global KNOWN
-    sb = get_supabase()
 
-    # 1. Fetch face embeddings joined with persons
-    # (persons -> face_embeddings should exist via person_id)
-    rows = sb.table("face_embeddings") \
-        .select("embedding, persons!inner(employee_id, name)") \
-        .execute().data
+@router.post("/refresh")
+def refresh_gallery():
+    """Full reload from Supabase. Reconciliation path only; enroll/delete apply deltas."""
+    refresh_embeddings()
+    return {
+        "ok": True,
+        "employees": len(GALLERY),
+        "templates": GALLERY.template_total,
+        "gallery_version": GALLERY.version,
+    }
 
-    if not rows:
-        KNOWN.clear()
-        print("ℹ️ No embeddings found in database.")
-        return
 
-    # 2. Collect unique employee IDs (they might be strings in 'persons')
-    emp_ids_raw = list({r["persons"]["employee_id"] for r in rows if r.get("persons")})
-    
-    # 3. Fetch employee codes from employees table
-    # We fetch them separately to avoid join errors if foreign keys are missing
-    emp_meta = {}
-    try:
-        emp_resp = sb.table("employees") \
-            .select("employee_id, employee_code") \
-            .in_("employee_id", emp_ids_raw) \
-            .execute().data
-        for e in emp_resp:
-            emp_meta[str(e["employee_id"])] = e.get("employee_code")
-    except Exception as e:
-        print(f"⚠️ Could not fetch employee codes: {e}")
-
-    # 4. Rebuild Cache
-    KNOWN.clear()
-    for r in rows:
-        p = r.get("persons")
-        if not p: continue
-        
-        raw_id = p["employee_id"]
-        emp_id = int(raw_id)
-        name = p.get("name") or "Unknown"
-        code = emp_meta.get(str(raw_id)) or f"ID-{emp_id}"
-        
-        vec_str = r["embedding"].strip("[]")
-        if not vec_str: continue
-        
-        vec = np.fromstring(vec_str, sep=",", dtype=np.float32)
-        KNOWN[emp_id] = {
-            "vec": vec / np.linalg.norm(vec),
-            "name": name,
-            "code": code
-        }
-
-    print(f"✅ Loaded {len(KNOWN)} embeddings with metadata")
+@router.get("/ann-recall")
+def ann_recall(
+    k: int = Query(default=10, ge=1, le=100),
+    queries: int = Query(default=200, ge=1, le=5000),
+):
+    """recall@k of the ANN index vs exact search (MATCHER_BACKEND=ivf)."""
+    return GALLERY.ann_recall(k=k, n_queries=queries)
+
+
+def _match_result(best, box=None):
+    best_id = best["employee_id"] if best else None
+    best_score = best["score"] if best else -1
+
+    result = {
+        "recognized": best_score >= RECOGNITION_THRESHOLD,
+        "employee_id": best_id,
+        "similarity": round(best_score, 4),
+    }
+    if box is not None:
+        result["box"] = box
+    if result["recognized"]:
+        result["name"] = best["name"]
+        result["employee_code"] = best["code"]
+    return result
+
+
+
+
+async def _match_faces(crops, boxes, camera_id: str):
+    """Embed + match the faces of one frame; tracked faces reuse their last match."""
+    if not TRACKING_ENABLED:
+        embs = np.stack(await ARCFACE_BATCHER.embed_many(crops))
+        return [
+            _match_result(m[0] if m else None, box)
+            for m, box in zip(await search_many(embs, k=1), boxes)
+        ]
+
+    version = GALLERY.version
+    tracks = TRACKER.update(camera_id, boxes)
+    todo, reuse = TRACKER.plan(tracks, version)
+
+    faces = [None] * len(crops)
+    if todo:
+        embs = np.stack(await ARCFACE_BATCHER.embed_many([crops[i] for i in todo]))
+        for i, m in zip(todo, await search_many(embs, k=1)):
+            faces[i] = _match_result(m[0] if m else None, boxes[i])
+            TRACKER.record(tracks[i], faces[i], version)
+    for i in reuse:
+        faces[i] = {**tracks[i].result, "box": boxes[i]}
+
+    for face, track in zip(faces, tracks):
+        face["track_id"] = track.id
+    return faces
+
+
+def _log_attendance(results, camera_id: str, event_type: str) -> None:
+    event_time = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for r in results:
+        if not r["recognized"]:
+            continue
+        # repeats inside the (employee, camera, event_type) cooldown are not logged
+        r["deduplicated"] = not ATTENDANCE_DEDUPE.admit(r["employee_id"], camera_id, event_type)
+        if r["deduplicated"]:
+            continue
+        rows.append({
+            "event_time": event_time,
+            "employee_id": r["employee_id"],
+            "camera_id": camera_id,
+            "event_type": event_type,
+            "recognized": True,
+            "similarity": r["similarity"],
+        })
+
+    # 🕒 LOG ATTENDANCE (write-behind: bulk-inserted off the request path)
+    ATTENDANCE_SINK.put(rows)
+
+
+async def _recognize_frame(
+    img_bytes: bytes,
+    event_type: str,
+    camera_id: str,
+    multi_face: bool = False,
+    min_face_px: Optional[int] = None,
+) -> Dict[str, Any]:
+    if min_face_px is None:
+        min_face_px = MIN_FACE_BY_CAMERA.get(camera_id)
+
+    # every detected face (or just the largest) -> one batched ArcFace call -> one matrix product
+    max_faces = MAX_FACES if multi_face else 1
+    crops, boxes, _ = await INFERENCE.run(detect_face_crops, img_bytes, max_faces, min_face_px)
+    if not crops:
+        return {"recognized": False, "faces": []} if multi_face else {"recognized": False}
+
+    # map generations other workers published (one stat() when unchanged);
+    # long-lived streams would otherwise keep matching a stale gallery
+    await run_in_threadpool(ensure_gallery)
+    faces = await _match_faces(crops, boxes, camera_id)
+    _log_attendance(faces, camera_id, event_type)
+
+    if multi_face:
+        return {"recognized": any(f["recognized"] for f in faces), "faces": faces}
+    result = faces[0]
+    result.pop("box", None)
+    return result
 
 
 @router.post("/")
@@ -73,50 +152,130 @@ async def recognize(
     image: UploadFile = File(...),
     event_type: str = Form(...),
     camera_id: str = Form(...),
+    multi_face: bool = Form(False),
+    min_face_px: Optional[int] = Form(None),
 ):
-    if not KNOWN:
-        refresh_embeddings()
+    img_bytes = await image.read()
+    return await _recognize_frame(img_bytes, event_type, camera_id, multi_face, min_face_px)
 
-    img = cv2.imdecode(np.frombuffer(await image.read(), np.uint8), cv2.IMREAD_COLOR)
-    faces = detect_faces(img)
 
-    if not faces:
-        return {"recognized": False}
+# ------------------------------------------------------------
+# Streaming: one WebSocket per camera
+#   1. client sends a JSON hello:
+#        {"camera_id": "...", "event_type": "...", "multi_face": false, "min_face_px": null}
+#      server answers {"type": "ready", ...} or closes with 1008
+#   2. client sends JPEG/PNG frames as binary messages
+#   3. server sends {"type": "result", "frame": <seq>, "dropped": n, ...}
+#      for the newest frame whenever inference is free; frames that were
+#      overwritten before inference picked them up are dropped, never queued
+#
+#   STREAM_REQUIRE_CAMERA  hello must name an active row in `cameras`
+# ------------------------------------------------------------
+STREAM_REQUIRE_CAMERA = env_bool("STREAM_REQUIRE_CAMERA", False)
 
-    faces.sort(key=lambda b: (b[2]-b[0])*(b[3]-b[1]), reverse=True)
-    face = safe_crop(img, faces[0])
-    emb = get_embedding(face)
-    emb = emb / np.linalg.norm(emb)
 
-    best_id, best_score = None, -1
-    for eid, data in KNOWN.items():
-        ref = data["vec"]
-        s = float(np.dot(emb, ref))
-        if s > best_score:
-            best_id, best_score = eid, s
+async def _camera_allowed(camera_id: str) -> bool:
+    from api.routes.cameras import load_camera
+    row = await load_camera(camera_id)
+    return row is not None and row.get("is_active") is not False
 
-    is_recognized = best_score >= 0.38
-    result = {
-        "recognized": is_recognized,
-        "employee_id": best_id,
-        "similarity": round(best_score, 4),
-    }
 
-    if is_recognized and best_id in KNOWN:
-        result["name"] = KNOWN[best_id]["name"]
-        result["employee_code"] = KNOWN[best_id]["code"]
+async def _stream_hello(ws: WebSocket) -> Optional[Dict[str, Any]]:
+    try:
+        hello = json.loads(await ws.receive_text())
+    except (ValueError, KeyError):
+        hello = None
+    if not isinstance(hello, dict) or not hello.get("camera_id") or not hello.get("event_type"):
+        await ws.close(code=1008, reason="First message must be JSON with camera_id and event_type")
+        return None
 
-        # 🕒 LOG ATTENDANCE (Optional: call logs route or insert here)
+    camera_id = str(hello["camera_id"])
+    if STREAM_REQUIRE_CAMERA:
         try:
-            sb = get_supabase()
-            sb.table("attendance_logs").insert({
-                "employee_id": best_id,
-                "camera_id": camera_id,
-                "event_type": event_type,
-                "recognized": True,
-                "similarity": round(best_score, 4)
-            }).execute()
+            allowed = await _camera_allowed(camera_id)
         except Exception as e:
-            print(f"❌ Failed to log attendance: {e}")
+            print(f"❌ Camera lookup failed for stream {camera_id}: {e}")
+            allowed = False
+        if not allowed:
+            await ws.close(code=1008, reason="Unknown or inactive camera")
+            return None
 
-    return result
+    min_face_px = hello.get("min_face_px")
+    if min_face_px is not None:
+        try:
+            if isinstance(min_face_px, bool):
+                raise ValueError
+            min_face_px = int(min_face_px)
+            if min_face_px < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            await ws.close(code=1008, reason="min_face_px must be a non-negative integer")
+            return None
+
+    return {
+        "camera_id": camera_id,
+        "event_type": str(hello["event_type"]),
+        "multi_face": bool(hello.get("multi_face", False)),
+        "min_face_px": min_face_px,
+    }
+
+
+@router.websocket("/stream")
+async def recognize_stream(ws: WebSocket):
+    await ws.accept()
+    cfg = await _stream_hello(ws)
+    if cfg is None:
+        return
+
+    await run_in_threadpool(ensure_gallery)
+    await ws.send_json({"type": "ready", **cfg})
+
+    # latest-frame slot: the reader overwrites, the worker takes
+    slot: Dict[str, Any] = {"frame": None, "seq": 0, "dropped": 0}
+    has_frame = asyncio.Event()
+
+    async def reader():
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            data = msg.get("bytes")
+            if not data:
+                continue
+            if slot["frame"] is not None:
+                slot["dropped"] += 1
+            slot["seq"] += 1
+            slot["frame"] = (slot["seq"], data)
+            has_frame.set()
+
+    async def worker():
+        while True:
+            await has_frame.wait()
+            has_frame.clear()
+            seq, data = slot["frame"]
+            slot["frame"] = None
+            try:
+                res = await _recognize_frame(
+                    data, cfg["event_type"], cfg["camera_id"], cfg["multi_face"], cfg["min_face_px"]
+                )
+            except HTTPException as e:
+                msg = {"type": "error", "frame": seq, "status": e.status_code, "detail": e.detail}
+            except Exception as e:
+                # one bad frame must not end the stream
+                print(f"❌ Recognition stream {cfg['camera_id']} frame {seq} failed: {e}")
+                msg = {"type": "error", "frame": seq, "status": 500, "detail": "Recognition failed"}
+            else:
+                msg = {"type": "result", "frame": seq, "dropped": slot["dropped"], **res}
+            await ws.send_json(msg)
+
+    tasks = [asyncio.create_task(reader()), asyncio.create_task(worker())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            exc = t.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                print(f"❌ Recognition stream {cfg['camera_id']} failed: {exc}")
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -32,6 +32,7 @@ class EmployeeResponse(BaseModel):
     is_active: bool = True
     role: Optional[RoleType] = None
     has_face: bool = False
+    face_templates: int = 0
 
 
 # -----------------------------
@@ -0,0 +1,162 @@
+# api/shared_gallery.py
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from api.common import env_bool, env_str
+from api.gallery import FaceGallery
+from api.snapshot import MANIFEST, load_snapshot, read_manifest, save_snapshot
+
+
+def _default_dir() -> str:
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() else Path("/tmp")
+    return str(base / "face_gallery")
+
+
+class SharedGallery:
+    """
+    One gallery for every worker process on the host.
+
+    The gallery is published in the snapshot format (api/snapshot.py) into
+    a RAM-backed directory (/dev/shm). Every worker memory-maps the same
+    files, so the template matrix and centroids live once in the page cache
+    however many workers run.
+
+    Writers take an exclusive file lock, map the newest generation first
+    (so they never publish over another worker's change), apply their
+    delta, publish the next generation and map it back, dropping their
+    private copy. Readers call `sync()`, which is one stat() of the
+    manifest unless a new generation appeared.
+    """
+
+    def __init__(self, gallery: FaceGallery, directory: str, enabled: bool):
+        self.gallery = gallery
+        self.enabled = enabled
+        self.directory = Path(directory)
+        self.generation = -1
+        self._seen: Optional[Tuple[int, int]] = None
+        self._tlock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_fd: Optional[int] = None
+
+        # stats
+        self.published = 0
+        self.mapped = 0
+        self.last_publish_ms: Optional[float] = None
+
+    # ------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------
+    def _manifest_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.directory / MANIFEST)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def sync(self) -> bool:
+        """Map the published generation if it changed. True if one was mapped."""
+        if not self.enabled:
+            return False
+        key = self._manifest_key()
+        if key is None or key == self._seen:
+            return False
+        # a writer in this process is mid-change; it maps the result itself
+        if not self._tlock.acquire(blocking=False):
+            return False
+        try:
+            snap = load_snapshot(self.directory, self.gallery.dim)
+            if snap is None:
+                return False
+            self.gallery.restore(
+                snap["matrix"], snap["template_ids"], snap["ids"],
+                snap["names"], snap["codes"], snap["counts"], snap["centroids"],
+            )
+            self._seen = key
+            self.generation = snap["generation"]
+            self.mapped += 1
+            return True
+        finally:
+            self._tlock.release()
+
+    # ------------------------------------------------------------
+    # Writers
+    # ------------------------------------------------------------
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # thread lock inside the process, flock across processes;
+        # re-entrant (startup nests a full reload inside a write)
+        with self._tlock:
+            if self._lock_depth == 0:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._lock_fd = os.open(self.directory / ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                    os.close(self._lock_fd)
+                    self._lock_fd = None
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """
+        Wrap every gallery mutation:
+
+            with SHARED_GALLERY.write():
+                GALLERY.add_templates(...)
+        """
+        if not self.enabled:
+            yield
+            return
+        with self._file_lock():
+            self.sync()
+            before = self.gallery.version
+            yield
+            if self._lock_depth == 1 and self.gallery.version != before:
+                self._publish()
+
+    def _publish(self) -> None:
+        t0 = time.perf_counter()
+        manifest = read_manifest(self.directory)
+        generation = int(manifest.get("generation", 0)) + 1 if manifest else 1
+        save_snapshot(
+            self.directory, self.gallery.state, self.gallery.watermark, self.gallery.version, generation
+        )
+        self.published += 1
+        self.sync()  # swap our private arrays for the shared mapping
+        self.last_publish_ms = round(1000 * (time.perf_counter() - t0), 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "generation": self.generation,
+            "published": self.published,
+            "mapped": self.mapped,
+            "last_publish_ms": self.last_publish_ms,
+            "pid": os.getpid(),
+        }
+
+
+# ------------------------------------------------------------
+# Shared gallery (env)
+#   GALLERY_SHARED      share the gallery between worker processes
+#   GALLERY_SHARED_DIR  RAM-backed publish directory (default /dev/shm/face_gallery)
+# ------------------------------------------------------------
+def make_shared(gallery: FaceGallery) -> SharedGallery:
+    return SharedGallery(
+        gallery,
+        env_str("GALLERY_SHARED_DIR", _default_dir()),
+        env_bool("GALLERY_SHARED", False),
+    )
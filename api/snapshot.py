@@ -0,0 +1,170 @@
+# api/snapshot.py
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+# ------------------------------------------------------------
+# On-disk gallery snapshot
+#
+#   gallery.json              manifest (replaced atomically, written last)
+#   gallery.<gen>.npy         T x D float32 template matrix (memory-mapped on load)
+#   gallery.<gen>.cent.npy    N x D float32 identity centroids (memory-mapped)
+#   gallery.<gen>.ids.npz     template_ids (T), ids / counts (N)
+#
+# The manifest holds the watermark (max face_embeddings.id covered), the
+# per-identity names / codes and the file names of its generation, so a
+# reader never pairs a matrix with the wrong sidecar. Older generations
+# are removed after the manifest switch; processes still mapping them
+# keep their (unlinked) pages until they move on.
+#
+# Writers hold an exclusive flock on .snapshot.lock in the directory and
+# readers a shared one, whether or not the gallery is shared between
+# workers: every worker may save into the same directory.
+# ------------------------------------------------------------
+SNAPSHOT_FORMAT = 2
+MANIFEST = "gallery.json"
+LOCK_FILE = ".snapshot.lock"
+
+
+@contextmanager
+def _locked(directory: Path, exclusive: bool) -> Iterator[None]:
+    directory.mkdir(parents=True, exist_ok=True)
+    fd = os.open(directory / LOCK_FILE, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _manifest_files(manifest: Optional[Dict[str, Any]]) -> set:
+    if not manifest:
+        return set()
+    return {manifest.get(k) for k in ("matrix", "centroids", "sidecar")} - {None}
+
+
+def read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((Path(directory) / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"⚠️ Gallery snapshot manifest unreadable: {e}")
+        return None
+
+
+def save_snapshot(
+    directory: Path, state, watermark: int, gallery_version: int, generation: int = 0
+) -> Dict[str, Any]:
+    """Persist a gallery state (api.gallery._GalleryState). Returns the manifest."""
+    directory = Path(directory)
+    with _locked(directory, exclusive=True):
+        return _save_locked(directory, state, watermark, gallery_version, generation)
+
+
+def _save_locked(directory: Path, state, watermark: int, gallery_version: int, generation: int) -> Dict[str, Any]:
+    gen = f"{int(time.time() * 1000)}-{os.getpid()}"
+    matrix_name, cent_name, ids_name = f"gallery.{gen}.npy", f"gallery.{gen}.cent.npy", f"gallery.{gen}.ids.npz"
+
+    np.save(directory / matrix_name, np.ascontiguousarray(state.matrix, dtype=np.float32))
+    np.save(directory / cent_name, np.ascontiguousarray(state.centroids, dtype=np.float32))
+    np.savez(
+        directory / ids_name,
+        template_ids=np.asarray(state.template_ids, dtype=np.int64),
+        ids=np.asarray(state.ids, dtype=np.int64),
+        counts=np.asarray(state.counts, dtype=np.int64),
+    )
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "generation": int(generation),
+        "watermark": int(watermark),
+        "gallery_version": int(gallery_version),
+        "dim": int(state.matrix.shape[1]),
+        "templates": int(state.matrix.shape[0]),
+        "identities": int(state.ids.shape[0]),
+        "matrix": matrix_name,
+        "centroids": cent_name,
+        "sidecar": ids_name,
+        "names": [str(n) for n in state.names.tolist()],
+        "codes": [str(c) for c in state.codes.tolist()],
+        "saved_at": time.time(),
+    }
+    tmp = directory / f"{MANIFEST}.{gen}.tmp"
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, directory / MANIFEST)
+
+    # only what the manifest on disk does not reference (it is ours: we hold the lock)
+    keep = _manifest_files(read_manifest(directory))
+    for old in directory.glob("gallery.*.np[yz]"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+    return manifest
+
+
+def load_snapshot(directory: Path, dim: int) -> Optional[Dict[str, Any]]:
+    """
+    -> {generation, watermark, matrix / centroids (read-only memmaps),
+        template_ids, ids, counts, names, codes} or None if unusable.
+    """
+    directory = Path(directory)
+    if not (directory / MANIFEST).exists():
+        return None
+    # shared lock: a writer cannot remove this generation's files mid-open
+    with _locked(directory, exclusive=False):
+        return _load_locked(directory, dim)
+
+
+def _load_locked(directory: Path, dim: int) -> Optional[Dict[str, Any]]:
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("dim") != dim:
+        print(f"ℹ️ Gallery snapshot ignored (format {manifest.get('format')}, dim {manifest.get('dim')})")
+        return None
+
+    try:
+        # empty arrays cannot be memory-mapped
+        mode = "r" if manifest.get("templates") else None
+        matrix = np.load(directory / manifest["matrix"], mmap_mode=mode)
+        centroids = np.load(directory / manifest["centroids"], mmap_mode=mode)
+        with np.load(directory / manifest["sidecar"]) as side:
+            template_ids, ids, counts = side["template_ids"], side["ids"], side["counts"]
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠️ Gallery snapshot unreadable: {e}")
+        return None
+
+    n = ids.shape[0]
+    if (
+        matrix.shape != (manifest["templates"], dim)
+        or template_ids.shape[0] != matrix.shape[0]
+        or int(counts.sum()) != matrix.shape[0]
+        or centroids.shape != (n, dim)
+        or len(manifest["names"]) != n
+        or len(manifest["codes"]) != n
+    ):
+        print("⚠️ Gallery snapshot inconsistent, ignoring it")
+        return None
+
+    return {
+        "generation": int(manifest.get("generation", 0)),
+        "watermark": int(manifest["watermark"]),
+        "gallery_version": int(manifest.get("gallery_version", 0)),
+        "matrix": matrix,
+        "template_ids": template_ids,
+        "ids": ids,
+        "counts": counts,
+        "centroids": centroids,
+        "names": np.asarray(manifest["names"], dtype=object),
+        "codes": np.asarray(manifest["codes"], dtype=object),
+    }
@@ -0,0 +1,156 @@
+# api/tracking.py
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.common import env_bool, env_float
+from api.models.postprocess import box_iou
+
+# ------------------------------------------------------------
+# Tracker config (env)
+#   TRACKING_ENABLED      per-camera tracking on /recognize
+#   TRACK_IOU             min IoU to continue a track in the next frame
+#   TRACK_TTL_SEC         drop a track not seen for this long
+#   TRACK_REEMBED_SEC     re-check a track's identity at least this often
+#   TRACK_CONFIDENT_MARGIN  score above the threshold a track needs before
+#                           its identity is reused without re-embedding
+# ------------------------------------------------------------
+TRACKING_ENABLED = env_bool("TRACKING_ENABLED", True)
+TRACK_IOU = env_float("TRACK_IOU", 0.3)
+TRACK_TTL_SEC = env_float("TRACK_TTL_SEC", 2.0)
+TRACK_REEMBED_SEC = env_float("TRACK_REEMBED_SEC", 1.5)
+TRACK_CONFIDENT_MARGIN = env_float("TRACK_CONFIDENT_MARGIN", 0.05)
+
+_track_ids = itertools.count(1)
+
+
+class Track:
+    __slots__ = ("id", "box", "last_seen", "result", "embedded_at", "gallery_version", "hits")
+
+    def __init__(self, box: np.ndarray, now: float):
+        self.id = next(_track_ids)
+        self.box = box
+        self.last_seen = now
+        self.result: Optional[Dict[str, Any]] = None
+        self.embedded_at = 0.0
+        self.gallery_version = -1
+        self.hits = 1
+
+
+class CameraTracker:
+    """
+    IoU tracker for one camera. Each frame's boxes are matched greedily
+    (highest IoU first) to the live tracks; unmatched boxes open new
+    tracks and tracks unseen for `ttl` seconds are dropped.
+    """
+
+    def __init__(self, iou_thresh: float = TRACK_IOU, ttl: float = TRACK_TTL_SEC):
+        self.iou_thresh = iou_thresh
+        self.ttl = ttl
+        self.tracks: List[Track] = []
+
+    def update(self, boxes: Sequence[Sequence[int]], now: float) -> List[Track]:
+        """-> one track per box, in box order."""
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.ttl]
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        assigned: List[Optional[Track]] = [None] * len(boxes)
+
+        if len(boxes) and self.tracks:
+            iou = box_iou(boxes, np.stack([t.box for t in self.tracks]))
+            order = np.argsort(-iou, axis=None)
+            used_b, used_t = set(), set()
+            for flat in order:
+                b, t = divmod(int(flat), iou.shape[1])
+                if iou[b, t] < self.iou_thresh:
+                    break
+                if b in used_b or t in used_t:
+                    continue
+                used_b.add(b)
+                used_t.add(t)
+                assigned[b] = self.tracks[t]
+
+        for b, box in enumerate(boxes):
+            track = assigned[b]
+            if track is None:
+                track = Track(box, now)
+                self.tracks.append(track)
+                assigned[b] = track
+            else:
+                track.box = box
+                track.last_seen = now
+                track.hits += 1
+        return assigned
+
+
+class FaceTracker:
+    """Per-camera trackers plus the re-embed policy used by /recognize."""
+
+    def __init__(
+        self,
+        threshold: float,
+        reembed_sec: float = TRACK_REEMBED_SEC,
+        margin: float = TRACK_CONFIDENT_MARGIN,
+    ):
+        self.threshold = threshold
+        self.reembed_sec = reembed_sec
+        self.margin = margin
+        self._cams: Dict[str, CameraTracker] = {}
+        self._lock = threading.Lock()
+
+        # stats
+        self.faces = 0
+        self.embedded = 0
+        self.reused = 0
+
+    def update(self, camera_id: str, boxes: Sequence[Sequence[int]], now: Optional[float] = None) -> List[Track]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            cam = self._cams.get(camera_id)
+            if cam is None:
+                cam = self._cams[camera_id] = CameraTracker()
+            return cam.update(boxes, now)
+
+    def needs_embedding(self, track: Track, gallery_version: int, now: Optional[float] = None) -> bool:
+        """New, uncertain, stale, or matched against an older gallery."""
+        now = time.monotonic() if now is None else now
+        r = track.result
+        return (
+            r is None
+            or r["similarity"] < self.threshold + self.margin
+            or now - track.embedded_at >= self.reembed_sec
+            or track.gallery_version != gallery_version
+        )
+
+    def plan(self, tracks: Sequence[Track], gallery_version: int) -> Tuple[List[int], List[int]]:
+        """-> (indices to embed, indices whose track identity is reused)."""
+        now = time.monotonic()
+        embed, reuse = [], []
+        for i, t in enumerate(tracks):
+            (embed if self.needs_embedding(t, gallery_version, now) else reuse).append(i)
+        self.faces += len(tracks)
+        self.embedded += len(embed)
+        self.reused += len(reuse)
+        return embed, reuse
+
+    def record(self, track: Track, result: Dict[str, Any], gallery_version: int) -> None:
+        track.result = {k: v for k, v in result.items() if k not in ("box", "track_id")}
+        track.embedded_at = time.monotonic()
+        track.gallery_version = gallery_version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = {cam: len(t.tracks) for cam, t in self._cams.items()}
+        return {
+            "enabled": TRACKING_ENABLED,
+            "cameras": len(live),
+            "live_tracks": sum(live.values()),
+            "faces": self.faces,
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "reuse_ratio": round(self.reused / self.faces, 4) if self.faces else None,
+        }
@@ -3,7 +3,9 @@ from __future__ import annotations
 import os
 import requests
 import json
-from typing import Any, Dict, List, Optional
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,11 +28,20 @@ def _base(api_base: Optional[str]) -> str:
         b = "http://127.0.0.1:8000"
     return b
 
+_local = threading.local()
+
+def _session() -> requests.Session:
+    # one keep-alive connection pool per thread (Streamlit runs scripts on many threads)
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
 def _try_urls(method: str, urls: List[str], *, timeout: float = 30, **kwargs) -> Any:
     last_err: Optional[str] = None
     for url in urls:
         try:
-            r = requests.request(
+            r = _session().request(
                 method,
                 url,
                 headers=_headers(),
@@ -46,6 +57,24 @@ def _try_urls(method: str, urls: List[str], *, timeout: float = 30, **kwargs) ->
 
     raise ApiError(f"API call failed. Tried: {urls}\nLast error: {last_err}")
 
+def _get_page(url: str, params: Dict[str, Any], timeout: float = 30) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """GET a keyset-paged list -> (rows, X-Next-Cursor or None on the last page)."""
+    r = _session().get(url, headers=_headers(), params=params, timeout=timeout)
+    if r.status_code >= 400:
+        raise ApiError(f"API call failed: {url}\nLast error: {r.status_code} {r.text[:300]}")
+    rows = r.json()
+    return (rows if isinstance(rows, list) else []), r.headers.get("X-Next-Cursor")
+
+def export_data(resource: str, fmt: str = "csv", params: Optional[Dict[str, Any]] = None, api_base: str = "") -> bytes:
+    """Download /{resource}/export (streamed by the API, read in chunks)."""
+    url = f"{_base(api_base)}/{resource}/export"
+    q = {k: (str(v).lower() if isinstance(v, bool) else v) for k, v in (params or {}).items() if v is not None}
+    q["format"] = fmt
+    with _session().get(url, headers=_headers(), params=q, stream=True, timeout=300) as r:
+        if r.status_code >= 400:
+            raise ApiError(f"Export failed: {r.status_code} {r.text[:300]}")
+        return b"".join(r.iter_content(chunk_size=1 << 16))
+
 def _wrap_recognize_response(res: Any) -> Dict[str, Any]:
     if not isinstance(res, dict):
         return {"recognized": False, "message": str(res)}
@@ -61,10 +90,14 @@ def _wrap_recognize_response(res: Any) -> Dict[str, Any]:
 # ------------------------------------------------------------
 # Employees
 # ------------------------------------------------------------
-def list_employees(query: str = "", limit: int = 50, api_base: str = "") -> List[Dict[str, Any]]:
+def list_employees(
+    query: str = "", limit: int = 50, has_face: Optional[bool] = None, api_base: str = ""
+) -> List[Dict[str, Any]]:
     b = _base(api_base)
     url = f"{b}/employees"
     params = {"limit": limit, "query": query}
+    if has_face is not None:
+        params["has_face"] = "true" if has_face else "false"
     res = _try_urls("GET", [url], params=params)
     if isinstance(res, list):
         return res
@@ -135,6 +168,36 @@ def fetch_logs(limit: int = 50, api_base: str = "") -> List[Dict[str, Any]]:
         return res
     return []
 
+def log_filters(
+    recognized: Optional[bool] = None,
+    time_from: Optional[datetime] = None,
+    time_to: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Query params for the server-side filters of /logs, /logs/count and /logs/export."""
+    params: Dict[str, Any] = {}
+    if recognized is not None:
+        params["recognized"] = "true" if recognized else "false"
+    if time_from is not None:
+        params["from"] = time_from.isoformat()
+    if time_to is not None:
+        params["to"] = time_to.isoformat()
+    return params
+
+def fetch_logs_page(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    api_base: str = "",
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    params: Dict[str, Any] = {"limit": limit, **(filters or {})}
+    if cursor:
+        params["cursor"] = cursor
+    return _get_page(f"{_base(api_base)}/logs", params)
+
+def count_logs(filters: Optional[Dict[str, Any]] = None, api_base: str = "") -> int:
+    res = _try_urls("GET", [f"{_base(api_base)}/logs/count"], params=filters or {})
+    return int(res.get("count", 0)) if isinstance(res, dict) else 0
+
 # ------------------------------------------------------------
 # Cameras
 # ------------------------------------------------------------
@@ -153,7 +216,7 @@ def health(api_base: str = "") -> bool:
     b = _base(api_base)
     url = f"{b}/health"
     try:
-        r = requests.get(url, headers=_headers(), timeout=5)
+        r = _session().get(url, headers=_headers(), timeout=5)
         return r.status_code < 400
     except Exception:
         return False
@@ -161,10 +224,93 @@ def health(api_base: str = "") -> bool:
 # ------------------------------------------------------------
 # Recognize
 # ------------------------------------------------------------
-def recognize(image_bytes: bytes, event_type: str, camera_id: str, api_base: str = "") -> Dict[str, Any]:
+def recognize(image_bytes: bytes, event_type: str, camera_id: str, api_base: str = "", multi_face: bool = False) -> Dict[str, Any]:
     b = _base(api_base)
     url = f"{b}/recognize"
     files = {"image": ("frame.jpg", image_bytes, "image/jpeg")}
     data = {"event_type": event_type, "camera_id": camera_id}
+    if multi_face:
+        data["multi_face"] = "true"
     res = _try_urls("POST", [url], files=files, data=data, timeout=60)
     return _wrap_recognize_response(res)
+
+class RecognizeStream:
+    """
+    Persistent /recognize/stream WebSocket for one camera.
+
+        stream = RecognizeStream("CAM-01", "check-in")
+        stream.send_frame(jpeg_bytes)   # never blocks on inference
+        res = stream.poll()             # newest result so far, or None
+
+    The server only processes the newest frame, so sending faster than it
+    can keep up just drops stale frames.
+    """
+
+    def __init__(self, camera_id: str, event_type: str, api_base: str = "", multi_face: bool = False, timeout: float = 10):
+        self.camera_id = camera_id
+        self.event_type = event_type
+        self.multi_face = multi_face
+        self.timeout = timeout
+        b = _base(api_base)
+        self.url = ("wss://" + b[len("https://"):] if b.startswith("https://") else "ws://" + b.split("://", 1)[-1]) + "/recognize/stream"
+        self._ws = None
+
+    def connect(self) -> "RecognizeStream":
+        from websockets.sync.client import connect
+
+        try:
+            self._ws = connect(self.url, additional_headers=_headers(), open_timeout=self.timeout)
+            self._ws.send(json.dumps({
+                "camera_id": self.camera_id,
+                "event_type": self.event_type,
+                "multi_face": self.multi_face,
+            }))
+            ready = json.loads(self._ws.recv(timeout=self.timeout))
+        except Exception as e:
+            self.close()
+            raise ApiError(f"Stream connect failed ({self.url}): {e}")
+        if ready.get("type") != "ready":
+            self.close()
+            raise ApiError(f"Stream rejected: {ready}")
+        return self
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    def send_frame(self, image_bytes: bytes) -> None:
+        if self._ws is None:
+            self.connect()
+        try:
+            self._ws.send(image_bytes)
+        except Exception as e:
+            self.close()
+            raise ApiError(f"Stream send failed: {e}")
+
+    def poll(self, timeout: float = 0) -> Optional[Dict[str, Any]]:
+        """Drain pending messages and return the newest result (None if nothing arrived)."""
+        if self._ws is None:
+            return None
+        latest = None
+        try:
+            while True:
+                msg = json.loads(self._ws.recv(timeout=timeout))
+                if msg.get("type") == "result":
+                    latest = _wrap_recognize_response(msg)
+                elif msg.get("type") == "error":
+                    latest = {"recognized": False, "message": msg.get("detail")}
+                timeout = 0
+        except TimeoutError:
+            pass
+        except Exception as e:
+            self.close()
+            raise ApiError(f"Stream receive failed: {e}")
+        return latest
+
+    def close(self) -> None:
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+            self._ws = None
@@ -57,9 +57,24 @@ with col_info:
         if "last_scan_ts" not in st.session_state:
             st.session_state.last_scan_ts = 0
 
+        # one persistent WebSocket per session; falls back to HTTP if it cannot connect
+        if "recognize_stream" not in st.session_state:
+            st.session_state.recognize_stream = api_service.RecognizeStream(
+                camera_id="CAM-01", event_type="check-in"
+            )
+        stream = st.session_state.recognize_stream
+
+        # newest result the server has pushed since the last rerun
+        try:
+            res = stream.poll()
+            if res is not None:
+                st.session_state.last_scan_result = res
+        except Exception:
+            pass
+
         now = time.time()
-        # Scan every 1.5 seconds for higher responsiveness
-        if now - st.session_state.last_scan_ts > 1.5:
+        # frames are cheap on the stream (the server drops stale ones)
+        if now - st.session_state.last_scan_ts > 0.5:
             frame = ctx.video_processor.latest_bgr
             if frame is not None:
                 status_placeholder.markdown("""
@@ -71,12 +86,17 @@ with col_info:
                 
                 _, img_encoded = cv2.imencode(".jpg", frame)
                 try:
-                    res = api_service.recognize(
-                        image_bytes=img_encoded.tobytes(),
-                        event_type="check-in",
-                        camera_id="CAM-01"
-                    )
-                    st.session_state.last_scan_result = res
+                    try:
+                        stream.send_frame(img_encoded.tobytes())
+                        res = stream.poll(timeout=1.0)
+                    except Exception:
+                        res = api_service.recognize(
+                            image_bytes=img_encoded.tobytes(),
+                            event_type="check-in",
+                            camera_id="CAM-01"
+                        )
+                    if res is not None:
+                        st.session_state.last_scan_result = res
                     st.session_state.last_scan_ts = now
                     status_placeholder.empty()
                 except Exception as e:
@@ -84,6 +104,8 @@ with col_info:
             else:
                 status_placeholder.info("Waiting for video stream initialization...")
     else:
+        if "recognize_stream" in st.session_state:
+            st.session_state.pop("recognize_stream").close()
         status_placeholder.warning("Please enable camera access to begin scanning.")
 
     # Render Persistent Results
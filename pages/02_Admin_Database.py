@@ -1,6 +1,5 @@
 import streamlit as st
 import api_client as api_service
-import pandas as pd
 from ui import design_system, header, sidebar, tables, overlays
 import cv2
 
@@ -10,6 +9,9 @@ sidebar.render_sidebar()
 
 header.render_header("Personnel Intelligence", "Manage secure database, biometric records, and system access.")
 
+# Registry Status -> has_face filter of GET /employees
+REGISTRY_HAS_FACE = {"All Personnel": None, "Active Registry": True, "Unregistered": False}
+
 # --- FILTERS & ACTIONS ---
 with st.container():
     c1, c2, c3, c4 = st.columns([2, 1, 1, 1], gap="medium")
@@ -25,9 +27,10 @@ with st.container():
         st.write("") # Padding
         if st.button("📊 Export CSV", use_container_width=True):
             try:
-                all_emp = api_service.list_employees()
-                df = pd.DataFrame(all_emp)
-                csv = df.to_csv(index=False).encode('utf-8')
+                # streamed CSV from the API (whole registry, no row cap)
+                csv = api_service.export_data(
+                    "employees", "csv", {"query": search_q or None, "has_face": REGISTRY_HAS_FACE[status_filter]}
+                )
                 st.download_button(
                     label="Download Report",
                     data=csv,
@@ -41,13 +44,8 @@ with st.container():
 # --- DATA TABLE ---
 try:
     with st.spinner("Syncing Global Registry..."):
-        employees = api_service.list_employees(query=search_q)
-        
-        # Apply Registry Status Filter
-        if status_filter == "Active Registry":
-            employees = [e for e in employees if e.get("has_face")]
-        elif status_filter == "Unregistered":
-            employees = [e for e in employees if not e.get("has_face")]
+        # Registry Status filter is applied by the API (has_face)
+        employees = api_service.list_employees(query=search_q, has_face=REGISTRY_HAS_FACE[status_filter])
 
     tables.render_employee_table(employees)
 except Exception as e:
@@ -1,5 +1,6 @@
+from datetime import datetime, time, timedelta
+
 import streamlit as st
-import pandas as pd
 import api_client as api_service
 
 from styles import theme
@@ -20,23 +21,64 @@ with st.container(border=True):
     with c2:
         status_filter = st.selectbox("Status", ["All", "Success", "Failed"])
     with c3:
-        # If you want to filter by date, need to update API to accept date param
         date_filter = st.date_input("Date", value=None)
 
+# --- SERVER-SIDE FILTERS ---
+# status -> recognized, date -> that local calendar day as [from, to)
+STATUS_RECOGNIZED = {"All": None, "Success": True, "Failed": False}
+day_from = day_to = None
+if date_filter:
+    local_tz = datetime.now().astimezone().tzinfo
+    day_from = datetime.combine(date_filter, time.min, tzinfo=local_tz)
+    day_to = day_from + timedelta(days=1)
+log_filters = api_service.log_filters(
+    recognized=STATUS_RECOGNIZED[status_filter], time_from=day_from, time_to=day_to
+)
+
+# --- PAGINATION STATE ---
+# cursors of the pages visited so far (None = newest page); reset when the view changes
+view_key = (limit, tuple(sorted(log_filters.items())))
+if st.session_state.get("logs_view") != view_key:
+    st.session_state.logs_view = view_key
+    st.session_state.logs_cursors = [None]
+cursors = st.session_state.logs_cursors
+
 # --- DATA FETCHING ---
+next_cursor = None
 try:
-    logs = api_service.fetch_logs(limit=limit, api_base=api_base)
-    
-    # Client-side filtering (Temporary client-side filter if API doesn't support filter yet)
-    if status_filter == "Success":
-        logs = [l for l in logs if l.get("recognized")]
-    elif status_filter == "Failed":
-        logs = [l for l in logs if not l.get("recognized")]
-        
+    logs, next_cursor = api_service.fetch_logs_page(
+        limit=limit, cursor=cursors[-1], filters=log_filters, api_base=api_base
+    )
+    total = api_service.count_logs(filters=log_filters, api_base=api_base)
+    st.caption(f"{total:,} matching log(s)")
 except Exception as e:
     st.error(f"Data loading error: {e}")
     logs = []
 
 # --- DISPLAY TABLE ---
 # Reuse beautiful HTML table from ui/tables.py
-tables.render_logs_table(logs)
\ No newline at end of file
+tables.render_logs_table(logs)
+
+p1, p2, p3, p4 = st.columns([1, 1, 2, 1])
+with p1:
+    if st.button("‹ Newest", disabled=len(cursors) == 1, use_container_width=True):
+        st.session_state.logs_cursors = [None]
+        st.rerun()
+with p2:
+    if st.button("Older ›", disabled=not next_cursor, use_container_width=True):
+        cursors.append(next_cursor)
+        st.rerun()
+with p3:
+    st.caption(f"Page {len(cursors)}")
+with p4:
+    if st.button("📥 Export CSV", use_container_width=True):
+        try:
+            st.download_button(
+                "Download",
+                data=api_service.export_data("logs", "csv", log_filters, api_base=api_base),
+                file_name="attendance_logs.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
+        except Exception as e:
+            st.error(f"Export failed: {e}")
@@ -0,0 +1,175 @@
+# scripts/bench_matchers.py
+"""
+Latency / recall of the matcher backends on a synthetic gallery.
+
+    python scripts/bench_matchers.py --templates 50000 --identities 10000
+    python scripts/bench_matchers.py --dsn postgresql://localhost/faces   # + pgvector
+
+Builds random clustered, L2-normalized templates (several per identity)
+and queries that are noisy copies of existing templates, then times:
+  - exact     FaceGallery mat-vec
+  - ivf       FaceGallery IVF-Flat index
+  - pgvector  sql/match_face_embeddings.sql through PgvectorMatcher
+              (only with --dsn / DATABASE_URL; needs psycopg and the
+              vector extension; tables live in a throwaway schema)
+
+Recall is top-k identity agreement with exact search.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from api.gallery import EMB_DIM, FaceGallery, l2_normalize  # noqa: E402
+from api.matchers import GalleryMatcher, Matcher, PgvectorMatcher  # noqa: E402
+
+SCHEMA = "bench_matchers"
+
+
+def make_gallery_data(templates: int, identities: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = l2_normalize(rng.standard_normal((identities, dim)).astype(np.float32))
+    emp = rng.integers(0, identities, size=templates)
+    # per-template spread ~0.5 around the identity centre (cos ~0.9)
+    noise = (0.5 / np.sqrt(dim)) * rng.standard_normal((templates, dim)).astype(np.float32)
+    return emp.astype(np.int64) + 1, l2_normalize(centers[emp] + noise).astype(np.float32)
+
+
+def make_queries(vecs: np.ndarray, n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    pick = rng.integers(0, vecs.shape[0], size=n)
+    noise = (0.3 / np.sqrt(vecs.shape[1])) * rng.standard_normal((n, vecs.shape[1])).astype(np.float32)
+    return l2_normalize(vecs[pick] + noise)
+
+
+def bench(matcher: Matcher, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    ms: List[float] = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(matcher.search(q, k))
+        ms.append(1000 * (time.perf_counter() - t0))
+    return {
+        "ids": [[m["employee_id"] for m in r] for r in results],
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+    }
+
+
+def recall(ids: List[List[int]], ref: List[List[int]]) -> float:
+    hits = sum(len(set(a) & set(b)) for a, b in zip(ids, ref))
+    total = sum(len(b) for b in ref)
+    return round(hits / total, 4) if total else float("nan")
+
+
+# ------------------------------------------------------------
+# pgvector
+# ------------------------------------------------------------
+def pg_setup(conn, emp: np.ndarray, vecs: np.ndarray) -> None:
+    sql = (ROOT / "sql" / "match_face_embeddings.sql").read_text(encoding="utf-8")
+    with conn.cursor() as cur:
+        cur.execute("create extension if not exists vector")
+        cur.execute(f"drop schema if exists {SCHEMA} cascade")
+        cur.execute(f"create schema {SCHEMA}")
+        cur.execute(f"set search_path to {SCHEMA}, public")
+        cur.execute("create table employees (employee_id bigint primary key, employee_code text)")
+        cur.execute("create table persons (id bigserial primary key, employee_id text, name text)")
+        cur.execute(
+            f"create table face_embeddings (id bigserial primary key, "
+            f"person_id bigint references persons(id), embedding vector({vecs.shape[1]}))"
+        )
+        ids = np.unique(emp).tolist()
+        with cur.copy("copy employees (employee_id, employee_code) from stdin") as cp:
+            for i in ids:
+                cp.write_row((i, f"E{i:06d}"))
+        with cur.copy("copy persons (id, employee_id, name) from stdin") as cp:
+            for i in ids:
+                cp.write_row((i, str(i), f"Person {i}"))
+        with cur.copy("copy face_embeddings (person_id, embedding) from stdin") as cp:
+            for e, v in zip(emp.tolist(), vecs):
+                cp.write_row((e, "[" + ",".join(f"{x:.7f}" for x in v.tolist()) + "]"))
+        t0 = time.perf_counter()
+        cur.execute(sql)  # function + HNSW index
+        print(f"[bench] pgvector: HNSW index built in {time.perf_counter() - t0:.1f}s")
+        cur.execute("analyze")
+    conn.commit()
+
+
+def pg_rpc(conn):
+    def rpc(function: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"select employee_id, name, employee_code, similarity, templates "
+                f"from {function}(%s::vector, %s, %s)",
+                (params["query_embedding"], params["match_count"], params["candidate_count"]),
+            )
+            cols = [c.name for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+    return rpc
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark exact / ivf / pgvector matchers")
+    ap.add_argument("--templates", type=int, default=50_000)
+    ap.add_argument("--identities", type=int, default=10_000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--nprobe", type=int, default=8)
+    ap.add_argument("--candidates", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Postgres with pgvector (optional)")
+    args = ap.parse_args()
+
+    emp, vecs = make_gallery_data(args.templates, args.identities, EMB_DIM, args.seed)
+    queries = make_queries(vecs, args.queries, args.seed)
+    names = [f"Person {e}" for e in emp.tolist()]
+    codes = [f"E{e:06d}" for e in emp.tolist()]
+    tids = np.arange(1, len(emp) + 1)
+
+    matchers: Dict[str, Matcher] = {}
+    for backend in ("exact", "ivf"):
+        g = FaceGallery(EMB_DIM, reduce="max", backend=backend)
+        g.ann_min_templates = 0
+        g.ann_nprobe = args.nprobe
+        t0 = time.perf_counter()
+        g.load(emp, vecs.copy(), names, codes, template_ids=tids)
+        print(f"[bench] {backend}: loaded {g.template_total} templates in {time.perf_counter() - t0:.2f}s")
+        matchers[backend] = GalleryMatcher(g)
+
+    conn = None
+    if args.dsn:
+        import psycopg  # noqa: PLC0415 - optional, only for the pgvector run
+        conn = psycopg.connect(args.dsn)
+        pg_setup(conn, emp, vecs)
+        with conn.cursor() as cur:
+            cur.execute(f"set search_path to {SCHEMA}, public")
+            cur.execute("set hnsw.ef_search = %s" % max(40, args.candidates))
+        matchers["pgvector"] = PgvectorMatcher(pg_rpc(conn), candidates=args.candidates)
+    else:
+        print("[bench] no --dsn / DATABASE_URL, skipping pgvector")
+
+    results = {name: bench(m, queries, args.k) for name, m in matchers.items()}
+    ref = results["exact"]["ids"]
+    print(f"\n{'backend':<10} {'p50 ms':>9} {'p95 ms':>9} {'recall@' + str(args.k):>10}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['p50_ms']:>9} {r['p95_ms']:>9} {recall(r['ids'], ref):>10}")
+
+    if conn is not None:
+        with conn.cursor() as cur:
+            cur.execute(f"drop schema if exists {SCHEMA} cascade")
+        conn.commit()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
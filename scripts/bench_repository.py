@@ -0,0 +1,150 @@
+# scripts/bench_repository.py
+"""
+Offline throughput of the async CRUD routes on the in-memory data layer.
+
+    python scripts/bench_repository.py --latency-ms 20 --concurrency 1,10,50,200
+
+Mounts the employees / logs / cameras / schedules routers on a bare
+FastAPI app with DB_BACKEND=memory, seeds synthetic rows, and drives the
+routes in-process through httpx's ASGI transport. The memory backend
+awaits --latency-ms per call to stand in for the PostgREST round trip.
+The employee / camera read cache is disabled (READ_CACHE_TTL_SEC=0) so
+every request reaches the data layer instead of measuring cache hits.
+
+For comparison, the same routes run on a variant of the backend whose
+round trip blocks a threadpool thread, which is how the sync supabase
+client behaved: its throughput flattens at the threadpool size (40 by
+default) however many requests are in flight.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def seed_rows(employees: int, logs: int) -> Dict[str, List[Dict[str, Any]]]:
+    emps = [
+        {"employee_id": i, "employee_code": f"E{i:05d}", "name": f"Employee {i}", "is_active": True, "role": "Worker"}
+        for i in range(1, employees + 1)
+    ]
+    persons = [{"id": i, "employee_id": str(i), "name": f"Employee {i}"} for i in range(1, employees + 1, 2)]
+    faces = [{"id": i, "person_id": p["id"]} for i, p in enumerate(persons, 1)]
+    cams = [{"camera_id": f"CAM-{i:02d}", "in_active": True} for i in range(1, 11)]
+    log_rows = [
+        {
+            "log_id": i,
+            "event_time": f"2026-01-01T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}+00:00",
+            "event_type": "check_in" if i % 2 else "check_out",
+            "camera_id": f"CAM-{i % 10 + 1:02d}",
+            "recognized": True,
+            "similarity": 0.8,
+            "employee_id": i % employees + 1,
+        }
+        for i in range(1, logs + 1)
+    ]
+    return {"employees": emps, "persons": persons, "face_embeddings": faces, "cameras": cams, "attendance_logs": log_rows}
+
+
+async def drive(client, paths: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    sem = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await client.get(paths[i % len(paths)])
+            latencies.append(1000 * (time.perf_counter() - t0))
+            errors += resp.status_code != 200
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rps": round(requests / wall, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "errors": errors,
+    }
+
+
+async def run(args) -> None:
+    import httpx
+    from fastapi import FastAPI
+    from starlette.concurrency import run_in_threadpool
+
+    from api.cache import CAMERA_CACHE, EMPLOYEE_CACHE
+    from api.repository import REPO, MemoryBackend, Repository
+    from api.routes import cameras, employees, logs, schedules
+
+    class ThreadpoolBackend(MemoryBackend):
+        """Blocking round trip on a threadpool thread (the sync client)."""
+
+        async def _roundtrip(self) -> float:
+            t0 = self._begin()
+            await run_in_threadpool(time.sleep, self.latency_ms / 1000.0)
+            return t0
+
+    seed = seed_rows(args.employees, args.logs)
+    backends = {
+        "async": MemoryBackend(latency_ms=args.latency_ms, seed=seed),
+        "threadpool": ThreadpoolBackend(latency_ms=args.latency_ms, seed=seed),
+    }
+
+    app = FastAPI()
+    for r in (employees, logs, cameras, schedules):
+        app.include_router(r.router)
+
+    workload = ["/employees?limit=50", "/logs?limit=50", "/cameras", "/employees/7", "/logs?limit=20&camera_id=CAM-03"]
+    transport = httpx.ASGITransport(app=app)
+    results: Dict[str, Dict[int, Dict[str, Any]]] = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, backend in backends.items():
+            # the routers hold REPO; point its tables at this backend
+            REPO.__dict__.update(Repository(backend).__dict__)
+            EMPLOYEE_CACHE.invalidate()
+            CAMERA_CACHE.invalidate()
+            results[name] = {c: await drive(client, workload, args.requests, c) for c in args.concurrency}
+
+    print(f"{'concurrency':>11} | {'async rps':>9} {'p50':>7} {'p95':>7} | {'thread rps':>10} {'p50':>7} {'p95':>7}")
+    for c in args.concurrency:
+        a, t = results["async"][c], results["threadpool"][c]
+        errors = a["errors"] + t["errors"]
+        print(
+            f"{c:>11} | {a['rps']:>9} {a['p50_ms']:>7} {a['p95_ms']:>7} | "
+            f"{t['rps']:>10} {t['p50_ms']:>7} {t['p95_ms']:>7}"
+            + (f"  ({errors} errors)" if errors else "")
+        )
+    for name, backend in backends.items():
+        st = backend.stats()
+        print(f"{name}: {st['requests']} database calls, peak in flight {st['peak_in_flight']}")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the async data layer offline")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="simulated database round trip")
+    ap.add_argument("--concurrency", default="1,10,50,200")
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--employees", type=int, default=500)
+    ap.add_argument("--logs", type=int, default=5000)
+    args = ap.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["READ_CACHE_TTL_SEC"] = "0"  # read before the routes are imported
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+# scripts/eval_quantized.py
+"""
+Accuracy / latency harness: INT8 vs FP32 face models on a local image folder.
+
+    python scripts/eval_quantized.py --images ./samples [--limit 300] [--json out.json]
+
+For every image:
+  - RetinaFace FP32 vs INT8 boxes -> detection recall (FP32 boxes matched by
+    an INT8 box at IoU >= --iou) and extra INT8 boxes
+  - ArcFace FP32 vs INT8 embeddings of the FP32 face crops -> cosine drift
+  - per-call latency of each session
+
+Both variants go through the exact serving pre/post-processing in
+api/models/face_models.py; only the ONNX session differs. A model without
+its *.int8.onnx is reported as skipped (never compared with itself).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from api.models import face_models as fm  # noqa: E402
+from api.models.postprocess import box_iou  # noqa: E402
+from api.models.runtime import create_session  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def _latency(ms: List[float]) -> Dict[str, float]:
+    return {"mean_ms": round(float(np.mean(ms)), 2) if ms else None, "p95_ms": round(_pct(ms, 95), 2)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare INT8 and FP32 face models")
+    ap.add_argument("--images", type=pathlib.Path, required=True)
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--iou", type=float, default=0.5)
+    ap.add_argument("--conf", type=float, default=0.3)
+    ap.add_argument("--json", type=pathlib.Path, default=None)
+    args = ap.parse_args()
+
+    arc_int8 = fm.int8_path(fm.ARC_FP32_PATH)
+    retina_int8 = fm.int8_path(fm.RETINA_FP32_PATH)
+    have_arc, have_retina = arc_int8.exists(), retina_int8.exists()
+    if not have_arc and not have_retina:
+        print("[eval] no *.int8.onnx found, run scripts/quantize_models.py first")
+        return 1
+    for path, present in ((arc_int8, have_arc), (retina_int8, have_retina)):
+        if not present:
+            print(f"[eval] {path.name} missing, skipping that model")
+
+    # FP32 RetinaFace always runs: its boxes give the crops both ArcFace variants embed
+    sessions = {"arc_fp32": create_session(fm.ARC_FP32_PATH), "retina_fp32": create_session(fm.RETINA_FP32_PATH)}
+    if have_arc:
+        sessions["arc_int8"] = create_session(arc_int8)
+    if have_retina:
+        sessions["retina_int8"] = create_session(retina_int8)
+
+    files = sorted(p for p in args.images.rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+    if args.limit > 0:
+        files = files[:args.limit]
+
+    cos: List[float] = []
+    matched = ref_total = extra = 0
+    lat: Dict[str, List[float]] = {k: [] for k in sessions}
+
+    for path in files:
+        frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+
+        boxes = {}
+        for key in ("retina_fp32", "retina_int8"):
+            if key not in sessions:
+                continue
+            t0 = time.perf_counter()
+            boxes[key] = fm.detect_faces_retina(frame, sessions[key], args.conf)
+            lat[key].append(1000 * (time.perf_counter() - t0))
+
+        ref = boxes["retina_fp32"]
+        ref_total += len(ref)
+        if have_retina:
+            got = boxes["retina_int8"]
+            if len(ref) and len(got):
+                iou = box_iou(ref, got)
+                hit = (iou.max(axis=1) >= args.iou)
+                matched += int(hit.sum())
+                extra += int((iou.max(axis=0) < args.iou).sum())
+            else:
+                extra += len(got)
+
+        crops = [c for c in (fm.safe_crop(frame, b) for b in ref) if c is not None and c.size]
+        if not crops or not have_arc:
+            continue
+
+        embs = {}
+        for key in ("arc_fp32", "arc_int8"):
+            t0 = time.perf_counter()
+            embs[key] = fm.get_embeddings(crops, sessions[key])
+            lat[key].append(1000 * (time.perf_counter() - t0) / len(crops))
+        cos.extend(np.sum(embs["arc_fp32"] * embs["arc_int8"], axis=1).tolist())
+
+    report: Dict[str, Any] = {
+        "images": len(files),
+        "models": {
+            "arcface_int8": arc_int8.name if have_arc else None,
+            "retinaface_int8": retina_int8.name if have_retina else None,
+        },
+        "detection": {
+            "fp32_faces": ref_total,
+            "recall_vs_fp32": round(matched / ref_total, 4) if ref_total else None,
+            "extra_int8_boxes": extra,
+            "iou_thresh": args.iou,
+        } if have_retina else {"skipped": f"{retina_int8.name} missing"},
+        "embedding": {
+            "faces": len(cos),
+            "cosine_mean": round(float(np.mean(cos)), 5) if cos else None,
+            "cosine_p5": round(_pct(cos, 5), 5),
+            "cosine_min": round(float(np.min(cos)), 5) if cos else None,
+        } if have_arc else {"skipped": f"{arc_int8.name} missing"},
+        "latency": {k: _latency(v) for k, v in lat.items()},
+    }
+    for model in ("arc", "retina"):
+        if f"{model}_int8" not in report["latency"]:
+            continue
+        fp32, int8 = report["latency"][f"{model}_fp32"]["mean_ms"], report["latency"][f"{model}_int8"]["mean_ms"]
+        if fp32 and int8:
+            report["latency"][f"{model}_speedup"] = round(fp32 / int8, 2)
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,136 @@
+# scripts/quantize_models.py
+"""
+Offline INT8 quantization of the face models.
+
+    python scripts/quantize_models.py                      # dynamic (no data needed)
+    python scripts/quantize_models.py --calib-dir ./calib  # static QDQ, calibrated
+
+Writes arcface.int8.onnx / retinaface.int8.onnx next to the FP32 files.
+Select them at load time with FACE_MODEL_PRECISION=int8 (or ARC_PRECISION /
+RETINA_PRECISION), and check the accuracy cost first with
+scripts/eval_quantized.py.
+
+Static calibration pushes the calibration images through the same
+preprocessing as serving (RetinaFace input policy, ArcFace crops of the
+detected faces), so activation ranges match production input.
+
+Requires the `onnx` package (used by onnxruntime.quantization).
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sys
+from typing import Dict, Iterator, List, Optional
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def list_images(folder: pathlib.Path, limit: int) -> List[pathlib.Path]:
+    files = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+    return files[:limit] if limit > 0 else files
+
+
+class TensorReader:
+    """onnxruntime CalibrationDataReader over a list of input tensors."""
+
+    def __init__(self, input_name: str, tensors: List):
+        self.input_name = input_name
+        self._it: Iterator = iter(tensors)
+
+    def get_next(self) -> Optional[Dict]:
+        t = next(self._it, None)
+        return None if t is None else {self.input_name: t}
+
+
+def calibration_tensors(images: List[pathlib.Path]):
+    """-> (retina tensors, arcface tensors) built with the serving pipeline."""
+    import cv2
+    import numpy as np
+    from api.models import face_models as fm
+
+    retina, arc = [], []
+    for path in images:
+        frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+        retina.append(fm.retina_input(frame)[0].copy())
+        for box in fm.detect_faces(frame):
+            crop = fm.safe_crop(frame, box)
+            if crop is not None and crop.size:
+                arc.append(np.expand_dims(fm.arcface_input(crop), 0).copy())
+
+    print(f"[quantize] calibration: {len(retina)} frames, {len(arc)} face crops")
+    return retina, arc
+
+
+def quantize(src: pathlib.Path, dst: pathlib.Path, tensors: Optional[List], per_channel: bool) -> None:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prep = dst.with_suffix(".prep.onnx")
+    try:
+        quant_pre_process(str(src), str(prep))
+        model_in = prep
+    except Exception as e:
+        print(f"[quantize] pre-process skipped for {src.name}: {e}")
+        model_in = src
+
+    try:
+        if tensors:
+            import onnxruntime as ort
+            input_name = ort.InferenceSession(str(src), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            quantize_static(
+                str(model_in), str(dst),
+                TensorReader(input_name, tensors),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=per_channel,
+            )
+            mode = "static"
+        else:
+            quantize_dynamic(str(model_in), str(dst), weight_type=QuantType.QInt8, per_channel=per_channel)
+            mode = "dynamic"
+    finally:
+        prep.unlink(missing_ok=True)
+
+    src_mb, dst_mb = src.stat().st_size / (1024 * 1024), dst.stat().st_size / (1024 * 1024)
+    print(f"[quantize] {mode}: {src.name} ({src_mb:.1f} MB) -> {dst.name} ({dst_mb:.1f} MB)")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Produce INT8 ArcFace / RetinaFace variants")
+    ap.add_argument("--models-dir", type=pathlib.Path, default=ROOT / "api" / "models" / "ai")
+    ap.add_argument("--calib-dir", type=pathlib.Path, default=None, help="images for static calibration")
+    ap.add_argument("--calib-limit", type=int, default=200)
+    ap.add_argument("--only", choices=["arcface", "retinaface"], default=None)
+    ap.add_argument("--no-per-channel", action="store_true")
+    args = ap.parse_args()
+
+    retina_t = arc_t = None
+    if args.calib_dir:
+        images = list_images(args.calib_dir, args.calib_limit)
+        if not images:
+            raise RuntimeError(f"No images found in {args.calib_dir}")
+        retina_t, arc_t = calibration_tensors(images)
+
+    jobs = [("arcface", arc_t), ("retinaface", retina_t)]
+    for name, tensors in jobs:
+        if args.only and name != args.only:
+            continue
+        src = args.models_dir / f"{name}.onnx"
+        if not src.exists():
+            print(f"[quantize] skip {name}: {src} not found")
+            continue
+        quantize(src, args.models_dir / f"{name}.int8.onnx", tensors, per_channel=not args.no_per_channel)
+
+    print("[quantize] done.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+-- sql/attendance_logs_indexes.sql
+--
+-- Indexes behind GET /logs, /logs/count and /logs/export (api/routes/logs.py).
+-- Apply once in the Supabase SQL editor (or psql). `concurrently` keeps the
+-- table writable while they build; run each statement on its own (not in
+-- a transaction block).
+--
+-- Query shape the API sends (PostgREST), e.g. "everything on 2026-10-03":
+--
+--   select * from attendance_logs
+--   where event_time >= '2026-10-03T00:00:00+00:00'     -- from (inclusive)
+--     and event_time <  '2026-10-04T00:00:00+00:00'     -- to   (exclusive)
+--     [and recognized = false] [and camera_id = ...] [and employee_id = ...]
+--     [and (event_time < $t or (event_time = $t and log_id < $id))]  -- cursor
+--   order by event_time desc, log_id desc
+--   limit 200;
+--
+-- Keep it index-friendly:
+--   - filter the bare column with a half-open range; never wrap event_time
+--     in a function (date(event_time) = ..., event_time::date) - that
+--     cannot use the index
+--   - equality filters lead, the range / sort column follows, log_id last
+--     as the tie-breaker the cursor relies on
+--   - /logs/count sends the same where clause with HEAD + count=exact, so
+--     it is answered from the index without transferring rows
+
+-- time range (+ cursor) on its own, in both directions
+create index concurrently if not exists attendance_logs_time_idx
+    on attendance_logs (event_time desc, log_id desc);
+
+-- per employee / per camera history
+create index concurrently if not exists attendance_logs_employee_time_idx
+    on attendance_logs (employee_id, event_time desc, log_id desc);
+
+create index concurrently if not exists attendance_logs_camera_time_idx
+    on attendance_logs (camera_id, event_time desc, log_id desc);
+
+-- failed recognitions are the rare rows auditors ask for; a partial index
+-- stays small. (recognized = true is the bulk: the time index serves it.)
+create index concurrently if not exists attendance_logs_failed_time_idx
+    on attendance_logs (event_time desc, log_id desc)
+    where recognized = false;
+
+-- check the plan: expect an Index Scan / Index Only Scan, no Seq Scan
+-- explain (analyze, buffers)
+--   select count(*) from attendance_logs
+--   where event_time >= '2026-10-03T00:00:00+00:00' and event_time < '2026-10-04T00:00:00+00:00';
@@ -0,0 +1,49 @@
+-- sql/match_face_embeddings.sql
+--
+-- Server-side matcher for MATCHER_BACKEND=pgvector (api/matchers.py).
+-- Ranks the `candidate_count` nearest templates with the HNSW index, then
+-- reduces them to identities (max cosine similarity per employee) and
+-- returns the best `match_count` (`templates` counts the candidates that
+-- belong to each identity, not its full template total).
+--
+-- Apply once in the Supabase SQL editor (or psql); the API calls it as
+--   sb.rpc("match_face_embeddings", {query_embedding, match_count, candidate_count})
+
+create extension if not exists vector;
+
+create index if not exists face_embeddings_embedding_hnsw
+    on face_embeddings using hnsw (embedding vector_cosine_ops);
+
+create or replace function match_face_embeddings(
+    query_embedding vector(512),
+    match_count int default 1,
+    candidate_count int default 50
+)
+returns table (
+    employee_id bigint,
+    name text,
+    employee_code text,
+    similarity float,
+    templates int
+)
+language sql stable
+as $$
+    with nn as (
+        select fe.person_id, 1 - (fe.embedding <=> query_embedding) as similarity
+        from face_embeddings fe
+        order by fe.embedding <=> query_embedding
+        limit greatest(candidate_count, match_count)
+    )
+    select
+        p.employee_id::bigint as employee_id,
+        max(p.name)::text as name,
+        max(e.employee_code)::text as employee_code,
+        max(nn.similarity)::float as similarity,
+        count(*)::int as templates
+    from nn
+    join persons p on p.id = nn.person_id
+    left join employees e on e.employee_id::text = p.employee_id::text
+    group by p.employee_id
+    order by similarity desc
+    limit match_count;
+$$;
@@ -93,7 +93,9 @@ def render_employee_table(employees: list):
 
         # Badge Logic
         if has_face:
-            badge = '<span style="background:rgba(240,253,244,1); color:#16a34a; padding:0.25rem 0.5rem; border-radius:0.5rem; font-size:0.65rem; font-weight:800; text-transform:uppercase;">Active</span>'
+            n_faces = emp.get("face_templates") or 0
+            label = f"Active · {n_faces}" if n_faces > 1 else "Active"
+            badge = f'<span style="background:rgba(240,253,244,1); color:#16a34a; padding:0.25rem 0.5rem; border-radius:0.5rem; font-size:0.65rem; font-weight:800; text-transform:uppercase;">{label}</span>'
         else:
             badge = '<span style="background:rgba(241,245,249,1); color:#94a3b8; padding:0.25rem 0.5rem; border-radius:0.5rem; font-size:0.65rem; font-weight:800; text-transform:uppercase;">No Data</span>'
 